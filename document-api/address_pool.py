@@ -0,0 +1,94 @@
+import os
+import time
+
+# Endereços mantidos prontos e tamanho de cada lote de getnewaddress (a reposição começa com um lote em falta)
+ADDRESS_POOL_SIZE = int(os.getenv('ADDRESS_POOL_SIZE', 500))
+ADDRESS_POOL_BATCH = int(os.getenv('ADDRESS_POOL_BATCH', 100))
+# Intervalo entre verificações do nível do pool no banco (segundos)
+ADDRESS_POOL_CHECK_INTERVAL = float(os.getenv('ADDRESS_POOL_CHECK_INTERVAL', 1))
+
+
+def create_address_pool_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS address_pool (
+            address TEXT PRIMARY KEY,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            assigned_at DATETIME
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_address_pool_unassigned ON address_pool (address) WHERE assigned_at IS NULL")
+
+
+class AddressPool:
+    """
+    Endereços de pagamento gerados antecipadamente pela carteira da plataforma,
+    guardados no SQLite. acquire reivindica uma linha não atribuída com um único
+    UPDATE ... RETURNING na transação que associa o endereço ao upload, de modo
+    que nunca é entregue duas vezes, nem após reinícios ou com vários processos,
+    e todos os processos compartilham as reposições.
+
+    A reposição roda fora do caminho da requisição, na thread de run_forever do
+    processo dos serviços, que consulta o nível do pool no banco a cada
+    ADDRESS_POOL_CHECK_INTERVAL e gera os endereços em lotes JSON-RPC de
+    getnewaddress. acquire não dispara a reposição: com o gevent, iniciar ou
+    acordar outra tarefa dentro da transação do chamador cede o processo com a
+    trava de escrita do SQLite adquirida.
+    """
+
+    def __init__(self, db, rpc, size=ADDRESS_POOL_SIZE, batch=ADDRESS_POOL_BATCH,
+                 check_interval=ADDRESS_POOL_CHECK_INTERVAL):
+        self.db = db
+        self.rpc = rpc
+        self.size = size
+        self.batch = batch
+        self.check_interval = check_interval
+        self.metrics = {"acquired": 0, "fallbacks": 0, "generated": 0}
+
+    def available(self):
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM address_pool WHERE assigned_at IS NULL")
+            return cursor.fetchone()[0]
+
+    def acquire(self, conn):
+        """
+        Entrega um endereço e o marca como atribuído na transação conn do chamador,
+        da qual deve ser a primeira escrita. Com o pool vazio, gera um endereço na hora.
+        """
+        row = conn.execute(
+            "UPDATE address_pool SET assigned_at = CURRENT_TIMESTAMP "
+            "WHERE address = (SELECT address FROM address_pool WHERE assigned_at IS NULL LIMIT 1) "
+            "RETURNING address"
+        ).fetchone()
+
+        if row is None:
+            # O UPDATE abriu a transação de escrita: desfeita antes do RPC para não segurar a trava do SQLite
+            conn.rollback()
+            address = self.rpc.getnewaddress()
+            conn.execute(
+                "INSERT INTO address_pool (address, assigned_at) VALUES (?, CURRENT_TIMESTAMP)",
+                (address,)
+            )
+            self.metrics["fallbacks"] += 1
+        else:
+            address = row[0]
+        self.metrics["acquired"] += 1
+        return address
+
+    def fill(self):
+        """Gera endereços em lotes enquanto faltar ao menos um lote para o tamanho configurado."""
+        while self.size - self.available() >= min(self.batch, self.size):
+            addresses = self.rpc.batch_([["getnewaddress"] for _ in range(min(self.batch, self.size))])
+            with self.db.connection() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO address_pool (address) VALUES (?)",
+                    [(address,) for address in addresses]
+                )
+            self.metrics["generated"] += len(addresses)
+
+    def run_forever(self):
+        while True:
+            try:
+                self.fill()
+            except Exception as e:
+                print(f"Erro ao repor o pool de endereços: {e}")
+            time.sleep(self.check_interval)
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Janela de agrupamento: ancora a cada ANCHOR_INTERVAL segundos ou ao atingir ANCHOR_MAX_BATCH documentos
+ANCHOR_INTERVAL = int(os.getenv('ANCHOR_INTERVAL', 60))
+ANCHOR_MAX_BATCH = int(os.getenv('ANCHOR_MAX_BATCH', 4096))
+# Intervalo entre as verificações de OP_RETURN presos no mempool (aceleração por RBF)
+ANCHOR_BUMP_INTERVAL = int(os.getenv('ANCHOR_BUMP_INTERVAL', 60))
+
+# Prefixos de domínio: impedem que um nó interno seja apresentado como folha
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def leaf_hash(document_hash, ipfs_hash):
+    """Folha da árvore: SHA-256 do hash do documento concatenado ao CID do IPFS."""
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(document_hash) + ipfs_hash.encode('utf-8')).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def build_merkle_tree(leaves):
+    """
+    Constrói a árvore de Merkle sobre as folhas (bytes) e retorna a raiz e, para
+    cada folha, a prova de inclusão: lista de [lado, hash hex] da folha até a raiz.
+    Um nó sem par em um nível é promovido sem duplicação.
+    """
+    if not leaves:
+        raise ValueError("A árvore de Merkle precisa de pelo menos uma folha.")
+
+    proofs = [[] for _ in leaves]
+    # Cada nó carrega os índices das folhas abaixo dele para distribuir os irmãos nas provas
+    level = [(leaf, [index]) for index, leaf in enumerate(leaves)]
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level) - 1, 2):
+            (left, left_leaves), (right, right_leaves) = level[i], level[i + 1]
+            for index in left_leaves:
+                proofs[index].append(["right", right.hex()])
+            for index in right_leaves:
+                proofs[index].append(["left", left.hex()])
+            next_level.append((node_hash(left, right), left_leaves + right_leaves))
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+
+    return level[0][0], proofs
+
+
+def verify_merkle_proof(leaf, proof, root):
+    """Recalcula a raiz a partir da folha e da prova e compara com a raiz informada."""
+    current = leaf
+    for side, sibling in proof:
+        sibling = bytes.fromhex(sibling)
+        current = node_hash(sibling, current) if side == "left" else node_hash(current, sibling)
+    return current == root
+
+
+def verify_document_proof(document_hash, ipfs_hash, merkle_proof, merkle_root):
+    """Verifica a inclusão de um documento registrado (prova em JSON, raiz em hex)."""
+    try:
+        return verify_merkle_proof(
+            leaf_hash(document_hash, ipfs_hash),
+            json.loads(merkle_proof),
+            bytes.fromhex(merkle_root)
+        )
+    except (TypeError, ValueError):
+        return False
+
+
+class AnchorBatcher:
+    """
+    Agrupa os documentos com pagamento confirmado (status 'paid') e registra
+    apenas a raiz de Merkle de 32 bytes em um único OP_RETURN por lote.
+    A prova de cada documento fica na coluna merkle_proof.
+
+    A transação assinada é gravada no lote antes do envio; após uma queda, o
+    lote é retomado reenviando essa mesma transação, sem criar um segundo OP_RETURN.
+    """
+
+    def __init__(self, db, send_op_return, resend_op_return, interval=ANCHOR_INTERVAL, max_batch=ANCHOR_MAX_BATCH,
+                 on_status=None):
+        self.db = db
+        # Recebe o dado em hex e on_signed (chamado com a transação assinada) e retorna o txid
+        self.send_op_return = send_op_return
+        # Recebe a transação assinada e retorna o txid, ou None se ela não pode mais ser enviada
+        self.resend_op_return = resend_op_return
+        self.interval = interval
+        self.max_batch = max_batch
+        # Recebe (id do lote, novo status dos documentos) após cada transição gravada
+        self.on_status = on_status
+        self._wakeup = threading.Event()
+
+    def notify(self):
+        """Sinaliza novos documentos pagos; o lote sai antes do prazo se estiver cheio."""
+        self._wakeup.set()
+
+    def _paid_count(self):
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM transactions WHERE status = 'paid' AND anchor_id IS NULL"
+            )
+            return cursor.fetchone()[0]
+
+    def _create_anchor(self):
+        """
+        Reserva um lote de documentos pagos sob um novo registro de ancoragem.
+        Um lote do upload em massa (batch_id) é ancorado inteiro, mesmo que passe
+        de max_batch, e só depois que todos os seus pagamentos enviados confirmarem.
+        """
+        with self.db.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, hash, ipfs_hash, batch_id FROM transactions "
+                "WHERE status = 'paid' AND anchor_id IS NULL AND (batch_id IS NULL OR batch_id NOT IN ("
+                "  SELECT batch_id FROM transactions "
+                "  WHERE status = 'awaiting_payment' AND txid IS NOT NULL AND batch_id IS NOT NULL"
+                ")) ORDER BY id LIMIT ?",
+                (self.max_batch,)
+            ).fetchall()
+            if not rows:
+                return None, None
+
+            batch_ids = sorted({row[3] for row in rows if row[3] is not None})
+            if batch_ids:
+                selected = {row[0] for row in rows}
+                rows += [row for row in conn.execute(
+                    "SELECT id, hash, ipfs_hash, batch_id FROM transactions "
+                    f"WHERE batch_id IN ({', '.join('?' * len(batch_ids))}) "
+                    "AND status = 'paid' AND anchor_id IS NULL",
+                    batch_ids
+                ) if row[0] not in selected]
+                rows.sort()
+            rows = [row[:3] for row in rows]
+
+            root, proofs = build_merkle_tree([leaf_hash(document_hash, ipfs_hash) for _, document_hash, ipfs_hash in rows])
+            cursor = conn.execute(
+                "INSERT INTO anchors (merkle_root, leaf_count, status) VALUES (?, ?, 'pending')",
+                (root.hex(), len(rows))
+            )
+            anchor_id = cursor.lastrowid
+            conn.executemany(
+                "UPDATE transactions SET anchor_id = ?, merkle_proof = ? WHERE id = ?",
+                [(anchor_id, json.dumps(proof), tx_id) for (tx_id, _, _), proof in zip(rows, proofs)]
+            )
+            return anchor_id, root.hex()
+
+    def _save_raw_tx(self, anchor_id, raw_tx):
+        with self.db.connection() as conn:
+            conn.execute("UPDATE anchors SET raw_tx = ? WHERE id = ?", (raw_tx, anchor_id))
+
+    def _broadcast(self, anchor_id, merkle_root, raw_tx=None):
+        sent_txid = None
+        if raw_tx:
+            # Retomada: o envio anterior pode ter chegado ao bitcoind antes da queda
+            sent_txid = self.resend_op_return(raw_tx)
+        if sent_txid is None:
+            sent_txid = self.send_op_return(merkle_root, on_signed=lambda signed: self._save_raw_tx(anchor_id, signed))
+
+        with self.db.connection() as conn:
+            conn.execute(
+                "UPDATE anchors SET op_return_txid = ?, status = 'broadcast', broadcast_at = ? WHERE id = ?",
+                (sent_txid, time.time(), anchor_id)
+            )
+            conn.execute(
+                "UPDATE transactions SET op_return_txid = ?, status = 'anchored' WHERE anchor_id = ?",
+                (sent_txid, anchor_id)
+            )
+            conn.execute("INSERT OR IGNORE INTO anchor_txids (txid, anchor_id) VALUES (?, ?)", (sent_txid, anchor_id))
+        print(f"Lote {anchor_id} ancorado no OP_RETURN {sent_txid}.")
+        if self.on_status:
+            self.on_status(anchor_id, "anchored")
+        return sent_txid
+
+    def anchor_pending(self):
+        """
+        Envia os lotes ainda sem transação (ex.: falha no envio anterior) e em
+        seguida cria e envia um novo lote com os documentos pagos.
+        """
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT id, merkle_root, raw_tx FROM anchors WHERE status = 'pending' ORDER BY id")
+            pending_anchors = cursor.fetchall()
+        for anchor_id, merkle_root, raw_tx in pending_anchors:
+            self._broadcast(anchor_id, merkle_root, raw_tx)
+
+        anchor_id, merkle_root = self._create_anchor()
+        if anchor_id is None:
+            return None
+        return self._broadcast(anchor_id, merkle_root)
+
+    def broadcast_txids(self):
+        """
+        TXIDs enviados pelos lotes ainda não confirmados, incluindo os substituídos
+        por RBF: a transação original ainda pode ser minerada no lugar da substituta.
+        """
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT t.txid FROM anchor_txids t JOIN anchors a ON a.id = t.anchor_id WHERE a.status = 'broadcast'"
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def _broadcast_anchor_id(self, conn, txid):
+        row = conn.execute(
+            "SELECT a.id FROM anchor_txids t JOIN anchors a ON a.id = t.anchor_id "
+            "WHERE t.txid = ? AND a.status = 'broadcast'",
+            (txid,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def mark_confirmed(self, op_return_txids):
+        """
+        Conclui os lotes cujo OP_RETURN entrou em um bloco (status 'confirmed'). O TXID
+        minerado, original ou substituto, passa a ser o OP_RETURN do lote e dos documentos.
+        """
+        op_return_txids = list(op_return_txids)
+        if not op_return_txids:
+            return 0
+        with self.db.connection() as conn:
+            confirmed = {}
+            for txid in op_return_txids:
+                anchor_id = self._broadcast_anchor_id(conn, txid)
+                if anchor_id is not None:
+                    confirmed.setdefault(anchor_id, txid)
+            for anchor_id, txid in confirmed.items():
+                conn.execute(
+                    "UPDATE anchors SET status = 'confirmed', op_return_txid = ?, confirmed_at = ? WHERE id = ?",
+                    (txid, time.time(), anchor_id)
+                )
+                conn.execute(
+                    "UPDATE transactions SET status = 'confirmed', op_return_txid = ? "
+                    "WHERE anchor_id = ? AND status = 'anchored'",
+                    (txid, anchor_id)
+                )
+        if self.on_status:
+            for anchor_id in confirmed:
+                self.on_status(anchor_id, "confirmed")
+        return len(confirmed)
+
+    def replace_txid(self, old_txid, new_txid):
+        """
+        Registra a transação que substituiu (RBF) um dos OP_RETURN enviados por um lote
+        ainda não confirmado. Os TXIDs anteriores continuam em anchor_txids.
+        """
+        with self.db.connection() as conn:
+            anchor_id = self._broadcast_anchor_id(conn, old_txid)
+            if anchor_id is None:
+                return None
+            conn.execute(
+                "UPDATE anchors SET op_return_txid = ?, bump_count = bump_count + 1 WHERE id = ?", (new_txid, anchor_id)
+            )
+            conn.execute("UPDATE transactions SET op_return_txid = ? WHERE anchor_id = ?", (new_txid, anchor_id))
+            conn.execute("INSERT OR IGNORE INTO anchor_txids (txid, anchor_id) VALUES (?, ?)", (new_txid, anchor_id))
+        print(f"OP_RETURN do lote {anchor_id} substituído: {old_txid} -> {new_txid}.")
+        return anchor_id
+
+    def confirmation_stats(self, limit=100):
+        """Latência entre o envio e a confirmação (segundos) e acelerações dos últimos lotes confirmados."""
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT confirmed_at - broadcast_at, bump_count FROM anchors "
+                "WHERE status = 'confirmed' AND broadcast_at IS NOT NULL ORDER BY id DESC LIMIT ?",
+                (limit,)
+            )
+            rows = cursor.fetchall()
+        latencies = sorted(row[0] for row in rows)
+        return {
+            "confirmed": len(rows),
+            "latency_median": latencies[len(latencies) // 2] if latencies else None,
+            "latency_max": latencies[-1] if latencies else None,
+            "bumped": sum(1 for row in rows if row[1]),
+        }
+
+    def run_forever(self):
+        deadline = time.monotonic() + self.interval
+        while True:
+            self._wakeup.wait(max(deadline - time.monotonic(), 0))
+            self._wakeup.clear()
+            try:
+                if time.monotonic() >= deadline or self._paid_count() >= self.max_batch:
+                    self.anchor_pending()
+                    deadline = time.monotonic() + self.interval
+                    # Ainda há um lote cheio esperando: processa sem aguardar o prazo
+                    if self._paid_count() >= self.max_batch:
+                        self._wakeup.set()
+            except Exception as e:
+                print(f"Erro ao ancorar lote de documentos: {e}")
+                deadline = time.monotonic() + self.interval
+
+
+class AnchorFeeBumper:
+    """
+    Acelera por substituição de taxa (RBF) os OP_RETURN enviados que continuam
+    fora da cadeia. bump_op_return recebe o TXID e retorna o da transação
+    substituta, ou None se ela ainda não precisa (ou não pode) ser acelerada.
+    Os lotes mais recentes vêm primeiro: em uma cadeia de trocos só a última
+    transação não tem descendentes e pode ser substituída.
+    """
+
+    def __init__(self, batcher, bump_op_return, interval=ANCHOR_BUMP_INTERVAL):
+        self.batcher = batcher
+        self.bump_op_return = bump_op_return
+        self.interval = interval
+        self.metrics = {"checks": 0, "bumps": 0, "errors": 0}
+
+    def bump_stuck(self):
+        with self.batcher.db.cursor() as cursor:
+            cursor.execute("SELECT op_return_txid FROM anchors WHERE status = 'broadcast' ORDER BY id DESC")
+            txids = [row[0] for row in cursor.fetchall()]
+
+        bumped = 0
+        for txid in txids:
+            self.metrics["checks"] += 1
+            try:
+                new_txid = self.bump_op_return(txid)
+            except Exception as e:
+                self.metrics["errors"] += 1
+                print(f"Erro ao acelerar o OP_RETURN {txid}: {e}")
+                continue
+            if new_txid and new_txid != txid and self.batcher.replace_txid(txid, new_txid):
+                self.metrics["bumps"] += 1
+                bumped += 1
+        return bumped
+
+    def run_forever(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.bump_stuck()
+            except Exception as e:
+                print(f"Erro ao verificar ancoragens presas: {e}")
@@ -1,19 +1,54 @@
-from flask import Flask, request, jsonify
+import os
+
+# Modo assíncrono: com 'gevent' (padrão) o monkey-patching precisa vir antes de qualquer
+# import que use sockets, threads ou ssl (requests, bitcoinrpc, http.client, zmq)
+ASYNC_MODE = os.getenv('ASYNC_MODE', 'gevent')
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import fcntl
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from bitcoinrpc.authproxy import AuthServiceProxy, JSONRPCException
+from bitcoinrpc.authproxy import JSONRPCException
 from bitcoin.rpc import RawProxy
-import os, time, random, sqlite3
+import time, random, json, sqlite3, uuid
 from decimal import Decimal
-from threading import Thread
+from collections import deque, OrderedDict
+from statistics import median
+from threading import Lock
 from flask_socketio import SocketIO, emit
-from gevent import monkey
 from werkzeug.utils import secure_filename
-import requests
+from streaming_upload import StreamingUpload, StreamingUploadError
+from block_index import indexed_tip, sync_block_index
+from rpc_pool import get_pooled_proxy
+from block_notifier import create_block_listener
+from schema import migrate
+from database import Database
+from anchoring import AnchorBatcher, AnchorFeeBumper, verify_document_proof
+from utxo_manager import get_utxo_manager, InsufficientFundsError
+from fee_estimator import FeeEstimator, FEE_BUMP_CONF_TARGET, plan_bump
+from instrumentation import REGISTRY, CONTENT_TYPE, instrument_app, monitor_sweep_duration
+from ipfs_client import get_ipfs_client
+from dedup import DocumentIndex, normalize_hash
+from job_queue import JobQueue
+from address_pool import AddressPool
+from chain_cache import ChainCache
+from opreturn_index import OpReturnIndex, decode_op_return
+from notifications import StatusNotifier
+from bulk_upload import BulkRegistration, BulkUploadError, read_items
+from resumable_upload import UploadSessions, UploadSessionError
+from registrations import RegistrationListing, ListingError, parse_fields, parse_timestamp, LISTING_PAGE_SIZE
+from verification import ProofVerifier, VerificationError, read_pairs, VERIFY_MAX_PROOFS
 
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Latência por rota em /metrics
+instrument_app(app)
+# Com mais de um worker, os eventos de um processo chegam aos clientes dos demais pela fila de mensagens
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or None
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE, message_queue=SOCKETIO_MESSAGE_QUEUE)
 
 # Configurações de rede e RPC
 RPC_USER = os.getenv('RPC_USER', 'myuser')
@@ -22,46 +57,21 @@ RPC_HOST = os.getenv('RPC_HOST', 'bitcoin-core')
 RPC_PORT = int(os.getenv('RPC_PORT', 18443))
 NETWORK = os.getenv('NETWORK', 'regtest')  # Alterna entre regtest e testnet
 
-# Inicialização do cliente RPC
+# Inicialização do cliente RPC: as chamadas usam conexões keep-alive de um pool por carteira
 def get_rpc_connection(wallet_name=None):
     url = f"http://{RPC_USER}:{RPC_PASSWORD}@{RPC_HOST}:{RPC_PORT}"
     if wallet_name:
         url += f"/wallet/{wallet_name}"
-    return AuthServiceProxy(url)
+    return get_pooled_proxy(url)
 
 rpc = get_rpc_connection();
 
-# Função para conectar ao IPFS
-def connect_to_ipfs():
-    try:
-        # URL base da API HTTP do IPFS
-        base_url = "http://ipfs:5001/api/v0"
-        # Testa a conexão com o endpoint /version
-        response = requests.post(f"{base_url}/version", timeout=10)
-        if response.status_code == 200:
-            return base_url
-        else:
-            raise Exception("Falha ao conectar ao IPFS")
-    except Exception as e:
-        print(f"Erro ao conectar ao IPFS: {str(e)}")
-        raise
-    
-def add_file_to_ipfs(file_path):
-    try:
-        base_url = connect_to_ipfs()
-        with open(file_path, 'rb') as file:
-            response = requests.post(f"{base_url}/add", files={'file': file}, timeout=10)
-        if response.status_code == 200:
-            return response.json()  
-        else:
-            raise Exception("Falha ao adicionar arquivo ao IPFS")
-    except Exception as e:
-        print(f"Erro ao adicionar arquivo ao IPFS: {str(e)}")
-        raise
+# Cliente IPFS compartilhado: sessão keep-alive e health check em cache
+ipfs = get_ipfs_client()
 
 # Diretório base para armazenar o banco de dados e uploads
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, "data", "transactions.db")
+DB_PATH = os.getenv('DB_PATH', os.path.join(BASE_DIR, "data", "transactions.db"))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 
 # Garante que as pastas existem
@@ -70,31 +80,54 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-# Conexão SQLite persistente
-def get_db_connection():
-    return sqlite3.connect(DB_PATH)
+# Upload em streaming: o arquivo é repassado ao IPFS em blocos, sem cópia local
+STREAM_UPLOADS = os.getenv('STREAM_UPLOADS', 'true').lower() in ('1', 'true', 'yes')
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+# Upload assíncrono: o arquivo é gravado em disco, a resposta sai na hora e as etapas seguem na fila de jobs
+ASYNC_UPLOADS = os.getenv('ASYNC_UPLOADS', 'false').lower() in ('1', 'true', 'yes')
+JOB_WORKERS_PIN = int(os.getenv('JOB_WORKERS_PIN', 4))
+JOB_WORKERS_ADDRESS = int(os.getenv('JOB_WORKERS_ADDRESS', 2))
 
-# Banco de Dados SQLite
-def init_db():
-    conn = sqlite3.connect("data/transactions.db")
-    cursor = conn.cursor()
-
-    # Criação da tabela de transações
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            client_address TEXT,
-            hash TEXT,
-            txid TEXT,
-            ipfs_hash TEXT,
-            op_return_txid TEXT,
-            status TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+# Conexões SQLite reaproveitadas entre requisições
+db = Database(DB_PATH)
 
-    conn.commit()
-    conn.close()
+# Deduplicação de uploads pelo SHA-256 enviado pelo cliente
+document_index = DocumentIndex(db)
+
+# Fila de jobs das etapas do pipeline (received -> pinned -> awaiting_payment)
+job_queue = JobQueue(db)
+
+# Endereços de pagamento gerados antecipadamente
+address_pool = AddressPool(db, get_rpc_connection("platform_wallet"))
+
+# Cache de blocos e transações já profundos na cadeia
+chain_cache = ChainCache(get_rpc_connection())
+
+# Taxas em sat/vB pelo estimatesmartfee, com a tabela em cache
+fee_estimator = FeeEstimator(get_rpc_connection())
+
+# Eventos de mudança de etapa enviados só às salas do endereço ou do documento
+notifier = StatusNotifier(socketio, db, message_queue=SOCKETIO_MESSAGE_QUEUE)
+notifier.register_handlers()
+
+# Índice CID -> transação OP_RETURN construído a partir da própria cadeia
+opreturn_index = OpReturnIndex(db, get_rpc_connection())
+
+# Uploads retomáveis em blocos; os arquivos parciais ficam na pasta de uploads
+upload_sessions = UploadSessions(db, ipfs, os.path.join(UPLOAD_FOLDER, "sessions"))
+
+# Listagem paginada por cursor dos registros do banco local
+registration_listing = RegistrationListing(db)
+
+# Verificação em lote dos registros contra a cadeia (pool de processos criado no primeiro uso)
+proof_verifier = ProofVerifier(db, get_rpc_connection())
+
+# Banco de Dados SQLite: cria ou atualiza o esquema pelas migrações versionadas
+def init_db():
+    with db.connection() as conn:
+        version = migrate(conn)
+        print(f"Esquema do banco de dados na versão {version}.")
+    document_index.load()
 
 ALLOWED_EXTENSIONS = {
     'txt', 'pdf', 'doc', 'docx',  # Documentos
@@ -110,17 +143,12 @@ def allowed_file(filename):
 @app.route('/api/test-ipfs', methods=['GET'])
 def test_ipfs():
     try:
-        base_url = connect_to_ipfs()
-        response = requests.post(f"{base_url}/version", timeout=10)
-        if response.status_code == 200:
-            version_info = response.json()
-            return jsonify({
-                "status": "success",
-                "message": "IPFS connection successful!",
-                "version": version_info
-            })
-        else:
-            raise Exception("Falha ao obter a versão do IPFS")
+        version_info = ipfs.version()
+        return jsonify({
+            "status": "success",
+            "message": "IPFS connection successful!",
+            "version": version_info
+        })
     except Exception as e:
         return jsonify({"status": "error", "message": f"Failed to connect to IPFS: {str(e)}"}), 500
 
@@ -131,6 +159,17 @@ def upload_transaction():
     Recebe o upload do cliente, envia o arquivo para o IPFS e registra o hash no banco.
     """
     try:
+        run_async = ASYNC_UPLOADS or request.args.get('async', '').lower() in ('1', 'true', 'yes')
+        if run_async:
+            # Reenvio da mesma requisição: responde com o registro criado na primeira vez
+            idempotency_key = request.headers.get('Idempotency-Key')
+            job = job_queue.find(f"upload:{idempotency_key}") if idempotency_key else None
+            if job:
+                return registration_response(job["transaction_id"], 202)
+
+        if STREAM_UPLOADS and request.mimetype == 'multipart/form-data':
+            return upload_transaction_stream(run_async)
+
         file = request.files.get('file')
         if not file:
             return jsonify({"status": "error", "message": "Arquivo não enviado."}), 400
@@ -145,61 +184,548 @@ def upload_transaction():
         except ValueError:
             return jsonify({"status": "error", "message": "Hash inválido."}), 400
 
+        # Documento já registrado: evita o envio ao IPFS e um novo endereço
+        existing = document_index.lookup(data)
+        if existing:
+            return duplicate_upload_response(existing)
+
         # Salva o arquivo temporariamente
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+        file_path = spool_path(file.filename)
         file.save(file_path)
+        if run_async:
+            return enqueue_upload(data, file_path)
 
         # Envia o arquivo para o IPFS
         try:
-            base_url = connect_to_ipfs()
-            with open(file_path, 'rb') as f:
-                response = requests.post(f"{base_url}/add", files={'file': f})
-            ipfs_response = response.json()
-            ipfs_hash = ipfs_response['Hash']
+            ipfs_hash = ipfs.add_file(file_path)
         except Exception as e:
             return jsonify({"status": "error", "message": f"Erro ao enviar arquivo para o IPFS: {str(e)}"}), 500
 
         # Remove o arquivo local após o upload
         os.remove(file_path)
 
-        # Gera endereço para pagamento
-        wallet_name = "platform_wallet"
-        rpc = get_rpc_connection(wallet_name)
-        address = rpc.getnewaddress()
+        return register_upload(data, ipfs_hash)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+
+def upload_transaction_stream(run_async=False):
+    """
+    Variante em streaming do upload: repassa o arquivo ao IPFS em blocos, sem
+    cópia local, e confere o SHA-256 calculado com o hash enviado pelo cliente.
+    No modo assíncrono o arquivo é gravado em disco e enviado ao IPFS pela fila.
+    """
+    try:
+        upload = StreamingUpload(request.stream, request.content_type, UPLOAD_CHUNK_SIZE)
+        if not upload.read_until_file():
+            return jsonify({"status": "error", "message": "Arquivo não enviado."}), 400
+    except StreamingUploadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    # Se o hash chegou antes do arquivo, já é possível rejeitar valores inválidos
+    data = upload.fields.get('data')
+    if data is not None and not is_hex(data):
+        return jsonify({"status": "error", "message": "Hash inválido."}), 400
 
-        # Valida os valores antes de inserir no banco de dados
-        if not isinstance(address, str):
-            return jsonify({"status": "error", "message": "Endereço gerado inválido."}), 500
-        if not isinstance(ipfs_hash, str):
-            return jsonify({"status": "error", "message": "Hash IPFS inválido."}), 500
+    # Documento já registrado: responde sem ler o restante do corpo
+    if data is not None:
+        existing = document_index.lookup(data)
+        if existing:
+            return duplicate_upload_response(existing)
 
-        # Salva no banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    if run_async:
+        return spool_upload_stream(upload)
+
+    # Falha rápido se o IPFS estiver fora, antes de consumir o corpo da requisição
+    if not ipfs.is_available():
+        return jsonify({"status": "error", "message": "IPFS indisponível no momento."}), 503
+
+    # Envia o arquivo para o IPFS enquanto ele é recebido
+    try:
+        ipfs_hash = ipfs.add(data=upload.ipfs_body(), headers={"Content-Type": upload.ipfs_content_type})
+    except StreamingUploadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro ao enviar arquivo para o IPFS: {str(e)}"}), 500
+
+    data = upload.fields.get('data')
+    if not data:
+        discard_ipfs_upload(ipfs_hash)
+        return jsonify({"status": "error", "message": "Hash do arquivo é obrigatório."}), 400
+    if not is_hex(data):
+        discard_ipfs_upload(ipfs_hash)
+        return jsonify({"status": "error", "message": "Hash inválido."}), 400
+    if data.lower() != upload.hexdigest():
+        discard_ipfs_upload(ipfs_hash)
+        return jsonify({"status": "error", "message": "Hash do arquivo não confere com o conteúdo enviado."}), 400
+
+    return register_upload(data, ipfs_hash)
+
+
+@app.route('/api/ipfs/upload/bulk', methods=['POST'])
+def upload_bulk():
+    """
+    Registra vários documentos em uma requisição: multipart/form-data com várias
+    partes 'files' (hash no campo 'hash' antes de cada arquivo ou no campo
+    'manifest') ou um .tar/.zip, opcionalmente com manifest.json. Sem hash
+    informado, vale o SHA-256 calculado. A resposta é NDJSON: o endereço do
+    lote, uma linha por arquivo e o resumo com o valor a pagar.
+    """
+    # Falha rápido se o IPFS estiver fora, antes de consumir o corpo (um .zip é gravado inteiro por read_items)
+    if not ipfs.is_available():
+        return jsonify({"status": "error", "message": "IPFS indisponível no momento."}), 503
+
+    try:
+        items = read_items(request.stream, request.content_type, UPLOAD_CHUNK_SIZE)
+    except BulkUploadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    def generate():
+        for line in bulk_registration.run(items):
+            yield json.dumps(line) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/ipfs/upload/bulk/<int:batch_id>', methods=['GET'])
+def get_bulk_upload(batch_id):
+    """Andamento de um lote: valor a pagar e registros em cada etapa."""
+    try:
+        batch = bulk_registration.status(batch_id)
+        if batch is None:
+            return jsonify({"status": "error", "message": "Lote não encontrado."}), 404
+        return jsonify(dict(batch, status="success", message="Lote encontrado."))
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+
+def upload_session_error(error):
+    response = {"status": "error", "message": str(error)}
+    if getattr(error, "missing", None) is not None:
+        response["missing"] = error.missing
+    return jsonify(response), error.status_code
+
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload_session():
+    """
+    Cria uma sessão de upload retomável ({"filename", "size", "hash" opcional}).
+    Os blocos vão em PUT /api/uploads/<id> com o cabeçalho Upload-Offset, em
+    qualquer ordem e em paralelo; POST /api/uploads/<id>/finalize registra o documento.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        document_hash = data.get("hash")
+        if document_hash is not None and (not isinstance(document_hash, str) or not is_hex(document_hash)):
+            return jsonify({"status": "error", "message": "Hash inválido."}), 400
+
+        # Documento já registrado: nenhum byte precisa ser enviado
+        if document_hash:
+            existing = document_index.lookup(document_hash)
+            if existing:
+                return duplicate_upload_response(existing)
+
+        if not ipfs.is_available():
+            return jsonify({"status": "error", "message": "IPFS indisponível no momento."}), 503
+
+        session = upload_sessions.create(
+            secure_filename(str(data.get("filename") or "")) or "upload", data.get("size"), document_hash
+        )
+        upload_url = f"/api/uploads/{session['upload_id']}"
+        response = jsonify(dict(session, status="success", message="Sessão de upload criada.", upload_url=upload_url))
+        response.headers["Location"] = upload_url
+        return response, 201
+    except UploadSessionError as e:
+        return upload_session_error(e)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'HEAD'])
+def get_upload_session(upload_id):
+    """Blocos já recebidos e faltantes: o cliente retoma enviando apenas os que faltam."""
+    try:
+        session = upload_sessions.status(upload_id)
+        response = jsonify(dict(session, status="success", message="Sessão de upload encontrada."))
+        response.headers["Upload-Offset"] = str(session["offset"])
+        response.headers["Upload-Length"] = str(session["size"])
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    except UploadSessionError as e:
+        return upload_session_error(e)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+def put_upload_chunk(upload_id):
+    """Recebe um bloco; Upload-Checksum ('sha256 <base64>') opcional confere o bloco."""
+    try:
         try:
-            cursor.execute(
-                "INSERT INTO transactions (client_address, hash, ipfs_hash, status) VALUES (?, ?, ?, ?)",
-                (address, data, ipfs_hash, "pending")
+            offset = int(request.headers.get('Upload-Offset', request.args.get('offset')))
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Informe o offset do bloco no cabeçalho Upload-Offset."}), 400
+        index = upload_sessions.write_chunk(upload_id, offset, request.stream, request.headers.get('Upload-Checksum'))
+        return jsonify({"status": "success", "message": "Bloco recebido.", "chunk_index": index})
+    except UploadSessionError as e:
+        return upload_session_error(e)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload_session(upload_id):
+    """
+    Conclui o upload: confere o SHA-256 calculado com o hash do cliente (na
+    criação ou aqui, em {"hash"}; sem ele vale o calculado) e registra o documento.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        session = upload_sessions.finalize(upload_id)
+    except UploadSessionError as e:
+        return upload_session_error(e)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+    expected = data.get("hash") or session["hash"]
+    if expected and (not isinstance(expected, str) or expected.strip().lower() != session["sha256"]):
+        discard_ipfs_upload(session["ipfs_hash"])
+        return jsonify({"status": "error", "message": "Hash do arquivo não confere com o conteúdo enviado."}), 400
+    return register_upload(expected or session["sha256"], session["ipfs_hash"])
+
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload_session(upload_id):
+    """Cancela a sessão e remove os blocos já recebidos."""
+    try:
+        if not upload_sessions.discard(upload_id):
+            return jsonify({"status": "error", "message": "Sessão de upload não encontrada."}), 404
+        return jsonify({"status": "success", "message": "Sessão de upload removida."})
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+
+def spool_path(filename):
+    """Caminho único na pasta de uploads; evita que envios simultâneos do mesmo nome se sobrescrevam."""
+    return os.path.join(app.config["UPLOAD_FOLDER"], f"{uuid.uuid4().hex}_{secure_filename(filename or '') or 'upload'}")
+
+
+def spool_upload_stream(upload):
+    """Grava o arquivo do upload em streaming e o encaminha à fila, após conferir o hash."""
+    file_path = spool_path(upload.filename)
+    try:
+        upload.save(file_path)
+    except StreamingUploadError as e:
+        remove_file(file_path)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    data = upload.fields.get('data')
+    if not data:
+        remove_file(file_path)
+        return jsonify({"status": "error", "message": "Hash do arquivo é obrigatório."}), 400
+    if not is_hex(data):
+        remove_file(file_path)
+        return jsonify({"status": "error", "message": "Hash inválido."}), 400
+    if data.lower() != upload.hexdigest():
+        remove_file(file_path)
+        return jsonify({"status": "error", "message": "Hash do arquivo não confere com o conteúdo enviado."}), 400
+    return enqueue_upload(data, file_path)
+
+
+def remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def enqueue_upload(data, file_path):
+    """
+    Registra o documento no estado 'received' e enfileira o envio ao IPFS.
+    Responde imediatamente com o id do registro (202).
+    """
+    existing = document_index.lookup(data)
+    if existing:
+        remove_file(file_path)
+        return duplicate_upload_response(existing)
+
+    idempotency_key = request.headers.get('Idempotency-Key')
+    try:
+        with db.connection() as conn:
+            cursor = conn.execute("INSERT INTO transactions (hash, status) VALUES (?, 'received')", (data,))
+            transaction_id = cursor.lastrowid
+            document_index.register(conn, data, transaction_id)
+            job_queue.enqueue(
+                "pin", transaction_id, {"file_path": file_path},
+                f"upload:{idempotency_key}" if idempotency_key else f"pin:{transaction_id}",
+                conn=conn
             )
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            return jsonify({"status": "error", "message": f"Erro ao salvar no banco de dados: {str(e)}"}), 500
-        finally:
-            conn.close()
+    except sqlite3.IntegrityError:
+        remove_file(file_path)
+        existing = document_index.lookup(data, use_filter=False)
+        if existing:
+            return duplicate_upload_response(existing)
+        return jsonify({"status": "error", "message": "Documento já registrado."}), 409
+    job_queue.wake("pin")
+    return registration_response(transaction_id, 202)
+
+
+def pin_upload(job):
+    """Etapa 'pin': envia ao IPFS o arquivo gravado no upload (received -> pinned)."""
+    transaction_id = job["transaction_id"]
+    file_path = job["payload"]["file_path"]
+    with db.cursor() as cursor:
+        cursor.execute("SELECT ipfs_hash FROM transactions WHERE id = ?", (transaction_id,))
+        row = cursor.fetchone()
+    if row is None:
+        remove_file(file_path)
+        return
+
+    # Um job retomado após uma queda pode encontrar o arquivo já enviado
+    ipfs_hash = row[0] or ipfs.add_file(file_path)
+    with db.connection() as conn:
+        cursor = conn.execute(
+            "UPDATE transactions SET ipfs_hash = ?, status = 'pinned' WHERE id = ? AND status = 'received'",
+            (ipfs_hash, transaction_id)
+        )
+        job_queue.enqueue("address", transaction_id, idempotency_key=f"address:{transaction_id}", conn=conn)
+    job_queue.wake("address")
+    if cursor.rowcount:
+        notifier.publish(transaction_id, "pinned")
+    remove_file(file_path)
+
+
+def assign_payment_address(job):
+    """Etapa 'address': gera o endereço de pagamento (pinned -> awaiting_payment)."""
+    transaction_id = job["transaction_id"]
+    with db.cursor() as cursor:
+        cursor.execute("SELECT client_address FROM transactions WHERE id = ?", (transaction_id,))
+        row = cursor.fetchone()
+    if row is None or row[0]:
+        return
+
+    with db.connection() as conn:
+        address = address_pool.acquire(conn)
+        cursor = conn.execute(
+            "UPDATE transactions SET client_address = ?, status = 'awaiting_payment' "
+            "WHERE id = ? AND client_address IS NULL",
+            (address, transaction_id)
+        )
+    if cursor.rowcount:
+        notifier.publish(transaction_id, "awaiting_payment")
 
-        # Retorna o hash IPFS e o link de download
-        download_url = f"http://127.0.0.1:8080/ipfs/{ipfs_hash}"  # Gateway HTTP do IPFS
-        return jsonify({
-            "status": "success",
-            "message": "Upload recebido. Aguarde confirmação de pagamento.",
-            "address": address,
-            "ipfs_hash": ipfs_hash,
-            "download_url": download_url
-        })
+
+job_queue.register("pin", pin_upload, JOB_WORKERS_PIN)
+job_queue.register("address", assign_payment_address, JOB_WORKERS_ADDRESS)
+
+
+def registration_response(transaction_id, status_code=200):
+    """Estado atual de um registro e dos jobs do seu pipeline."""
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT client_address, hash, ipfs_hash, txid, op_return_txid, status FROM transactions WHERE id = ?",
+            (transaction_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return jsonify({"status": "error", "message": "Registro não encontrado."}), 404
+        cursor.execute(
+            "SELECT stage, state, attempts, last_error FROM jobs WHERE transaction_id = ? ORDER BY id",
+            (transaction_id,)
+        )
+        jobs = [
+            {"stage": stage, "state": state, "attempts": attempts, "last_error": last_error}
+            for stage, state, attempts, last_error in cursor.fetchall()
+        ]
+
+    address, document_hash, ipfs_hash, txid, op_return_txid, status = row
+    return jsonify({
+        "status": "success",
+        "message": "Upload recebido. O registro é processado em segundo plano." if status_code == 202
+        else "Registro encontrado.",
+        "registration_id": transaction_id,
+        "registration_status": status,
+        "hash": document_hash,
+        "address": address,
+        "ipfs_hash": ipfs_hash,
+        "download_url": f"http://127.0.0.1:8080/ipfs/{ipfs_hash}" if ipfs_hash else None,
+        "txid": txid,
+        "op_return_txid": op_return_txid,
+        "jobs": jobs
+    }), status_code
+
+
+@app.route('/api/registrations/<int:registration_id>', methods=['GET'])
+def get_registration(registration_id):
+    """Consulta o andamento de um registro (útil para uploads assíncronos)."""
+    try:
+        return registration_response(registration_id)
     except Exception as e:
         return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+
+@app.route('/api/registrations', methods=['GET'])
+def list_registrations():
+    """
+    Registros do banco local, do mais recente para o mais antigo (order=asc
+    inverte), com paginação por cursor: next_cursor vai em ?cursor= para buscar
+    a página seguinte. Filtros: status (vários separados por vírgula), address,
+    since/until (ISO 8601, UTC) e hash_prefix. fields escolhe os campos, e
+    format=rows responde com linhas em vez de objetos, sem repetir os nomes.
+    """
+    try:
+        args = request.args
+        output_format = args.get('format', 'objects')
+        if output_format not in ('objects', 'rows'):
+            raise ListingError("'format' deve ser 'objects' ou 'rows'.")
+        try:
+            limit = int(args.get('limit', LISTING_PAGE_SIZE))
+        except ValueError:
+            raise ListingError("'limit' deve ser um número inteiro.")
+        fields = parse_fields(args.get('fields'))
+
+        rows, next_cursor = registration_listing.page(
+            status=args.get('status'),
+            address=args.get('address'),
+            since=parse_timestamp(args['since'], 'since') if args.get('since') else None,
+            until=parse_timestamp(args['until'], 'until') if args.get('until') else None,
+            hash_prefix=args.get('hash_prefix'),
+            cursor=args.get('cursor'),
+            limit=limit,
+            fields=fields,
+            order=args.get('order', 'desc')
+        )
+        response = {"status": "success", "message": "Registros recuperados com sucesso.", "next_cursor": next_cursor}
+        if output_format == 'rows':
+            response.update(fields=list(fields), rows=[list(row) for row in rows])
+        else:
+            response["registrations"] = [dict(zip(fields, row)) for row in rows]
+        return jsonify(response)
+    except ListingError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
+
+
+@app.route('/api/registrations/verify', methods=['POST'])
+def verify_registrations():
+    """
+    Verifica em lote pares (SHA-256 do documento, txid do OP_RETURN) contra a
+    cadeia: inclusão da transação em um bloco e o CID ou a prova de Merkle do
+    documento contra o OP_RETURN. O corpo é JSON ({"proofs": [{"hash", "txid"}]})
+    ou texto com um par por linha ("hash,txid"), lido enquanto a verificação
+    avança. A resposta é NDJSON: uma linha por par, na ordem enviada, e o resumo.
+    """
+    try:
+        if request.is_json:
+            proofs = (request.get_json(silent=True) or {}).get('proofs')
+            if not isinstance(proofs, list) or not proofs:
+                raise VerificationError("O campo 'proofs' deve ser uma lista de pares {'hash', 'txid'}.")
+            if len(proofs) > VERIFY_MAX_PROOFS:
+                raise VerificationError(f"Limite de {VERIFY_MAX_PROOFS} pares por verificação.")
+            try:
+                pairs = [
+                    (str(proof["hash"]), str(proof["txid"])) if isinstance(proof, dict) else (str(proof[0]), str(proof[1]))
+                    for proof in proofs
+                ]
+            except (KeyError, IndexError, TypeError):
+                raise VerificationError("Cada par deve ter 'hash' e 'txid'.")
+        else:
+            pairs = read_pairs(request.stream)
+    except VerificationError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    def generate():
+        for line in proof_verifier.run(pairs, max_proofs=VERIFY_MAX_PROOFS):
+            yield json.dumps(line) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def is_hex(value):
+    """Valida se o valor é uma string hexadecimal."""
+    try:
+        bytes.fromhex(value)
+        return True
+    except ValueError:
+        return False
+
+
+def discard_ipfs_upload(ipfs_hash):
+    """Remove o pin de um upload rejeitado, se o conteúdo não pertencer a outro registro."""
+    try:
+        with db.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM transactions WHERE ipfs_hash = ?", (ipfs_hash,))
+            registered = cursor.fetchone()
+        if not registered:
+            ipfs.pin_rm(ipfs_hash)
+    except Exception as e:
+        print(f"Erro ao remover pin do IPFS: {str(e)}")
+
+
+# Registro de vários documentos por requisição, com um único endereço de pagamento
+bulk_registration = BulkRegistration(db, ipfs, document_index, address_pool, discard_ipfs_upload)
+
+
+def duplicate_upload_response(existing):
+    """Resposta para um documento já registrado: o CID, o endereço e o status do registro original."""
+    return jsonify({
+        "status": "success",
+        "message": "Documento já registrado.",
+        "duplicate": True,
+        "address": existing["address"],
+        "ipfs_hash": existing["ipfs_hash"],
+        "download_url": f"http://127.0.0.1:8080/ipfs/{existing['ipfs_hash']}",
+        "registration_status": existing["status"],
+        "txid": existing["txid"],
+        "op_return_txid": existing["op_return_txid"]
+    })
+
+
+def register_upload(data, ipfs_hash):
+    """
+    Gera o endereço de pagamento e registra o upload no banco.
+    """
+    # O hash pode ter chegado depois do arquivo: confere novamente antes de gerar o endereço
+    existing = document_index.lookup(data)
+    if existing:
+        discard_ipfs_upload(ipfs_hash)
+        return duplicate_upload_response(existing)
+
+    # Valida os valores antes de inserir no banco de dados
+    if not isinstance(ipfs_hash, str):
+        return jsonify({"status": "error", "message": "Hash IPFS inválido."}), 500
+
+    # Salva no banco de dados, com um endereço de pagamento do pool
+    try:
+        with db.connection() as conn:
+            address = address_pool.acquire(conn)
+            cursor = conn.execute(
+                "INSERT INTO transactions (client_address, hash, ipfs_hash, status) VALUES (?, ?, ?, ?)",
+                (address, data, ipfs_hash, "awaiting_payment")
+            )
+            document_index.register(conn, data, cursor.lastrowid)
+    except sqlite3.IntegrityError:
+        # Upload simultâneo do mesmo documento, ou já registrado por outro processo (o filtro
+        # de Bloom é local): prevalece o primeiro registro e o pin deste upload é desfeito
+        discard_ipfs_upload(ipfs_hash)
+        existing = document_index.lookup(data, use_filter=False)
+        if existing:
+            return duplicate_upload_response(existing)
+        return jsonify({"status": "error", "message": "Documento já registrado."}), 409
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro ao salvar no banco de dados: {str(e)}"}), 500
+
+    # Retorna o hash IPFS e o link de download
+    download_url = f"http://127.0.0.1:8080/ipfs/{ipfs_hash}"  # Gateway HTTP do IPFS
+    return jsonify({
+        "status": "success",
+        "message": "Upload recebido. Aguarde confirmação de pagamento.",
+        "address": address,
+        "hash": data,
+        "ipfs_hash": ipfs_hash,
+        "download_url": download_url
+    })
     
     
 @app.route('/api/block/count', methods=['GET'])
@@ -214,9 +740,7 @@ def get_block_count():
 @app.route('/api/block/<int:block_number>', methods=['GET'])
 def get_block_by_number(block_number):
     try:
-        rpc = get_rpc_connection()
-        block_hash = rpc.getblockhash(block_number)
-        block = rpc.getblock(block_hash)
+        block = chain_cache.get_block(chain_cache.get_block_hash(block_number))
         return jsonify({"status": "success", "message": "Block retrieved successfully!", "block": block})
     except JSONRPCException as e:
         return jsonify({"status": "error", "message": f'RPC error: {str(e)}'}), 400
@@ -245,67 +769,286 @@ def ensure_wallet_exists(wallet_name="platform_wallet"):
         print(f"Erro ao verificar ou criar carteira: {e}")
         raise
     
+# Configurações da varredura de confirmações
+MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', 10))
+MONITOR_BATCH_SIZE = int(os.getenv('MONITOR_BATCH_SIZE', 500))
+# No modo orientado a eventos: tempo máximo de espera por bloco e intervalo da varredura completa de segurança
+BLOCK_WAIT_TIMEOUT = int(os.getenv('BLOCK_WAIT_TIMEOUT', 20))
+MONITOR_SAFETY_INTERVAL = int(os.getenv('MONITOR_SAFETY_INTERVAL', 300))
+
+# Métricas do monitor de transações, expostas em /api/monitor/metrics
+monitor_metrics = {
+    "batch_size": MONITOR_BATCH_SIZE,
+    "sweeps": 0,
+    "total_sweep_duration": 0.0,
+    "last_sweep_duration": None,
+    "last_sweep_pending": 0,
+    "last_sweep_batches": 0,
+    "last_sweep_errors": 0,
+    "blocks_processed": 0,
+    "notifications_sent": 0,
+}
+
+# Latência entre o horário do bloco e a emissão do payment_confirmed (segundos)
+notify_latencies = deque(maxlen=1000)
+
+
+def process_transaction_confirmation(conn, tx_id, txid, ipfs_hash, transaction):
+    """Marca o documento como pago e o encaminha para o próximo lote de ancoragem."""
+    confirmations = transaction.get("confirmations", 0)
+    if confirmations < 1:
+        return
+
+    address = None
+    amount = 0
+    details = transaction.get("details", [])
+    if details and isinstance(details, list):
+        address = details[0].get("address", "unknown")
+        amount = details[0].get("amount", 0)
+
+    if not address:
+        print(f"Warning: No valid address found for TXID {txid}")
+        return
+
+    # O OP_RETURN é criado pelo AnchorBatcher junto com os demais documentos pagos
+    cursor = conn.execute("UPDATE transactions SET status = 'paid' WHERE id = ? AND status = 'awaiting_payment'", (tx_id,))
+    conn.commit()
+    anchor_batcher.notify()
+    invalidate_address_cache(address)
+    if not cursor.rowcount:
+        return
+
+    # Entregue pela tarefa de fundo do notifier apenas às salas do endereço e do documento
+    blocktime = transaction.get("blocktime", time.time())
+    notifier.publish(tx_id, "paid", time=blocktime, amount=float(amount))
+    notify_latencies.append(max(time.time() - blocktime, 0))
+    monitor_metrics["notifications_sent"] += 1
+
+
+def sweep_pending_transactions(rpc):
+    """Varredura completa: verifica todas as transações com pagamento pendente."""
+    started = time.monotonic()
+    with db.connection() as conn:
+        pending_transactions = conn.execute(
+            "SELECT id, txid, ipfs_hash FROM transactions WHERE status = 'awaiting_payment' AND txid IS NOT NULL"
+        ).fetchall()
+        batches, errors = check_pending_transactions(rpc, conn, pending_transactions)
+    check_broadcast_anchors(rpc)
+
+    duration = time.monotonic() - started
+    monitor_sweep_duration.observe(duration)
+    monitor_metrics["sweeps"] += 1
+    monitor_metrics["total_sweep_duration"] += duration
+    monitor_metrics["last_sweep_duration"] = duration
+    monitor_metrics["last_sweep_pending"] = len(pending_transactions)
+    monitor_metrics["last_sweep_batches"] = batches
+    monitor_metrics["last_sweep_errors"] = errors
+
+
+def check_broadcast_anchors(rpc):
+    """
+    Conclui os lotes cujo OP_RETURN já tem confirmação (anchored -> confirmed).
+    Consulta todos os TXIDs enviados por lote: após um RBF, a original ou qualquer
+    substituta pode ser a minerada. Uma transação com confirmações negativas perdeu
+    para uma conflitante (walletconflicts); se esta não foi registrada no lote (ex.:
+    substituição feita antes de uma queda), ela é consultada e registrada também.
+    """
+    op_return_txids = list(anchor_batcher.broadcast_txids())
+    if not op_return_txids:
+        return
+    confirmed = []
+    conflicts = {}
+    results = rpc.batch_results([["gettransaction", txid] for txid in op_return_txids])
+    for txid, (transaction, error) in zip(op_return_txids, results):
+        if error:
+            continue
+        if transaction.get("confirmations", 0) >= 1:
+            confirmed.append(txid)
+        elif transaction.get("confirmations", 0) < 0:
+            for conflict in transaction.get("walletconflicts", []):
+                if conflict not in op_return_txids:
+                    conflicts.setdefault(conflict, txid)
+
+    if conflicts:
+        conflict_txids = list(conflicts)
+        results = rpc.batch_results([["gettransaction", txid] for txid in conflict_txids])
+        for txid, (transaction, error) in zip(conflict_txids, results):
+            if error or transaction.get("confirmations", 0) < 1:
+                continue
+            if anchor_batcher.replace_txid(conflicts[txid], txid):
+                confirmed.append(txid)
+    anchor_batcher.mark_confirmed(confirmed)
+
+
+def check_pending_transactions(rpc, conn, pending_transactions):
+    """
+    Consulta as transações informadas em lotes JSON-RPC de MONITOR_BATCH_SIZE
+    (um único POST por lote). Falhas de um item não interrompem o restante do lote.
+    Retorna a quantidade de lotes enviados e de erros.
+    """
+    # Um lote de documentos é pago por uma única transação: uma consulta por txid
+    by_txid = {}
+    for tx_id, txid, ipfs_hash in pending_transactions:
+        by_txid.setdefault(txid, []).append((tx_id, ipfs_hash))
+    txids = list(by_txid)
+
+    batches = 0
+    errors = 0
+    for start in range(0, len(txids), MONITOR_BATCH_SIZE):
+        batch = txids[start:start + MONITOR_BATCH_SIZE]
+        try:
+            results = rpc.batch_results([["gettransaction", txid] for txid in batch])
+        except Exception as e:
+            print(f"Error fetching transaction batch: {e}")
+            errors += len(batch)
+            continue
+        batches += 1
+
+        for txid, (transaction, error) in zip(batch, results):
+            if error:
+                print(f"Error fetching transaction {txid}: {error.get('message')}")
+                errors += 1
+                continue
+            for tx_id, ipfs_hash in by_txid[txid]:
+                process_transaction_confirmation(conn, tx_id, txid, ipfs_hash, transaction)
+    return batches, errors
+
+
+def process_new_blocks(rpc, from_height, to_height):
+    """
+    Verifica apenas as transações pendentes incluídas nos blocos do intervalo
+    (from_height, to_height], sem consultar as que continuam fora da cadeia.
+    """
+    heights = list(range(from_height + 1, to_height + 1))
+    if not heights:
+        return
+
+    block_hashes = rpc.batch_([["getblockhash", height] for height in heights])
+    block_txids = set()
+    for block, error in rpc.batch_results([["getblock", block_hash] for block_hash in block_hashes]):
+        if error:
+            print(f"Error fetching block: {error.get('message')}")
+            continue
+        block_txids.update(block.get("tx", []))
+    monitor_metrics["blocks_processed"] += len(heights)
+    # Novos blocos alteram as confirmações de qualquer endereço
+    invalidate_address_cache()
+
+    with db.connection() as conn:
+        pending_transactions = conn.execute(
+            "SELECT id, txid, ipfs_hash FROM transactions WHERE status = 'awaiting_payment' AND txid IS NOT NULL"
+        ).fetchall()
+        included = [row for row in pending_transactions if row[1] in block_txids]
+        check_pending_transactions(rpc, conn, included)
+    anchor_batcher.mark_confirmed(anchor_batcher.broadcast_txids() & block_txids)
+
+
+def watch_new_blocks(rpc, listener):
+    """
+    Monitor orientado a eventos: reage a cada novo bloco notificado e mantém uma
+    varredura completa a cada MONITOR_SAFETY_INTERVAL para cobrir notificações perdidas.
+    """
+    last_height = None
+    last_sweep = None
+
+    while True:
+        try:
+            if last_sweep is None or time.monotonic() - last_sweep >= MONITOR_SAFETY_INTERVAL:
+                last_height = rpc.getblockcount()
+                sweep_pending_transactions(rpc)
+                last_sweep = time.monotonic()
+
+            if listener.wait(BLOCK_WAIT_TIMEOUT):
+                tip_height = rpc.getblockcount()
+                # Em uma reorganização o topo pode recuar; a varredura de segurança cobre esse caso
+                process_new_blocks(rpc, min(last_height, tip_height), tip_height)
+                last_height = tip_height
+                chain_cache.set_tip(tip_height)
+                # Durante a varredura inicial os blocos novos ficam para ela
+                opreturn_index.scan(tip_height, blocking=False)
+                extend_block_index(rpc)
+        except Exception as e:
+            print(f"Erro ao monitorar novos blocos: {e}")
+            time.sleep(MONITOR_INTERVAL)
+
+
 def monitor_transactions():
     with app.app_context():  # Garante que a função seja executada dentro do contexto da aplicação Flask
         rpc = get_rpc_connection("platform_wallet")
+
+        try:
+            listener = create_block_listener(get_rpc_connection())
+        except Exception as e:
+            print(f"Notificações de blocos indisponíveis, usando varredura periódica: {e}")
+            listener = None
+        if listener:
+            watch_new_blocks(rpc, listener)
+
         while True:
-            time.sleep(10)
+            time.sleep(MONITOR_INTERVAL)
             try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, txid, ipfs_hash FROM transactions WHERE status = 'pending' AND op_return_txid IS NOT NULL")
-                pending_transactions = cursor.fetchall()
-
-                if len(pending_transactions) >= 1:
-                
-                    for tx_id, txid, ipfs_hash in pending_transactions:
-                        try:
-                            transaction = rpc.gettransaction(txid)
-                        except Exception as e:
-                            print(f"Error fetching transaction {txid}: {e}")
-                            continue
-
-                        confirmations = transaction.get("confirmations", 0)
-                        if confirmations >= 1:
-                            address = None
-                            amount = 0
-                            details = transaction.get("details", [])
-                            if details and isinstance(details, list):
-                                address = details[0].get("address", "unknown")
-                                amount = details[0].get("amount", 0)
-
-                            if not address:
-                                print(f"Warning: No valid address found for TXID {txid}")
-                                continue                       
-
-                            # Cria a transação OP_RETURN com o hash IPFS
-                            try:
-                                data_origin = ipfs_hash.encode('utf-8')
-                                ipfs_hash = data_origin.hex()
-                                op_return_data = create_opreturn_transaction(ipfs_hash)  # Passa o hash IPFS como argumento
-                                
-                                if op_return_data:
-                                    # Atualiza o status da transação no banco de dados para 'confirmed'
-                                    op_return_txid = op_return_data.get(op_return_txid)
-                                    cursor.execute("UPDATE transactions SET status = 'confirmed' WHERE id = ?", (tx_id,))
-                                    conn.commit()
-                                
-                            except Exception as e:
-                                print(f"Error creating OP_RETURN transaction: {e}")
-
-                            # Emite o evento via Socket.IO
-                            # socketio.emit("payment_confirmed", {
-                            #     "txid": txid,
-                            #     "status": "confirmed",
-                            #     "time": transaction.get("blocktime", time.time()),
-                            #     "amount": float(amount),
-                            #     "address": address
-                            # })
-
-                    conn.close()
+                sweep_pending_transactions(rpc)
             except Exception as e:
                 print(f"Erro ao monitorar transações: {e}")
-            
+            extend_block_index(rpc)
+
+
+@app.route('/api/monitor/metrics', methods=['GET'])
+def get_monitor_metrics():
+    metrics = dict(monitor_metrics)
+    metrics["notify_latency_median"] = median(notify_latencies) if notify_latencies else None
+    metrics["jobs"] = job_queue.stats()
+    metrics["address_pool"] = dict(address_pool.metrics, available=address_pool.available())
+    metrics["chain_cache"] = dict(chain_cache.metrics)
+    metrics["notifications"] = dict(notifier.metrics)
+    metrics["opreturn_index"] = dict(opreturn_index.metrics, scanned_height=opreturn_index.scanned_height())
+    metrics["bulk_registration"] = dict(bulk_registration.metrics)
+    metrics["upload_sessions"] = dict(upload_sessions.metrics)
+    metrics["registration_listing"] = dict(registration_listing.metrics)
+    metrics["proof_verifier"] = dict(proof_verifier.metrics)
+    metrics["fees"] = fee_estimator.stats()
+    metrics["anchors"] = dict(anchor_batcher.confirmation_stats(), bumper=dict(anchor_fee_bumper.metrics))
+    return jsonify({"status": "success", "message": "Monitor metrics retrieved successfully!", "metrics": metrics})
+
+
+def pipeline_depth():
+    """Documentos aguardando pagamento e pagos ainda sem lote (índices parciais: sem varrer a tabela)."""
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT (SELECT COUNT(*) FROM transactions WHERE status = 'awaiting_payment'), "
+            "(SELECT COUNT(*) FROM transactions WHERE status = 'paid' AND anchor_id IS NULL)"
+        )
+        awaiting_payment, paid = cursor.fetchone()
+    return {("awaiting_payment",): awaiting_payment, ("paid",): paid}
+
+
+# Séries lidas a cada coleta do /metrics: filas do pipeline e as métricas internas já existentes
+REGISTRY.gauge_callback("pipeline_pending_documents", "Documentos parados em cada etapa do pipeline.",
+                        pipeline_depth, ("status",))
+REGISTRY.gauge_callback("job_queue_depth", "Jobs na fila ou em execução, por etapa e estado.",
+                        job_queue.depth, ("stage", "state"))
+REGISTRY.gauge_callback("address_pool_available", "Endereços de pagamento prontos no pool.", address_pool.available)
+REGISTRY.bridge("monitor", lambda: monitor_metrics)
+REGISTRY.bridge("address_pool", lambda: address_pool.metrics)
+REGISTRY.bridge("chain_cache", lambda: chain_cache.metrics)
+REGISTRY.bridge("notifications", lambda: notifier.metrics)
+REGISTRY.bridge("opreturn_index", lambda: opreturn_index.metrics)
+REGISTRY.bridge("bulk_registration", lambda: bulk_registration.metrics)
+REGISTRY.bridge("upload_sessions", lambda: upload_sessions.metrics)
+REGISTRY.bridge("registration_listing", lambda: registration_listing.metrics)
+REGISTRY.bridge("proof_verifier", lambda: proof_verifier.metrics)
+REGISTRY.bridge("fee_estimator", lambda: fee_estimator.metrics)
+REGISTRY.bridge("anchor_fee_bumper", lambda: anchor_fee_bumper.metrics)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_prometheus_metrics():
+    """
+    Métricas no formato texto do Prometheus. Cada processo (worker do gunicorn)
+    expõe as suas próprias séries.
+    """
+    return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
+
 
 def create_random_wallet(prefix="copyright_plat_"):
     """Cria uma nova carteira com um prefixo aleatório."""
@@ -321,25 +1064,50 @@ def mine_blocks(address, num_blocks=21):
     rpc = get_rpc_connection()
     return rpc.generatetoaddress(num_blocks, address)
 
-def initialize_wallet():
-    """Inicializa a carteira padrão e gera blocos iniciais se necessário."""
-    print("Verificando ou criando uma nova carteira...")
-    ensure_wallet_exists()
+# Cache curto do histórico por endereço, invalidado a cada bloco novo e pagamento confirmado
+ADDRESS_CACHE_TTL = float(os.getenv('ADDRESS_CACHE_TTL', 5))
+ADDRESS_CACHE_SIZE = int(os.getenv('ADDRESS_CACHE_SIZE', 10000))
+address_cache = OrderedDict()  # endereço -> (expira_em, transações)
+address_cache_lock = Lock()
 
-    rpc = get_rpc_connection("platform_wallet")
-    address = rpc.getnewaddress()
-    print(f"Endereço gerado pelo nó (regtest): {address}")
 
-    if rpc.getblockchaininfo()["chain"] == "regtest":
-        print("Rede regtest detectada. Gerando blocos para ativação...")
-        block_hashes = rpc.generatetoaddress(101, address)
-        print(f"Blocos gerados: {len(block_hashes)}")
-        print(f"Primeiro bloco: {block_hashes[0]}")
+def invalidate_address_cache(address=None):
+    with address_cache_lock:
+        if address is None:
+            address_cache.clear()
+        else:
+            address_cache.pop(address, None)
+
+
+def get_received_by_address(rpc, address):
+    """
+    Consulta apenas o endereço pedido via address_filter do listreceivedbyaddress,
+    em vez de listar todos os endereços já emitidos pela carteira.
+    """
+    with address_cache_lock:
+        cached = address_cache.get(address)
+        if cached and cached[0] > time.monotonic():
+            address_cache.move_to_end(address)
+            return cached[1]
+
+    try:
+        transactions = rpc.listreceivedbyaddress(0, True, True, address)
+    except JSONRPCException as e:
+        # address_filter inválido (endereço de outra rede, por exemplo): nenhum recebimento
+        if e.error.get('code') == -4:
+            transactions = []
+        else:
+            raise
+
+    if ADDRESS_CACHE_TTL > 0:
+        with address_cache_lock:
+            address_cache[address] = (time.monotonic() + ADDRESS_CACHE_TTL, transactions)
+            address_cache.move_to_end(address)
+            while len(address_cache) > ADDRESS_CACHE_SIZE:
+                address_cache.popitem(last=False)
+    return transactions
+
 
-    return {
-        'address': address
-    }
-    
 @app.route('/api/transactions/<address>', methods=['GET'])
 def get_transactions_by_address(address):
     """
@@ -350,11 +1118,8 @@ def get_transactions_by_address(address):
         wallet_name = "platform_wallet"
         rpc = get_rpc_connection(wallet_name)
 
-        # Lista as transações para o endereço
-        transactions = rpc.listreceivedbyaddress(0, True, True)
-
-        # Filtra as transações pelo endereço fornecido
-        address_transactions = [tx for tx in transactions if tx['address'] == address]
+        # Lista as transações apenas do endereço fornecido
+        address_transactions = get_received_by_address(rpc, address)
 
         return jsonify({
             "status": "success",
@@ -373,11 +1138,9 @@ def confirm_transaction(txid):
     Verifica o status de uma transação específica.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT status FROM transactions WHERE txid = ?", (txid,))
-        result = cursor.fetchone()
-        conn.close()
+        with db.cursor() as cursor:
+            cursor.execute("SELECT status FROM transactions WHERE txid = ?", (txid,))
+            result = cursor.fetchone()
 
         if result:
             return jsonify({
@@ -394,67 +1157,67 @@ def confirm_transaction(txid):
 
 
 # @app.route('/api/transaction/opreturn', methods=['POST'])
-def create_opreturn_transaction(data):
+def create_opreturn_transaction(data, on_signed=None):
     """
-    Cria uma transação OP_RETURN com o hash fornecido.
+    Cria uma transação OP_RETURN com o dado fornecido (hex) e retorna o TXID.
+    on_signed recebe a transação assinada antes do envio.
     """
     try:
         # Conecta à carteira padrão
         wallet_name = "platform_wallet"
-        rpc = get_rpc_connection(wallet_name)
+        utxo_manager = get_utxo_manager(db, wallet_name, get_rpc_connection(wallet_name))
 
-        # Obtém UTXOs disponíveis
-        utxos = rpc.listunspent(1)
-        utxos = [utxo for utxo in utxos if utxo['spendable']]
-        if not utxos:
-            raise ValueError("Sem fundos disponíveis para criar a transação.")
-
-        # Seleciona o primeiro UTXO disponível
-        utxo = utxos[0]
-        txid = utxo['txid']
-        vout = utxo['vout']
-        amount = utxo['amount']
-
-        # Calcula a mudança (subtraindo a taxa de transação mínima)
-        change_address = rpc.getrawchangeaddress()
-        fee = Decimal('0.0001')
-        change_amount = Decimal(amount) - fee
-        if change_amount <= 0:
-            raise ValueError("Fundos insuficientes para cobrir a taxa de transação!")
-
-        # Cria a transação com OP_RETURN
-        outputs = {
-            "data": data,
-            change_address: float(change_amount)
-        }
-
-        # Cria, assina e envia a transação
-        raw_tx = rpc.createrawtransaction([{"txid": txid, "vout": vout}], outputs)
-        signed_tx = rpc.signrawtransactionwithwallet(raw_tx)
-        if not signed_tx['complete']:
-            raise ValueError("Falha ao assinar a transação.")
-        sent_txid = rpc.sendrawtransaction(signed_tx['hex'])
-
-        # Salva o TXID da transação OP_RETURN no banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE transactions SET op_return_txid = ? WHERE hash = ?",
-            (sent_txid, data)
-        )
-        conn.commit()
-        conn.close()
+        # Seleciona e reserva os UTXOs, acrescenta o troco, assina e envia com a taxa estimada
+        sent_txid = utxo_manager.send([{"data": data}], fee_estimator.fee_rate(), on_signed=on_signed)
 
         print(f"OP_RETURN transaction created successfully! TXID: {sent_txid}")
-        return jsonify({
-            "status": "success",
-            "message": "Transação OP_RETURN criada com sucesso!",
-            "op_return_txid": sent_txid
-        })
+        return sent_txid
     except Exception as e:
         print(f"Error creating OP_RETURN transaction: {e}")
         raise
-    
+
+
+def resend_opreturn_transaction(raw_tx):
+    """Reenvia uma transação OP_RETURN já assinada; retorna o TXID ou None se ela foi invalidada."""
+    wallet_name = "platform_wallet"
+    return get_utxo_manager(db, wallet_name, get_rpc_connection(wallet_name)).rebroadcast(raw_tx)
+
+
+def bump_opreturn_transaction(txid):
+    """
+    Substitui (RBF) um OP_RETURN preso por FEE_BUMP_AFTER_BLOCKS blocos, com a taxa
+    estimada para FEE_BUMP_CONF_TARGET blocos. Retorna o TXID substituto ou None.
+    """
+    wallet_name = "platform_wallet"
+    rpc = get_rpc_connection(wallet_name)
+    wallet_tx = rpc.gettransaction(txid)
+    # Substituição feita antes de uma queda, ainda não registrada no lote
+    if wallet_tx.get("replaced_by_txid"):
+        return wallet_tx["replaced_by_txid"]
+    if wallet_tx["confirmations"] != 0:
+        return None
+    try:
+        entry = rpc.getmempoolentry(txid)
+    except JSONRPCException:
+        return None
+
+    fee_rate = plan_bump(entry, rpc.getblockcount(), fee_estimator.fee_rate(FEE_BUMP_CONF_TARGET))
+    if fee_rate is None:
+        return None
+    # O bumpfee reduz o troco da própria transação e reassina as mesmas entradas
+    new_txid = rpc.bumpfee(txid, {"fee_rate": float(fee_rate)})["txid"]
+    get_utxo_manager(db, wallet_name, rpc).forget(txid)
+    print(f"OP_RETURN {txid} acelerado para {fee_rate} sat/vB: {new_txid}.")
+    return new_txid
+
+
+# Ancoragem em lote: uma única transação OP_RETURN com a raiz de Merkle de vários documentos
+anchor_batcher = AnchorBatcher(db, create_opreturn_transaction, resend_opreturn_transaction,
+                               on_status=notifier.publish_anchor)
+
+# Aceleração por RBF dos OP_RETURN que continuam fora da cadeia
+anchor_fee_bumper = AnchorFeeBumper(anchor_batcher, bump_opreturn_transaction)
+
 
 @app.route('/api/transaction/opreturn/confirm', methods=['POST'])
 def confirm_opreturn_transaction():
@@ -477,51 +1240,18 @@ def confirm_opreturn_transaction():
         if balance <= 0:
             return jsonify({"status": "error", "message": "Nenhum pagamento detectado na carteira."}), 400
 
-        # Obtém UTXOs disponíveis
-        utxos = rpc.listunspent(1)
-        utxos = [utxo for utxo in utxos if utxo['spendable']]
-
-        if not utxos:
-            return jsonify({"status": "error", "message": "Sem fundos disponíveis para criar a transação."}), 400
-
-        # Seleciona o primeiro UTXO disponível
-        utxo = utxos[0]
-        txid = utxo['txid']
-        vout = utxo['vout']
-        amount = utxo['amount']
-
-        # Calcula a mudança (subtraindo a taxa de transação mínima)
-        change_address = rpc.getrawchangeaddress()
-        fee = Decimal('0.0001')
-        change_amount = Decimal(amount) - fee
-
-        if change_amount <= 0:
-            return jsonify({"status": "error", "message": "Fundos insuficientes para cobrir a taxa de transação!"}), 400
-
-        # Cria a transação com OP_RETURN
-        outputs = {
-            "data": data,
-            change_address: float(change_amount)
-        }
-
-        # Cria, assina e envia a transação
-        raw_tx = rpc.createrawtransaction([{"txid": txid, "vout": vout}], outputs)
-        signed_tx = rpc.signrawtransactionwithwallet(raw_tx)
-
-        if not signed_tx['complete']:
-            return jsonify({"status": "error", "message": "Falha ao assinar a transação."}), 500
-
-        sent_txid = rpc.sendrawtransaction(signed_tx['hex'])
+        # Seleciona e reserva os UTXOs, acrescenta o troco, assina e envia com a taxa estimada
+        try:
+            sent_txid = get_utxo_manager(db, wallet_name, rpc).send([{"data": data}], fee_estimator.fee_rate())
+        except InsufficientFundsError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
 
         # Salva o TXID da transação OP_RETURN no banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE transactions SET op_return = ? WHERE ipfs_hash = ?",
-            (sent_txid, data)
-        )
-        conn.commit()
-        conn.close()
+        with db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE transactions SET op_return_txid = ? WHERE ipfs_hash = ?",
+                (sent_txid, data)
+            )
 
         return jsonify({
             "status": "success",
@@ -544,29 +1274,41 @@ def download_from_opreturn():
         if not identifier:
             return jsonify({"status": "error", "message": "O parâmetro 'identifier' é obrigatório."}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Tenta encontrar o registro pelo TXID ou pelo hash IPFS
-        cursor.execute(
-            "SELECT ipfs_hash FROM transactions WHERE op_return_txid = ? OR ipfs_hash = ?",
-            (identifier, identifier)
-        )
-        result = cursor.fetchone()
-        conn.close()
+        # Tenta encontrar o registro pelo TXID ou pelo hash IPFS (cada ramo usa seu índice)
+        with db.cursor() as cursor:
+            cursor.execute(
+                '''
+                SELECT t.ipfs_hash, t.hash, t.merkle_proof, a.merkle_root
+                FROM transactions t LEFT JOIN anchors a ON a.id = t.anchor_id
+                WHERE t.op_return_txid = ?
+                UNION ALL
+                SELECT t.ipfs_hash, t.hash, t.merkle_proof, a.merkle_root
+                FROM transactions t LEFT JOIN anchors a ON a.id = t.anchor_id
+                WHERE t.ipfs_hash = ?
+                LIMIT 1
+                ''',
+                (identifier, identifier)
+            )
+            result = cursor.fetchone()
 
         if not result:
             return jsonify({"status": "error", "message": "Transação ou hash IPFS não encontrado."}), 404
 
-        ipfs_hash = result[0]
+        ipfs_hash, document_hash, merkle_proof, merkle_root = result
         download_url = f"http://127.0.0.1:8080/ipfs/{ipfs_hash}"  # Gateway HTTP do IPFS
 
-        return jsonify({
+        response = {
             "status": "success",
             "message": "Arquivo encontrado no IPFS.",
             "ipfs_hash": ipfs_hash,
             "download_url": download_url
-        })
+        }
+        # Documentos ancorados em lote trazem a prova de inclusão na raiz de Merkle
+        if merkle_proof and merkle_root:
+            response["merkle_root"] = merkle_root
+            response["merkle_proof"] = json.loads(merkle_proof)
+            response["merkle_verified"] = verify_document_proof(document_hash, ipfs_hash, merkle_proof, merkle_root)
+        return jsonify(response)
     except Exception as e:
         return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
     
@@ -616,19 +1358,15 @@ def send_transaction():
                 "message": f"Saldo insuficiente. Saldo disponível: {balance} BTC."
             }), 400
 
-        # Garante que a taxa está definida corretamente
-        rpc.settxfee(0.0001)
-        print(f"Taxa de transação definida como 0.0001 BTC.")
+        # Taxa estimada em sat/vB (fee_rate, 10º parâmetro); a transação sinaliza RBF
+        fee_rate = fee_estimator.fee_rate()
 
         # Envia a transação
-        print(f"Enviando {amount} BTC para {address}...")
-        txid = rpc.sendtoaddress(address, float(amount))
+        print(f"Enviando {amount} BTC para {address} a {fee_rate} sat/vB...")
+        txid = rpc.sendtoaddress(address, float(amount), "", "", False, True, None, "unset", None, float(fee_rate))
         
-        connDB = get_db_connection()
-        cursor = connDB.cursor()        
-        
-        cursor.execute("UPDATE transactions SET txid = ? WHERE client_address = ?", (txid, address))
-        connDB.commit()
+        with db.cursor() as cursor:
+            cursor.execute("UPDATE transactions SET txid = ? WHERE client_address = ?", (txid, address))
         
         print(f"Transação enviada com sucesso! TXID: {txid}")
 
@@ -650,8 +1388,7 @@ def send_transaction():
 @app.route('/api/transaction/<string:txid>', methods=['GET'])
 def get_transaction_by_hash(txid):
     try:
-        rpc = get_rpc_connection()
-        transaction = rpc.getrawtransaction(txid, True)
+        transaction = chain_cache.get_raw_transaction(txid)
         return jsonify({"status": "success", "message": "Transaction retrieved successfully!", "transaction": transaction})
     except JSONRPCException as e:
         return jsonify({"status": "error", "message": f'RPC error: {str(e)}'}), 400
@@ -666,29 +1403,23 @@ def get_ipfs_from_opreturn():
         if not txid:
             return jsonify({"status": "error", "message": "O parâmetro 'txid' é obrigatório."}), 400
 
-        # Conecta ao Bitcoin Core para obter os detalhes da transação
-        rpc = get_rpc_connection()
-        transaction = rpc.getrawtransaction(txid, True)
-
-        # Extrai os dados do OP_RETURN
-        vout = transaction.get("vout", [])
-        op_return_data = None
-        for output in vout:
-            script_pubkey = output.get("scriptPubKey", {})
-            asm = script_pubkey.get("asm", "")
-            if asm.startswith("OP_RETURN"):
-                # Extrai o dado após OP_RETURN (em hexadecimal)
-                op_return_data = asm.split(" ")[1]
+        # Obtém os detalhes da transação (do cache, se já estiver profunda na cadeia)
+        transaction = chain_cache.get_raw_transaction(txid)
+
+        # Decodifica o primeiro OP_RETURN direto do script (hex), inclusive dados com OP_PUSHDATA
+        op_return_bytes = None
+        for output in transaction.get("vout", []):
+            script_hex = output.get("scriptPubKey", {}).get("hex", "")
+            if script_hex.startswith("6a"):
+                op_return_bytes = decode_op_return(script_hex)
                 break
 
-        if not op_return_data:
+        if op_return_bytes is None:
             return jsonify({"status": "error", "message": "Nenhum dado OP_RETURN encontrado nesta transação."}), 404
 
-        # Decodifica o dado OP_RETURN como bytes
-        try:
-            op_return_bytes = bytes.fromhex(op_return_data)
-        except ValueError:
-            return jsonify({"status": "error", "message": "Dado OP_RETURN inválido (não é hexadecimal)."}), 400
+        # 32 bytes: raiz de Merkle de um lote de documentos
+        if len(op_return_bytes) == 32:
+            return get_ipfs_from_merkle_anchor(txid, op_return_bytes.hex())
 
         # Verifica se o dado é um hash IPFS válido
         ipfs_hash = op_return_bytes.decode('utf-8', errors='ignore')  # Ignora erros de decodificação
@@ -709,18 +1440,52 @@ def get_ipfs_from_opreturn():
         return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
     
     
+def get_ipfs_from_merkle_anchor(txid, merkle_root):
+    """
+    Verifica, contra a raiz gravada na cadeia, a inclusão do documento informado
+    pelo parâmetro 'ipfs_hash' em uma transação de ancoragem em lote.
+    """
+    ipfs_hash = request.args.get('ipfs_hash')
+    if not ipfs_hash:
+        return jsonify({
+            "status": "error",
+            "message": "Transação de ancoragem em lote: informe o parâmetro 'ipfs_hash' do documento.",
+            "merkle_root": merkle_root
+        }), 400
+
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT hash, merkle_proof FROM transactions WHERE op_return_txid = ? AND ipfs_hash = ?",
+            (txid, ipfs_hash)
+        )
+        result = cursor.fetchone()
+
+    if not result or not result[1]:
+        return jsonify({"status": "error", "message": "Documento não encontrado neste lote."}), 404
+
+    document_hash, merkle_proof = result
+    if not verify_document_proof(document_hash, ipfs_hash, merkle_proof, merkle_root):
+        return jsonify({"status": "error", "message": "A prova de Merkle não confere com a raiz registrada na transação."}), 400
+
+    return jsonify({
+        "status": "success",
+        "message": "Hash IPFS recuperado com sucesso!",
+        "ipfs_hash": ipfs_hash,
+        "download_url": f"http://127.0.0.1:8080/ipfs/{ipfs_hash}",
+        "merkle_root": merkle_root,
+        "merkle_proof": json.loads(merkle_proof)
+    })
+
+
 @app.route('/api/transaction/ipfs/<txid>', methods=['GET'])
 def get_transaction_ipfs_by_hash(txid):
     try:
-        rpc = get_rpc_connection()
-        transaction = rpc.getrawtransaction(txid, True)
+        transaction = chain_cache.get_raw_transaction(txid)
 
         # Consulta o banco de dados para obter informações adicionais
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT ipfs_hash FROM transactions WHERE txid = ?", (txid,))
-        result = cursor.fetchone()
-        conn.close()
+        with db.cursor() as cursor:
+            cursor.execute("SELECT ipfs_hash FROM transactions WHERE txid = ?", (txid,))
+            result = cursor.fetchone()
 
         ipfs_hash = result[0] if result else None
         download_url = f"http://127.0.0.1:8080/ipfs/{ipfs_hash}" if ipfs_hash else None
@@ -743,19 +1508,78 @@ def get_transaction_ipfs_by_hash(txid):
     
 @app.route('/api/transaction/count', methods=['GET'])
 def get_transaction_count():
+    # Lê o topo já indexado; o índice é estendido pelo monitor a cada novo bloco
+    with db.cursor() as cursor:
+        tip = indexed_tip(cursor)
+
+    total_tx_count = tip[2] if tip else 0
+    return jsonify({
+        "status": "success",
+        "message": "Transaction count retrieved successfully!",
+        "transaction_count": total_tx_count,
+        "indexed_height": tip[0] if tip else -1
+    })
+
+
+def backfill_block_index():
+    """Preenche o índice de blocos em segundo plano na inicialização."""
     try:
-        rpc = get_rpc_connection()
-        block_count = rpc.getblockcount()
+        with db.connection() as conn:
+            tip = sync_block_index(get_rpc_connection(), conn)
+        print(f"Índice de blocos sincronizado até a altura {tip[0] if tip else -1}.")
+    except Exception as e:
+        print(f"Erro ao sincronizar índice de blocos: {e}")
 
-        total_tx_count = 0
-        for i in range(block_count + 1):
-            block_hash = rpc.getblockhash(i)
-            block = rpc.getblock(block_hash)
-            total_tx_count += len(block.get('tx', []))
 
-        return jsonify({"status": "success", "message": "Transaction count retrieved successfully!", "transaction_count": total_tx_count})
-    except JSONRPCException as e:
-        return jsonify({"status": "error", "message": f'RPC error: {str(e)}'}), 400
+def extend_block_index(rpc):
+    """Acrescenta ao índice de blocos os blocos novos; não espera pelo backfill em andamento."""
+    try:
+        with db.connection() as conn:
+            sync_block_index(rpc, conn, blocking=False)
+    except Exception as e:
+        print(f"Erro ao estender índice de blocos: {e}")
+
+
+def backfill_opreturn_index():
+    """Varre em segundo plano os blocos ainda não indexados; retoma a varredura interrompida anterior."""
+    try:
+        scanned = opreturn_index.scan()
+        print(f"Índice de OP_RETURN: {scanned} blocos varridos, cadeia indexada até a altura {opreturn_index.scanned_height()}.")
+    except Exception as e:
+        print(f"Erro ao varrer a cadeia para o índice de OP_RETURN: {e}")
+
+
+@app.route('/api/opreturn/index', methods=['GET'])
+def lookup_opreturn_index():
+    """
+    Consulta no índice da cadeia as transações OP_RETURN de um CID ('cid') ou
+    de um documento registrado, pelo SHA-256 ('hash').
+    """
+    try:
+        cid = request.args.get('cid')
+        document_hash = request.args.get('hash')
+        if cid:
+            occurrences = opreturn_index.find_by_payload(cid.strip())
+        elif document_hash:
+            occurrences = opreturn_index.find_by_document(normalize_hash(document_hash))
+        else:
+            return jsonify({"status": "error", "message": "Informe o parâmetro 'cid' ou 'hash'."}), 400
+
+        if not occurrences:
+            return jsonify({
+                "status": "error",
+                "message": "Nenhuma transação OP_RETURN encontrada no índice.",
+                "scanned_height": opreturn_index.scanned_height()
+            }), 404
+
+        return jsonify({
+            "status": "success",
+            "message": "Transações OP_RETURN encontradas.",
+            "occurrences": occurrences,
+            "scanned_height": opreturn_index.scanned_height()
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Erro inesperado: {str(e)}"}), 500
 
 @app.route('/api/transactions/list', methods=['GET'])
 def list_transactions():
@@ -923,6 +1747,41 @@ def create_wallet():
     except JSONRPCException as e:
         return jsonify({"status": "error", "message": f'RPC error: {str(e)}'}), 400
 
+@app.route('/api/wallet/utxos', defaults={'wallet_name': 'platform_wallet'}, methods=['GET'])
+@app.route('/api/wallet/utxos/<string:wallet_name>', methods=['GET'])
+def get_wallet_utxos(wallet_name):
+    """Resumo do conjunto de UTXOs mantido em cache para a carteira."""
+    utxo_manager = get_utxo_manager(db, wallet_name, get_rpc_connection(wallet_name))
+    return jsonify({"status": "success", "wallet_name": wallet_name, "utxos": utxo_manager.stats()})
+
+
+@app.route('/api/wallet/utxos/split', methods=['POST'])
+def split_wallet_utxos():
+    """
+    Divide os fundos da carteira em várias moedas de mesmo valor (fan-out), para
+    que transações OP_RETURN simultâneas não disputem o mesmo UTXO.
+    """
+    try:
+        wallet_name = request.json.get('wallet_name', 'platform_wallet')
+        count = int(request.json.get('count', 0))
+        amount = Decimal(str(request.json.get('amount', 0)))
+        if count <= 0 or count > 1000 or amount <= 0:
+            return jsonify({
+                "status": "error",
+                "message": "Informe 'count' (1 a 1000) e 'amount' maior que zero."
+            }), 400
+
+        utxo_manager = get_utxo_manager(db, wallet_name, get_rpc_connection(wallet_name))
+        txid = utxo_manager.fan_out(count, amount, fee_estimator.fee_rate())
+        return jsonify({"status": "success", "message": "UTXOs divididos com sucesso!", "txid": txid})
+    except InsufficientFundsError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except JSONRPCException as e:
+        return jsonify({"status": "error", "message": f'Erro RPC: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f'Erro inesperado: {str(e)}'}), 500
+
+
 @app.route('/api/wallet/details/<string:wallet_name>', methods=['GET'])
 def get_wallet_details(wallet_name):
     try:
@@ -958,7 +1817,9 @@ def initialize_wallet():
     print("Carregando carteira padrão para obter um endereço...")
     address = get_new_address("platform_wallet")  # Agora chamamos explicitamente a carteira correta   
 
-    if get_rpc_connection("platform_wallet").getblockchaininfo()["chain"] == "regtest":
+    # Só uma cadeia regtest nova precisa dos blocos de ativação; reinícios e outros workers não mineram de novo
+    blockchain_info = get_rpc_connection("platform_wallet").getblockchaininfo()
+    if blockchain_info["chain"] == "regtest" and blockchain_info["blocks"] < 101:
         print("Rede regtest detectada. Gerando blocos para ativação...")
         block_hashes = get_rpc_connection("platform_wallet").generatetoaddress(101, address)
         print(f"Blocos gerados: {len(block_hashes)}")
@@ -993,6 +1854,10 @@ def generate_blocks():
     except JSONRPCException as e:
         return jsonify({"status": "error", "message": f'RPC error: {str(e)}'}), 400
 
+# Código do JSON-RPC para método inexistente: o proxy do pool aceita qualquer nome
+RPC_METHOD_NOT_FOUND = -32601
+
+
 # RPC remote commands terminal
 @app.route('/api/rpc-command', methods=['POST'])
 def execute_rpc_command():
@@ -1005,10 +1870,6 @@ def execute_rpc_command():
 
         rpc = get_rpc_connection()
 
-        method = getattr(rpc, command, None)
-        if not method:
-            return jsonify({"status": "error", "message": f'Command "{command}" not recognized by Bitcoin Core!'}), 400
-
         typed_args = []
         for arg in args:
             try:
@@ -1019,28 +1880,120 @@ def execute_rpc_command():
             except ValueError:
                 typed_args.append(arg)
 
-        result = method(*typed_args)
+        result = rpc.call_(command, *typed_args)
         return jsonify({"status": "success", "message": "Command executed successfully!", "result": result})
     except JSONRPCException as e:
+        if e.error.get('code') == RPC_METHOD_NOT_FOUND:
+            return jsonify({"status": "error", "message": f'Command "{command}" not recognized by Bitcoin Core!'}), 400
         return jsonify({"status": "error", "message": f'RPC error: {str(e)}'}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": f'Unexpected error: {str(e)}'}), 500
 
 
-if __name__ == '__main__':
-    print("Inicializando o sistema...")
-    wallet = initialize_wallet()
-    
-    print("Inicializando banco de dados...")
-    init_db()
-    
+# Serviços de fundo (monitor, fila de jobs, ancoragem, pool de endereços, índices) e a inicialização
+# da carteira rodam em um único processo da implantação: 'auto' elege o primeiro worker que obtiver
+# a trava do arquivo, 'true' força e 'false' desativa (ex.: réplicas só de API).
+RUN_SERVICES = os.getenv('RUN_SERVICES', 'auto').lower()
+INIT_LOCK_PATH = os.getenv('INIT_LOCK_PATH', os.path.join(BASE_DIR, "data", "init.lock"))
+SERVICES_LOCK_PATH = os.getenv('SERVICES_LOCK_PATH', os.path.join(BASE_DIR, "data", "services.lock"))
+# Servidor embutido (python app.py); em produção o gunicorn lê gunicorn.conf.py
+PORT = int(os.getenv('PORT', 5000))
+FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes')
+
+_startup_lock = Lock()
+_app_ready = False
+_services_lock_file = None
+
+
+def initialize():
+    """
+    Migrações e caches em memória do processo. Os workers passam por aqui um
+    de cada vez (trava exclusiva em arquivo); depois do primeiro, as migrações
+    encontram o esquema atualizado e não repetem o trabalho.
+    """
+    with open(INIT_LOCK_PATH, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        print("Inicializando banco de dados...")
+        init_db()
+
+
+def claim_services():
+    """Decide se este processo executa os serviços de fundo."""
+    global _services_lock_file
+    if RUN_SERVICES in ('1', 'true', 'yes'):
+        return True
+    if RUN_SERVICES in ('0', 'false', 'no'):
+        return False
+    lock_file = open(SERVICES_LOCK_PATH, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # O arquivo fica aberto: a trava é liberada pelo sistema quando o processo termina
+    _services_lock_file = lock_file
+    return True
+
+
+def start_services():
+    """Inicia as tarefas de fundo do pipeline (greenlets com gevent, threads no modo 'threading')."""
+    # Travas de UTXOs abandonadas (ex.: por uma execução anterior) ficam no bitcoind até serem liberadas
+    print("Iniciando liberação de travas de UTXOs abandonadas...")
+    socketio.start_background_task(
+        get_utxo_manager(db, "platform_wallet", get_rpc_connection("platform_wallet")).run_forever
+    )
+
     print("Iniciando monitoramento de transações...")
-    Thread(target=monitor_transactions, daemon=True).start()
-    
-    print("Sistema inicializado com sucesso!")
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
+    socketio.start_background_task(monitor_transactions)
+
+    print("Iniciando reposição do pool de endereços...")
+    socketio.start_background_task(address_pool.run_forever)
+
+    print("Iniciando workers da fila de jobs...")
+    job_queue.start()
 
+    print("Iniciando ancoragem em lote...")
+    socketio.start_background_task(anchor_batcher.run_forever)
 
+    print("Iniciando aceleração de ancoragens presas...")
+    socketio.start_background_task(anchor_fee_bumper.run_forever)
 
+    print("Sincronizando índice de blocos...")
+    socketio.start_background_task(backfill_block_index)
 
+    print("Varrendo a cadeia para o índice de OP_RETURN...")
+    socketio.start_background_task(backfill_opreturn_index)
 
+    print("Iniciando coleta de sessões de upload expiradas...")
+    socketio.start_background_task(upload_sessions.run_forever)
+
+
+def create_app():
+    """
+    Fábrica WSGI: prepara o processo na primeira chamada e retorna o app Flask
+    (o Socket.IO já está acoplado a ele). Ver wsgi.py e gunicorn.conf.py.
+    """
+    global _app_ready
+    with _startup_lock:
+        if _app_ready:
+            return app
+        initialize()
+        if claim_services():
+            # A carteira é do nó, não do processo: só o processo dos serviços a cria ou carrega
+            print("Inicializando a carteira...")
+            initialize_wallet()
+            start_services()
+            print(f"Serviços de fundo iniciados no processo {os.getpid()}.")
+        else:
+            print(f"Processo {os.getpid()} atende apenas a API; serviços de fundo em outro processo.")
+        print("Iniciando envio de notificações em tempo real...")
+        socketio.start_background_task(notifier.run_forever)
+        print("Sistema inicializado com sucesso!")
+        _app_ready = True
+    return app
+
+
+if __name__ == '__main__':
+    create_app()
+    # Sem o reloader: ele executaria create_app() em um segundo processo
+    socketio.run(app, host='0.0.0.0', port=PORT, debug=FLASK_DEBUG, use_reloader=False)
@@ -0,0 +1,116 @@
+"""
+Latência de GET /api/transactions/<endereço> com N endereços emitidos pela
+carteira da plataforma (um por upload): listreceivedbyaddress de todos os
+endereços filtrado em Python, como antes, contra o address_filter do
+listreceivedbyaddress, sem cache e com o cache curto. Resultado em JSON.
+
+    python bench/address_history.py --addresses 1000,10000,100000 --samples 20
+
+Uma fração --paid dos endereços recebe um pagamento; os demais aparecem vazios
+(include_empty), como os uploads ainda não pagos. Cada valor é a mediana de
+--samples endereços sorteados; response_bytes é o JSON que o bitcoind devolve.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, API_DIR)
+
+from fake_bitcoind import FakeNode, serve
+
+
+def issue(node, count, paid, rng):
+    """Emite count endereços de pagamento; uma fração paid recebe um pagamento no mempool."""
+    addresses = []
+    with node.lock:
+        for _ in range(count):
+            address = node._new_address("payment")
+            if rng.random() < paid:
+                txid = node._add_tx([{"txid": "00" * 32, "vout": node._next(), "sequence": 0xfffffffd}],
+                                    [[address, 100000]])
+                node.mempool[txid] = node._tip()
+            addresses.append(address)
+    return addresses
+
+
+def timed(fn, keys):
+    durations = []
+    for key in keys:
+        started = time.perf_counter()
+        fn(key)
+        durations.append(time.perf_counter() - started)
+    return round(statistics.median(durations) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--addresses", default="1000,10000,100000", help="endereços emitidos em cada medição")
+    parser.add_argument("--paid", type=float, default=0.5, help="fração dos endereços com pagamento")
+    parser.add_argument("--samples", type=int, default=20, help="endereços consultados por cenário")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="address_history_")
+    os.environ.update(RPC_HOST="127.0.0.1", DB_PATH=os.path.join(workdir, "transactions.db"),
+                      METRICS_ENABLED="false")
+    node = FakeNode(blocks=101, txs_per_block=0)
+    addresses = []
+    report = {"paid": args.paid, "samples": args.samples, "cpus": os.cpu_count(), "levels": []}
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            import app
+        client = app.app.test_client()
+
+        for count in (int(value) for value in args.addresses.split(",")):
+            addresses += issue(node, count - len(addresses), args.paid, rng)
+            server = serve(0, node=node)
+            process = get_context("fork").Process(target=server.serve_forever, daemon=True)
+            process.start()
+            server.server_close()
+            app.RPC_PORT = server.server_address[1]
+            rpc = app.get_rpc_connection("platform_wallet")
+            keys = rng.sample(addresses, args.samples)
+
+            def filter_in_python(address):
+                return [tx for tx in rpc.listreceivedbyaddress(0, True, True) if tx['address'] == address]
+
+            def endpoint(address):
+                response = client.get(f"/api/transactions/{address}")
+                assert response.status_code == 200, response.get_json()
+
+            try:
+                full_list = rpc.listreceivedbyaddress(0, True, True)
+                filtered = rpc.listreceivedbyaddress(0, True, True, keys[0])
+                level = {"addresses": count,
+                         "full_list_response_bytes": len(json.dumps(full_list, default=str)),
+                         "filtered_response_bytes": len(json.dumps(filtered, default=str)),
+                         "filter_in_python_ms": timed(filter_in_python, keys)}
+                app.ADDRESS_CACHE_TTL = 0
+                level["address_filter_ms"] = timed(endpoint, keys)
+                app.ADDRESS_CACHE_TTL = 5
+                for address in keys:
+                    endpoint(address)
+                level["address_filter_cached_ms"] = timed(endpoint, keys)
+                level["speedup"] = round(level["filter_in_python_ms"] / level["address_filter_ms"])
+                report["levels"].append(level)
+                print(f"{count} endereços: medido", file=sys.stderr, flush=True)
+            finally:
+                process.terminate()
+                app.invalidate_address_cache()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
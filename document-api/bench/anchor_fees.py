@@ -0,0 +1,143 @@
+"""
+Latência de confirmação das ancoragens OP_RETURN em um mercado de taxas
+simulado: taxa fixa de 0.0001 BTC contra a taxa do estimatesmartfee (com e sem
+aceleração por RBF), usando as funções de fee_estimator do próprio projeto.
+Resultado em JSON: latência em blocos (mediana, p95, máximo) e taxa total paga.
+
+    python bench/anchor_fees.py --blocks 4032 --anchors-per-block 10 --seed 1
+
+A cada bloco, a taxa mínima para entrar nele (sat/vB) segue um ciclo diário com
+picos de congestionamento. O estimatesmartfee simulado responde com um quantil
+das taxas dos blocos recentes, como o do bitcoind, atrasado em relação ao mercado.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fee_estimator import (FEE_BUMP_CONF_TARGET, FEE_CONF_TARGET, FeeEstimator, estimate_vsize, fee_for,
+                           plan_bump)
+
+FIXED_FEE = Decimal('0.0001')
+# OP_RETURN com a raiz de Merkle (32 bytes), uma entrada P2WPKH e o troco
+ANCHOR_OUTPUTS = [{"data": "00" * 32}]
+ANCHOR_VSIZE = estimate_vsize([Decimal(68)], ANCHOR_OUTPUTS)
+
+
+def fee_market(blocks, seed):
+    """Taxa mínima de inclusão por bloco: ciclo diário, ruído log-normal e picos de congestionamento."""
+    rng = random.Random(seed)
+    rates = []
+    surge = 0.0
+    for height in range(blocks):
+        daily = math.sin(2 * math.pi * height / 144)
+        if rng.random() < 0.004:
+            surge = rng.uniform(1.5, 3.0)  # congestionamento: taxas multiplicadas por e^surge
+        surge *= 0.97
+        log_rate = math.log(6) + 1.1 * daily + surge + rng.gauss(0, 0.35)
+        rates.append(max(1.0, math.exp(log_rate)))
+    return rates
+
+
+class SimulatedNode:
+    """Responde estimatesmartfee e getmempoolinfo a partir dos blocos já minerados."""
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.height = 0
+
+    def batch_results(self, calls):
+        results = []
+        for call in calls:
+            if call[0] == "getmempoolinfo":
+                results.append(({"mempoolminfee": 0.00001}, None))
+                continue
+            target = call[1]
+            window = self.rates[max(0, self.height - 6 * target):self.height]
+            if len(window) < 6:
+                results.append(({"errors": ["Insufficient data or no feerate found"]}, None))
+                continue
+            # Alvos curtos pedem um quantil alto das taxas recentes; alvos longos aceitam o mediano
+            quantile = 0.95 if target <= 2 else 0.8 if target <= 6 else 0.5
+            rate = sorted(window)[min(int(len(window) * quantile), len(window) - 1)]
+            results.append(({"feerate": rate / 100000, "blocks": target}, None))
+        return results
+
+
+def simulate(rates, anchors_per_block, policy):
+    node = SimulatedNode(rates)
+    estimator = FeeEstimator(node, ttl=0)
+    pending = []  # [altura de envio, altura de entrada no mempool, taxa em BTC]
+    latencies, fees, bumps = [], Decimal(0), 0
+
+    for height, clearing_rate in enumerate(rates):
+        node.height = height
+        for _ in range(anchors_per_block):
+            if policy == "fixed":
+                fee = FIXED_FEE
+            else:
+                fee = fee_for(ANCHOR_VSIZE, estimator.fee_rate(FEE_CONF_TARGET))
+            pending.append([height, height, fee])
+
+        if policy == "estimate+rbf":
+            target_rate = estimator.fee_rate(FEE_BUMP_CONF_TARGET)
+            for anchor in pending:
+                entry = {"height": anchor[1], "vsize": ANCHOR_VSIZE, "fees": {"base": anchor[2]}, "descendantcount": 1}
+                new_rate = plan_bump(entry, height, target_rate)
+                if new_rate is not None:
+                    anchor[1], anchor[2] = height, fee_for(ANCHOR_VSIZE, new_rate)
+                    bumps += 1
+
+        # O bloco inclui as transações que pagam pelo menos a taxa mínima de inclusão
+        still_pending = []
+        for anchor in pending:
+            if anchor[2] / ANCHOR_VSIZE * 100000000 >= Decimal(str(clearing_rate)):
+                latencies.append(height + 1 - anchor[0])
+                fees += anchor[2]
+            else:
+                still_pending.append(anchor)
+        pending = still_pending
+
+    latencies.sort()
+    confirmed = len(latencies)
+    return {
+        "policy": policy,
+        "anchors": confirmed + len(pending),
+        "confirmed": confirmed,
+        "unconfirmed_at_end": len(pending),
+        "latency_blocks_median": latencies[confirmed // 2] if confirmed else None,
+        "latency_blocks_p95": latencies[min(int(confirmed * 0.95), confirmed - 1)] if confirmed else None,
+        "latency_blocks_max": latencies[-1] if confirmed else None,
+        "over_6_blocks": sum(1 for latency in latencies if latency > 6),
+        "rbf_bumps": bumps,
+        "total_fee_btc": float(fees),
+        "mean_fee_sat": round(float(fees) * 1e8 / confirmed, 1) if confirmed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=4032, help="blocos simulados (144 por dia)")
+    parser.add_argument("--anchors-per-block", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rates = fee_market(args.blocks, args.seed)
+    results = [simulate(rates, args.anchors_per_block, policy) for policy in ("fixed", "estimate", "estimate+rbf")]
+    print(json.dumps({
+        "blocks": args.blocks,
+        "anchor_vsize": ANCHOR_VSIZE,
+        "fixed_fee_rate": round(float(FIXED_FEE) * 1e8 / ANCHOR_VSIZE, 1),
+        "market_rate_median": round(sorted(rates)[len(rates) // 2], 1),
+        "market_rate_max": round(max(rates), 1),
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Registro de N arquivos pequenos: N uploads individuais (/api/ipfs/upload) contra
+um único upload em lote (/api/ipfs/upload/bulk). Reporta a duração total, a
+vazão e, no lote, o tempo até cada linha NDJSON, em JSON.
+
+    python bench/bulk_register.py --url http://127.0.0.1:5000 --files 10000 --size 1024
+
+Cada execução gera conteúdo aleatório: os documentos nunca são duplicados.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import requests
+from gevent.pool import Pool
+
+from stats import summary
+
+
+def make_files(count, size):
+    return [os.urandom(size) for _ in range(count)]
+
+
+def run_single(url, files, concurrency):
+    """Um POST por arquivo, com 'concurrency' conexões keep-alive."""
+    latencies, errors = [], []
+    sessions = {}
+
+    def upload(index):
+        session = sessions.setdefault(index % concurrency, requests.Session())
+        content = files[index]
+        started = time.monotonic()
+        try:
+            response = session.post(
+                f"{url}/api/ipfs/upload",
+                data={"data": hashlib.sha256(content).hexdigest()},
+                files={"file": (f"doc{index}.pdf", content)},
+                timeout=60
+            )
+            if response.status_code != 200:
+                errors.append(f"{response.status_code}: {response.text[:120]}")
+                return
+        except requests.RequestException as e:
+            errors.append(type(e).__name__)
+            return
+        latencies.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    Pool(concurrency).map(upload, range(len(files)))
+    duration = time.monotonic() - started
+    return {
+        "mode": "single",
+        "files": len(files),
+        "concurrency": concurrency,
+        "http_requests": len(files),
+        "payment_addresses": len(latencies),
+        "registered": len(latencies),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "duration_s": round(duration, 2),
+        "files_per_second": round(len(latencies) / duration, 1),
+        "latency": summary(latencies),
+    }
+
+
+def bulk_body(files, boundary):
+    """Corpo multipart gerado sob demanda (enviado com Transfer-Encoding: chunked)."""
+    for index, content in enumerate(files):
+        yield (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"hash\"\r\n\r\n"
+            f"{hashlib.sha256(content).hexdigest()}\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; filename=\"doc{index}.pdf\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + content + b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+def run_bulk(url, files):
+    """Um único POST com todos os arquivos; a resposta NDJSON é lida à medida que chega."""
+    boundary = uuid.uuid4().hex
+    arrivals = []
+    header = summary_line = None
+    started = time.monotonic()
+    response = requests.post(
+        f"{url}/api/ipfs/upload/bulk",
+        data=bulk_body(files, boundary),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        stream=True,
+        timeout=600
+    )
+    body_sent = time.monotonic() - started
+    statuses = {}
+    for raw in response.iter_lines():
+        line = json.loads(raw)
+        if line["type"] == "batch":
+            header = line
+        elif line["type"] == "summary":
+            summary_line = line
+        elif line["type"] == "item":
+            arrivals.append(time.monotonic() - started)
+            statuses[line["status"]] = statuses.get(line["status"], 0) + 1
+    duration = time.monotonic() - started
+    registered = summary_line["registered"] if summary_line else 0
+    return {
+        "mode": "bulk",
+        "files": len(files),
+        "http_requests": 1,
+        "payment_addresses": 1 if header else 0,
+        "registered": registered,
+        "item_statuses": statuses,
+        "amount": summary_line["amount"] if summary_line else None,
+        "request_sent_s": round(body_sent, 2),
+        "duration_s": round(duration, 2),
+        "files_per_second": round(registered / duration, 1),
+        "item_arrival": summary(arrivals),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", required=True, help="URL base da API")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--size", type=int, default=1024, help="bytes por arquivo")
+    parser.add_argument("--concurrency", type=int, default=16, help="uploads individuais simultâneos")
+    parser.add_argument("--mode", choices=("single", "bulk", "both"), default="both")
+    args = parser.parse_args()
+
+    results = []
+    if args.mode in ("single", "both"):
+        results.append(run_single(args.url, make_files(args.files, args.size), args.concurrency))
+    if args.mode in ("bulk", "both"):
+        results.append(run_bulk(args.url, make_files(args.files, args.size)))
+    print(json.dumps({"url": args.url, "size": args.size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
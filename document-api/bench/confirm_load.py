@@ -0,0 +1,69 @@
+"""
+Carga em GET /api/transaction/confirm/<txid> com uma conexão SQLite nova por
+requisição, como antes da camada database.Database, contra as conexões
+reaproveitadas do pool, na pilha da suíte (gunicorn e simulados). Resultado em JSON.
+
+    python bench/confirm_load.py --concurrency 1,10,50 --duration 10
+
+O cenário sem reuso sobe a API com DB_POOL_SIZE=0: cada bloco 'with' abre a
+conexão (com os pragmas de configure_connection) e a fecha ao final. Os txids
+consultados são de pagamentos reais feitos na preparação.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+from http_load import run_level
+from suite import Scenarios, Stack
+
+MODES = {"connection_per_request": "0", "pooled": None}
+
+
+def measure(mode, args):
+    pool_size = MODES[mode]
+    if pool_size is None:
+        os.environ.pop("DB_POOL_SIZE", None)
+    else:
+        os.environ["DB_POOL_SIZE"] = pool_size
+    stack = Stack(SimpleNamespace(node_latency=0, block_interval=0, ipfs_latency=0,
+                                  workers=args.workers, services=None))
+    failed = True
+    try:
+        url = stack.start()
+        scenarios = Scenarios(url, 1024)
+        scenarios.prepare(args.documents, 0.001)
+        make_request = scenarios.build("confirm", 0.001)
+        run_level(url, 1, args.warmup, make_request, error_status=400)
+        levels = []
+        for level in args.concurrency.split(","):
+            print(f"{mode}: concorrência {level}...", file=sys.stderr, flush=True)
+            levels.append(run_level(url, int(level), args.duration, make_request, error_status=400))
+        failed = False
+        return levels
+    finally:
+        stack.stop(keep_logs=failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", default="1,10,50", help="níveis separados por vírgula")
+    parser.add_argument("--duration", type=float, default=10, help="segundos por nível")
+    parser.add_argument("--warmup", type=float, default=2, help="segundos de aquecimento antes das medições")
+    parser.add_argument("--documents", type=int, default=20, help="documentos pagos consultados")
+    parser.add_argument("--workers", type=int, default=1, help="WEB_CONCURRENCY da API")
+    args = parser.parse_args()
+
+    report = {"workers": args.workers, "cpus": os.cpu_count(), "modes": {}}
+    for mode in MODES:
+        report["modes"][mode] = measure(mode, args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
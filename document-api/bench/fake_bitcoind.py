@@ -0,0 +1,656 @@
+"""
+bitcoind simulado para os benchmarks: servidor JSON-RPC (HTTP/1.1 keep-alive,
+lotes) com cadeia, mempool e carteira em memória, suficiente para o pipeline
+da API (endereços de pagamento, envios, OP_RETURN, varredura de blocos e
+aceleração por RBF), sem docker-compose nem regtest.
+
+    python bench/fake_bitcoind.py --port 18443 --blocks 300 --latency 0.002 --block-interval 2
+
+Simplificações: todas as carteiras compartilham o mesmo estado, o "hex" das
+transações é o JSON das entradas e saídas (só este servidor o interpreta) e as
+assinaturas não são verificadas. A maturidade do coinbase (100 blocos), a
+regra de gasto duplo e as taxas (entradas - saídas) seguem o bitcoind.
+"""
+import argparse
+import hashlib
+import json
+import math
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COIN = 100000000
+BLOCK_REWARD = 50 * COIN
+COINBASE_MATURITY = 100
+DUST_THRESHOLD = 546
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# Códigos de erro do bitcoind tratados pela API
+RPC_MISC_ERROR = -1
+RPC_METHOD_NOT_FOUND = -32601
+RPC_WALLET_ERROR = -4
+RPC_INVALID_ADDRESS_OR_KEY = -5
+RPC_WALLET_INSUFFICIENT_FUNDS = -6
+RPC_INVALID_PARAMETER = -8
+RPC_VERIFY_ERROR = -25
+RPC_VERIFY_REJECTED = -26
+RPC_VERIFY_ALREADY_IN_CHAIN = -27
+RPC_WALLET_ALREADY_LOADED = -35
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def sha256d(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).hexdigest()
+
+
+def to_btc(sats):
+    return sats / COIN
+
+
+def to_sats(amount):
+    return int(round(float(amount) * COIN))
+
+
+def bech32_like(seed):
+    """Endereço bcrt1q... com 39 caracteres de dados (formato P2WPKH) derivado de seed."""
+    digest = hashlib.sha256(seed.encode()).digest()
+    return "bcrt1q" + "".join(BECH32_CHARSET[byte % 32] for byte in digest[:38])
+
+
+def fake_cid(seed):
+    """CIDv0 (Qm...) derivado de seed, para os OP_RETURN de outros usuários da cadeia."""
+    number = int.from_bytes(b"\x12\x20" + hashlib.sha256(seed.encode()).digest(), "big")
+    chars = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        chars = BASE58_ALPHABET[remainder] + chars
+    return chars
+
+
+def script_for(address, value):
+    if address == "data":
+        length = len(value) // 2
+        push = f"{length:02x}" if length <= 75 else f"4c{length:02x}"
+        return {"asm": f"OP_RETURN {value}", "hex": f"6a{push}{value}", "type": "nulldata"}
+    program = hashlib.sha256(address.encode()).hexdigest()[:40]
+    return {"asm": f"0 {program}", "hex": f"0014{program}", "address": address, "type": "witness_v0_keyhash"}
+
+
+def encode_tx(vin, vout):
+    return json.dumps({"vin": vin, "vout": vout}, separators=(",", ":")).encode().hex()
+
+
+def decode_tx(raw_tx):
+    try:
+        tx = json.loads(bytes.fromhex(raw_tx))
+        return tx["vin"], tx["vout"]
+    except (ValueError, KeyError, TypeError):
+        raise RPCError(-22, "TX decode failed")
+
+
+def tx_vsize(vin, vout):
+    """Mesmo modelo de fee_estimator.estimate_vsize: entradas P2WPKH e saídas pelo tipo."""
+    vsize = 10.5 + 68 * len(vin)
+    for address, value in vout:
+        vsize += 11 + len(value) // 2 if address == "data" else 31
+    return int(math.ceil(vsize))
+
+
+class FakeNode:
+    """Estado do nó e da carteira; os métodos rpc_<nome> atendem as chamadas JSON-RPC."""
+
+    def __init__(self, blocks=300, txs_per_block=4, fee_rate=10):
+        self.lock = threading.Condition(threading.RLock())
+        self.fee_rate = fee_rate  # sat/vB respondido pelo estimatesmartfee
+        self.blocks = []  # {"hash", "height", "time", "tx"}
+        self.block_heights = {}  # hash -> altura
+        self.txs = {}  # txid -> {"vin", "vout", "hex", "time", "height", "fee", "replaced_by"[, "replaces"]}
+        self.mempool = {}  # txid -> altura do topo na entrada
+        self.utxos = {}  # (txid, n) -> (endereço, satoshis)
+        self.locked = set()
+        self.wallets = set()
+        self.wallet_addresses = set()
+        self.change_addresses = set()
+        self.wallet_txids = set()
+        self.received = {}  # endereço -> [(txid, n, satoshis)]
+        self.counter = 0
+        self.started = time.time()
+        self.calls = 0
+        self.single_calls = Counter()  # método -> chamadas fora de lotes JSON-RPC
+
+        # Cadeia inicial: o coinbase paga a carteira (fundos maduros após 100 blocos)
+        with self.lock:
+            funding = self._new_address("funding")
+            for _ in range(blocks):
+                self._mine(funding, txs_per_block)
+
+    # Estado interno (sempre com self.lock adquirido)
+
+    def _next(self):
+        self.counter += 1
+        return self.counter
+
+    def _new_address(self, kind):
+        address = bech32_like(f"{kind}:{self._next()}")
+        self.wallet_addresses.add(address)
+        if kind == "change":
+            self.change_addresses.add(address)
+        return address
+
+    def _tip(self):
+        return len(self.blocks) - 1
+
+    def _confirmations(self, tx):
+        return 0 if tx["height"] is None else self._tip() - tx["height"] + 1
+
+    def _spendable(self, outpoint):
+        tx = self.txs[outpoint[0]]
+        if "coinbase" in tx["vin"][0] and self._confirmations(tx) < COINBASE_MATURITY:
+            return False
+        return True
+
+    def _add_tx(self, vin, vout, fee=0):
+        raw_tx = encode_tx(vin, vout)
+        txid = sha256d(bytes.fromhex(raw_tx))
+        self.txs[txid] = {"vin": vin, "vout": vout, "hex": raw_tx, "time": int(time.time()),
+                          "height": None, "fee": fee, "replaced_by": None}
+        touches_wallet = False
+        for coin in vin:
+            outpoint = (coin.get("txid"), coin.get("vout"))
+            owner = self.utxos.pop(outpoint, (None,))[0]
+            self.locked.discard(outpoint)
+            touches_wallet = touches_wallet or owner in self.wallet_addresses
+        for n, (address, value) in enumerate(vout):
+            if address == "data":
+                continue
+            self.utxos[(txid, n)] = (address, value)
+            if address in self.wallet_addresses:
+                touches_wallet = True
+                self.received.setdefault(address, []).append((txid, n, value))
+        if touches_wallet:
+            self.wallet_txids.add(txid)
+        return txid
+
+    def _mine(self, address, txs_per_block=0):
+        height = len(self.blocks)
+        txids = [self._add_tx([{"coinbase": height}], [[address, BLOCK_REWARD]])]
+        # Transações de terceiros: preenchem o contador de transações e o índice de OP_RETURN
+        for index in range(txs_per_block):
+            vout = [[bech32_like(f"external:{self._next()}"), 10000]]
+            if index == 0:
+                vout.append(["data", fake_cid(f"{height}").encode().hex()])
+            txids.append(self._add_tx([{"txid": "00" * 32, "vout": self._next(), "sequence": 0xffffffff}], vout))
+        txids += list(self.mempool)
+        self.mempool.clear()
+        previous = self.blocks[-1]["hash"] if self.blocks else "00" * 32
+        block_hash = sha256d(f"{previous}:{height}:{','.join(txids)}".encode())
+        for txid in txids:
+            self.txs[txid]["height"] = height
+        self.blocks.append({"hash": block_hash, "height": height, "time": int(time.time()), "tx": txids})
+        self.block_heights[block_hash] = height
+        self.lock.notify_all()
+        return block_hash
+
+    def _accept(self, raw_tx):
+        """Valida e coloca no mempool uma transação (o equivalente ao sendrawtransaction)."""
+        vin, vout = decode_tx(raw_tx)
+        txid = sha256d(bytes.fromhex(raw_tx))
+        if txid in self.txs:
+            if self.txs[txid]["height"] is not None:
+                raise RPCError(RPC_VERIFY_ALREADY_IN_CHAIN, "Transaction already in block chain")
+            return txid
+        total_in = 0
+        for coin in vin:
+            outpoint = (coin.get("txid"), coin.get("vout"))
+            if outpoint not in self.utxos:
+                raise RPCError(RPC_VERIFY_ERROR, "bad-txns-inputs-missingorspent")
+            if not self._spendable(outpoint):
+                raise RPCError(RPC_VERIFY_REJECTED, "bad-txns-premature-spend-of-coinbase")
+            total_in += self.utxos[outpoint][1]
+        total_out = sum(value for address, value in vout if address != "data")
+        if total_out > total_in:
+            raise RPCError(RPC_VERIFY_REJECTED, "bad-txns-in-belowout")
+        txid = self._add_tx(vin, vout, fee=total_in - total_out)
+        self.mempool[txid] = self._tip()
+        return txid
+
+    def _decoded(self, txid):
+        tx = self.txs[txid]
+        decoded = {
+            "txid": txid, "hash": txid, "version": 2, "locktime": 0,
+            "size": len(tx["hex"]) // 2, "vsize": tx_vsize(tx["vin"], tx["vout"]),
+            "vin": tx["vin"],
+            "vout": [{"value": to_btc(value) if address != "data" else 0, "n": n, "scriptPubKey": script_for(address, value)}
+                     for n, (address, value) in enumerate(tx["vout"])],
+            "hex": tx["hex"],
+        }
+        if tx["height"] is not None:
+            block = self.blocks[tx["height"]]
+            decoded.update(blockhash=block["hash"], confirmations=self._confirmations(tx),
+                           time=block["time"], blocktime=block["time"])
+        return decoded
+
+    def _wallet_funded(self, tx):
+        for coin in tx["vin"]:
+            previous = self.txs.get(coin.get("txid"))
+            if previous and previous["vout"][coin["vout"]][0] in self.wallet_addresses:
+                return True
+        return False
+
+    def _details(self, txid):
+        tx = self.txs[txid]
+        funded = self._wallet_funded(tx)
+        details = []
+        for n, (address, value) in enumerate(tx["vout"]):
+            if address in self.wallet_addresses:
+                if funded and address in self.change_addresses:
+                    continue
+                category = "generate" if "coinbase" in tx["vin"][0] else "receive"
+                details.append({"address": address, "category": category, "amount": to_btc(value), "vout": n})
+            elif funded:
+                entry = {"category": "send", "amount": -to_btc(value if address != "data" else 0), "vout": n,
+                         "fee": -to_btc(tx["fee"])}
+                if address != "data":
+                    entry["address"] = address
+                details.append(entry)
+        return details
+
+    def _wallet_confirmations(self, tx):
+        # Substituída por RBF: confirmações negativas quando a substituta entra em um bloco
+        if tx["replaced_by"] and self.txs[tx["replaced_by"]]["height"] is not None:
+            return -self._confirmations(self.txs[tx["replaced_by"]])
+        return self._confirmations(tx)
+
+    # Cadeia
+
+    def rpc_uptime(self):
+        return int(time.time() - self.started)
+
+    def rpc_getblockchaininfo(self):
+        return {"chain": "regtest", "blocks": self._tip(), "headers": self._tip(),
+                "bestblockhash": self.blocks[-1]["hash"], "initialblockdownload": False}
+
+    def rpc_getblockcount(self):
+        return self._tip()
+
+    def rpc_getbestblockhash(self):
+        return self.blocks[-1]["hash"]
+
+    def rpc_getblockhash(self, height):
+        if not 0 <= height <= self._tip():
+            raise RPCError(RPC_INVALID_PARAMETER, "Block height out of range")
+        return self.blocks[height]["hash"]
+
+    def _block(self, block_hash):
+        if block_hash not in self.block_heights:
+            raise RPCError(RPC_INVALID_ADDRESS_OR_KEY, "Block not found")
+        block = self.blocks[self.block_heights[block_hash]]
+        header = {"hash": block_hash, "height": block["height"], "time": block["time"], "mediantime": block["time"],
+                  "confirmations": self._tip() - block["height"] + 1, "nTx": len(block["tx"])}
+        if block["height"] > 0:
+            header["previousblockhash"] = self.blocks[block["height"] - 1]["hash"]
+        if block["height"] < self._tip():
+            header["nextblockhash"] = self.blocks[block["height"] + 1]["hash"]
+        return block, header
+
+    def rpc_getblockheader(self, block_hash, verbose=True):
+        block, header = self._block(block_hash)
+        return header if verbose else json.dumps(header).encode().hex()
+
+    def rpc_getblock(self, block_hash, verbosity=1):
+        block, header = self._block(block_hash)
+        if verbosity == 0:
+            return json.dumps(block).encode().hex()
+        if verbosity == 1:
+            return dict(header, tx=list(block["tx"]))
+        return dict(header, tx=[self._decoded(txid) for txid in block["tx"]])
+
+    def rpc_getrawtransaction(self, txid, verbose=False, blockhash=None):
+        if txid not in self.txs or self.txs[txid]["replaced_by"]:
+            raise RPCError(RPC_INVALID_ADDRESS_OR_KEY, "No such mempool or blockchain transaction. Use gettransaction for wallet transactions.")
+        return self._decoded(txid) if verbose else self.txs[txid]["hex"]
+
+    def rpc_decoderawtransaction(self, raw_tx, iswitness=None):
+        vin, vout = decode_tx(raw_tx)
+        txid = sha256d(bytes.fromhex(raw_tx))
+        return {"txid": txid, "hash": txid, "version": 2, "locktime": 0, "vsize": tx_vsize(vin, vout), "vin": vin,
+                "vout": [{"value": to_btc(value) if address != "data" else 0, "n": n, "scriptPubKey": script_for(address, value)}
+                         for n, (address, value) in enumerate(vout)]}
+
+    def rpc_getmempoolinfo(self):
+        return {"loaded": True, "size": len(self.mempool), "mempoolminfee": 0.00001, "minrelaytxfee": 0.00001}
+
+    def rpc_getmempoolentry(self, txid):
+        if txid not in self.mempool:
+            raise RPCError(RPC_INVALID_ADDRESS_OR_KEY, "Transaction not in mempool")
+        tx = self.txs[txid]
+        fee = to_btc(tx["fee"])
+        return {"vsize": tx_vsize(tx["vin"], tx["vout"]), "time": tx["time"], "height": self.mempool[txid],
+                "descendantcount": 1, "ancestorcount": 1, "bip125-replaceable": True,
+                "fees": {"base": fee, "modified": fee, "ancestor": fee, "descendant": fee}}
+
+    def rpc_estimatesmartfee(self, conf_target, estimate_mode="conservative"):
+        # Alvos curtos pagam mais, como na curva do estimador do bitcoind
+        rate = self.fee_rate * (1 + 1.0 / conf_target)
+        return {"feerate": round(rate / 100000, 8), "blocks": conf_target}
+
+    def rpc_sendrawtransaction(self, raw_tx, maxfeerate=None):
+        return self._accept(raw_tx)
+
+    def rpc_createrawtransaction(self, inputs, outputs, locktime=0, replaceable=None):
+        vout = []
+        for output in (outputs if isinstance(outputs, list) else [outputs]):
+            for address, value in output.items():
+                if address == "data":
+                    try:
+                        bytes.fromhex(value)
+                    except ValueError:
+                        raise RPCError(RPC_INVALID_PARAMETER, "Data must be hexadecimal string (not '%s')" % value)
+                    vout.append(["data", value.lower()])
+                else:
+                    vout.append([address, to_sats(value)])
+        vin = [{"txid": coin["txid"], "vout": coin["vout"], "sequence": coin.get("sequence", 0xfffffffd)}
+               for coin in inputs]
+        return encode_tx(vin, vout)
+
+    def rpc_generatetoaddress(self, nblocks, address, maxtries=None):
+        return [self._mine(address) for _ in range(nblocks)]
+
+    def rpc_waitfornewblock(self, timeout=0):
+        height = self._tip()
+        deadline = time.monotonic() + (timeout / 1000.0 if timeout else 3600)
+        while self._tip() == height and time.monotonic() < deadline:
+            self.lock.wait(deadline - time.monotonic())
+        return {"hash": self.blocks[-1]["hash"], "height": self._tip()}
+
+    # Carteira
+
+    def rpc_listwallets(self):
+        return sorted(self.wallets)
+
+    def rpc_createwallet(self, wallet_name, *args):
+        if wallet_name in self.wallets:
+            raise RPCError(RPC_WALLET_ERROR, f"Wallet file verification failed. Failed to create database path '{wallet_name}'. Database already exists.")
+        self.wallets.add(wallet_name)
+        return {"name": wallet_name, "warning": ""}
+
+    def rpc_loadwallet(self, wallet_name, *args):
+        if wallet_name in self.wallets:
+            raise RPCError(RPC_WALLET_ALREADY_LOADED, f"Wallet \"{wallet_name}\" is already loaded.")
+        self.wallets.add(wallet_name)
+        return {"name": wallet_name, "warning": ""}
+
+    def rpc_getnewaddress(self, label="", address_type=None):
+        return self._new_address("receive")
+
+    def rpc_getrawchangeaddress(self, address_type=None):
+        return self._new_address("change")
+
+    def _wallet_coins(self, minconf=0, include_locked=False):
+        for outpoint, (address, value) in self.utxos.items():
+            if address not in self.wallet_addresses or not self._spendable(outpoint):
+                continue
+            if not include_locked and outpoint in self.locked:
+                continue
+            confirmations = self._confirmations(self.txs[outpoint[0]])
+            if confirmations >= minconf:
+                yield outpoint, address, value, confirmations
+
+    def rpc_listunspent(self, minconf=1, maxconf=9999999, addresses=None, include_unsafe=True, query_options=None):
+        return [{"txid": txid, "vout": n, "address": address, "amount": to_btc(value),
+                 "confirmations": confirmations, "spendable": True, "solvable": True, "safe": True,
+                 "scriptPubKey": script_for(address, value)["hex"], "ancestorcount": 1}
+                for (txid, n), address, value, confirmations in self._wallet_coins(minconf)
+                if confirmations <= maxconf and (not addresses or address in addresses)]
+
+    def rpc_lockunspent(self, unlock, transactions=None):
+        outpoints = {(coin["txid"], coin["vout"]) for coin in transactions or []}
+        if unlock:
+            if transactions is None:
+                self.locked.clear()
+            for outpoint in outpoints:
+                if outpoint not in self.locked:
+                    raise RPCError(RPC_INVALID_PARAMETER, "Invalid parameter, expected locked output")
+            self.locked -= outpoints
+        else:
+            for outpoint in outpoints:
+                if outpoint not in self.utxos:
+                    raise RPCError(RPC_INVALID_PARAMETER, "Invalid parameter, expected unspent output")
+                if outpoint in self.locked:
+                    raise RPCError(RPC_INVALID_PARAMETER, "Invalid parameter, output already locked")
+            self.locked |= outpoints
+        return True
+
+    def rpc_listlockunspent(self):
+        return [{"txid": txid, "vout": n} for txid, n in sorted(self.locked)]
+
+    def rpc_getbalance(self, dummy="*", minconf=0, include_watchonly=True, avoid_reuse=None):
+        return to_btc(sum(value for _, _, value, _ in self._wallet_coins(minconf, include_locked=True)))
+
+    def rpc_getunconfirmedbalance(self):
+        return to_btc(sum(value for _, _, value, confirmations in self._wallet_coins(0, include_locked=True)
+                          if confirmations == 0))
+
+    def rpc_getwalletinfo(self):
+        return {"walletname": "platform_wallet", "balance": self.rpc_getbalance(minconf=1),
+                "unconfirmed_balance": self.rpc_getunconfirmedbalance(), "txcount": len(self.wallet_txids),
+                "keypoolsize": 1000}
+
+    def rpc_signrawtransactionwithwallet(self, raw_tx, prevtxs=None, sighashtype="ALL"):
+        decode_tx(raw_tx)
+        return {"hex": raw_tx, "complete": True}
+
+    def rpc_sendtoaddress(self, address, amount, comment="", comment_to="", subtractfeefromamount=False,
+                          replaceable=None, conf_target=None, estimate_mode="unset", avoid_reuse=None, fee_rate=None):
+        amount = to_sats(amount)
+        rate = float(fee_rate) if fee_rate is not None else self.fee_rate
+        selected, total = [], 0
+        for outpoint, _, value, confirmations in sorted(self._wallet_coins(0), key=lambda coin: -coin[2]):
+            selected.append(outpoint)
+            total += value
+            fee = int(math.ceil(rate * tx_vsize(selected, [[address, 0], ["change", 0]])))
+            if total >= amount + fee:
+                break
+        else:
+            raise RPCError(RPC_WALLET_INSUFFICIENT_FUNDS, "Insufficient funds")
+        vout = [[address, amount]]
+        if total - amount - fee >= DUST_THRESHOLD:
+            vout.append([self._new_address("change"), total - amount - fee])
+        return self._accept(encode_tx([{"txid": txid, "vout": n, "sequence": 0xfffffffd} for txid, n in selected], vout))
+
+    def rpc_bumpfee(self, txid, options=None):
+        if txid not in self.mempool:
+            raise RPCError(RPC_INVALID_ADDRESS_OR_KEY, "Transaction not in mempool")
+        tx = self.txs[txid]
+        vsize = tx_vsize(tx["vin"], tx["vout"])
+        rate = float((options or {}).get("fee_rate") or tx["fee"] / vsize + 1)
+        new_fee = int(math.ceil(rate * vsize))
+        change = [n for n, (address, _) in enumerate(tx["vout"]) if address in self.change_addresses]
+        if new_fee <= tx["fee"]:
+            raise RPCError(RPC_INVALID_PARAMETER, "Insufficient total fee")
+        if not change or tx["vout"][change[-1]][1] - (new_fee - tx["fee"]) < DUST_THRESHOLD:
+            raise RPCError(RPC_WALLET_ERROR, "Unable to create transaction. Insufficient funds")
+
+        # Desfaz a original (saídas, entradas gastas) e transmite a substituta com menos troco
+        del self.mempool[txid]
+        for n, (address, value) in enumerate(tx["vout"]):
+            self.utxos.pop((txid, n), None)
+            if address in self.received:
+                self.received[address] = [entry for entry in self.received[address] if entry[0] != txid]
+        for coin in tx["vin"]:
+            previous = self.txs[coin["txid"]]["vout"][coin["vout"]]
+            self.utxos[(coin["txid"], coin["vout"])] = (previous[0], previous[1])
+        vout = [list(output) for output in tx["vout"]]
+        vout[change[-1]][1] -= new_fee - tx["fee"]
+        new_txid = self._accept(encode_tx(tx["vin"], vout))
+        tx["replaced_by"] = new_txid
+        self.txs[new_txid]["replaces"] = txid
+        return {"txid": new_txid, "origfee": to_btc(tx["fee"]), "fee": to_btc(new_fee), "errors": []}
+
+    def _conflicts(self, tx):
+        """TXIDs da cadeia de substituições (bumpfee) da transação, que gastam as mesmas entradas."""
+        conflicts = []
+        current = tx
+        while current.get("replaces"):
+            conflicts.append(current["replaces"])
+            current = self.txs[current["replaces"]]
+        current = tx
+        while current["replaced_by"]:
+            conflicts.append(current["replaced_by"])
+            current = self.txs[current["replaced_by"]]
+        return conflicts
+
+    def rpc_gettransaction(self, txid, include_watchonly=True, verbose=False):
+        if txid not in self.wallet_txids:
+            raise RPCError(RPC_INVALID_ADDRESS_OR_KEY, "Invalid or non-wallet transaction id")
+        tx = self.txs[txid]
+        details = self._details(txid)
+        result = {"txid": txid, "amount": sum(entry["amount"] for entry in details),
+                  "confirmations": self._wallet_confirmations(tx), "time": tx["time"], "timereceived": tx["time"],
+                  "bip125-replaceable": "yes" if tx["height"] is None else "no", "walletconflicts": self._conflicts(tx),
+                  "details": details, "hex": tx["hex"]}
+        if self._wallet_funded(tx):
+            result["fee"] = -to_btc(tx["fee"])
+        if tx["height"] is not None:
+            block = self.blocks[tx["height"]]
+            result.update(blockhash=block["hash"], blockheight=block["height"], blocktime=block["time"])
+        if tx["replaced_by"]:
+            result["replaced_by_txid"] = tx["replaced_by"]
+        return result
+
+    def rpc_listtransactions(self, label="*", count=10, skip=0, include_watchonly=True):
+        entries = []
+        for txid in sorted(self.wallet_txids, key=lambda txid: self.txs[txid]["time"]):
+            tx = self.txs[txid]
+            for entry in self._details(txid):
+                entries.append(dict(entry, txid=txid, confirmations=self._wallet_confirmations(tx), time=tx["time"]))
+        end = len(entries) - skip
+        return entries[max(0, end - count):max(0, end)]
+
+    def _receipts(self, address, minconf):
+        receipts = [(txid, value, self._confirmations(self.txs[txid])) for txid, _, value in self.received.get(address, [])]
+        return [receipt for receipt in receipts if receipt[2] >= minconf]
+
+    def rpc_listreceivedbyaddress(self, minconf=1, include_empty=False, include_watchonly=False, address_filter=None):
+        if address_filter is not None and not address_filter.startswith("bcrt1"):
+            raise RPCError(RPC_WALLET_ERROR, "address_filter parameter was invalid")
+        # Com include_empty, o bitcoind lista todos os endereços já emitidos pela carteira
+        addresses = [address_filter] if address_filter else sorted(self.wallet_addresses if include_empty
+                                                                     else self.received)
+        result = []
+        for address in addresses:
+            if address not in self.wallet_addresses or address in self.change_addresses:
+                continue
+            receipts = self._receipts(address, minconf)
+            if not receipts and not include_empty:
+                continue
+            result.append({"address": address, "amount": to_btc(sum(value for _, value, _ in receipts)),
+                           "confirmations": min((confirmations for _, _, confirmations in receipts), default=0),
+                           "label": "", "txids": sorted({txid for txid, _, _ in receipts})})
+        return result
+
+    def rpc_getreceivedbyaddress(self, address, minconf=1):
+        return to_btc(sum(value for _, value, _ in self._receipts(address, minconf)))
+
+    # Despacho
+
+    def rpc_getbenchstats(self):
+        """Só do simulado: contadores de chamadas para os benchmarks."""
+        return {"calls": self.calls, "single_calls": dict(self.single_calls)}
+
+    def call(self, method, params, batched=False):
+        handler = getattr(self, f"rpc_{method}", None)
+        if handler is None:
+            raise RPCError(RPC_METHOD_NOT_FOUND, "Method not found")
+        with self.lock:
+            self.calls += 1
+            if not batched:
+                self.single_calls[method] += 1
+            try:
+                return handler(*params)
+            except TypeError as e:
+                raise RPCError(RPC_MISC_ERROR, str(e))
+
+    def mine_forever(self, interval):
+        miner = bech32_like("miner")
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                self._mine(miner)
+
+
+class RPCHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    node = None
+    latency = 0.0
+
+    def setup(self):
+        super().setup()
+        # Cabeçalho e corpo da resposta saem em dois envios: sem isso, Nagle + ACK atrasado somam 40 ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _one(self, request, batched=False):
+        try:
+            result = self.node.call(request["method"], request.get("params") or [], batched)
+            return {"result": result, "error": None, "id": request.get("id")}
+        except RPCError as e:
+            return {"result": None, "error": {"code": e.code, "message": e.message}, "id": request.get("id")}
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.latency:
+            time.sleep(self.latency)  # um lote conta uma vez, como um round trip até o nó
+        if isinstance(request, list):
+            response, status = [self._one(item, batched=True) for item in request], 200
+        else:
+            response = self._one(request)
+            status = 500 if response["error"] else 200
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port, blocks=300, txs_per_block=4, latency=0.0, block_interval=0, fee_rate=10, node=None):
+    """Cria o nó (ou usa node, já preparado) e o servidor; retorna o servidor (serve_forever bloqueia)."""
+    node = node or FakeNode(blocks, txs_per_block, fee_rate)
+    handler = type("Handler", (RPCHandler,), {"node": node, "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    if block_interval:
+        threading.Thread(target=handler.node.mine_forever, args=(block_interval,), daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=18443)
+    parser.add_argument("--blocks", type=int, default=300, help="altura inicial; o coinbase paga a carteira")
+    parser.add_argument("--txs-per-block", type=int, default=4, help="transações de terceiros por bloco inicial")
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos acrescentados a cada requisição HTTP")
+    parser.add_argument("--block-interval", type=float, default=0, help="minera um bloco a cada N segundos (0 desliga)")
+    parser.add_argument("--fee-rate", type=float, default=10, help="sat/vB base do estimatesmartfee")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.blocks, args.txs_per_block, args.latency, args.block_interval, args.fee_rate)
+    print(f"bitcoind simulado em 127.0.0.1:{server.server_address[1]} (altura {args.blocks - 1})", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+API HTTP do IPFS simulada para os benchmarks: /api/v0/add (multipart, inclusive
+com Transfer-Encoding: chunked e vários arquivos por requisição), /version e
+/pin/rm. O CID retornado é um CIDv0 (Qm...) derivado do SHA-256 do conteúdo,
+então o mesmo arquivo sempre recebe o mesmo CID. O corpo é decodificado em
+blocos, sem guardar os arquivos: uploads de vários GB não pesam na memória.
+
+    python bench/fake_ipfs.py --port 5001 --latency 0.005
+"""
+import argparse
+import hashlib
+import json
+import socket
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+READ_SIZE = 1024 * 1024
+
+
+def cid_v0(content):
+    return cid_from_digest(hashlib.sha256(content).digest())
+
+
+def cid_from_digest(digest):
+    """Multihash sha2-256 (0x12 0x20 + digest) em base58btc."""
+    number = int.from_bytes(b"\x12\x20" + digest, "big")
+    chars = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        chars = BASE58_ALPHABET[remainder] + chars
+    return chars
+
+
+class IPFSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _body_chunks(self):
+        """Gera o corpo em blocos de até READ_SIZE bytes (Content-Length ou Transfer-Encoding: chunked)."""
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return
+                while size:
+                    chunk = self.rfile.read(min(size, READ_SIZE))
+                    size -= len(chunk)
+                    yield chunk
+                self.rfile.readline()
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, READ_SIZE))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+    def _add_files(self):
+        """[(nome, sha256, tamanho)] das partes 'file', calculados enquanto o corpo é lido."""
+        _, options = parse_options_header(self.headers.get("Content-Type", ""))
+        decoder = MultipartDecoder(options.get("boundary", "").encode("latin-1"), 2 * READ_SIZE)
+        chunks = self._body_chunks()
+        files, current = [], None
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                decoder.receive_data(next(chunks, None))
+            elif isinstance(event, Epilogue):
+                break
+            elif isinstance(event, File) and event.name == "file":
+                current = [event.filename or "", hashlib.sha256(), 0]
+                files.append(current)
+            elif isinstance(event, Data):
+                if current is not None:
+                    current[1].update(event.data)
+                    current[2] += len(event.data)
+            else:
+                current = None
+        for _ in chunks:
+            pass
+        return files
+
+    def _reply(self, status, payload):
+        body = payload if isinstance(payload, bytes) else (json.dumps(payload) + "\n").encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        endpoint = self.path.split("?")[0].rsplit("/api/v0/", 1)[-1]
+        if endpoint == "add":
+            try:
+                files = self._add_files()
+            except ValueError as e:
+                self.close_connection = True
+                return self._reply(400, {"Message": f"invalid multipart body: {e}", "Code": 1, "Type": "error"})
+        else:
+            for _ in self._body_chunks():
+                pass
+        if self.latency:
+            time.sleep(self.latency)
+        if endpoint == "version":
+            return self._reply(200, {"Version": "0.0.0-bench", "System": "fake"})
+        if endpoint == "pin/rm":
+            return self._reply(200, {"Pins": []})
+        if endpoint != "add":
+            return self._reply(404, {"Message": f"unknown endpoint /{endpoint}", "Code": 0, "Type": "error"})
+
+        if not files:
+            return self._reply(400, {"Message": "file argument 'path' is required", "Code": 1, "Type": "error"})
+        lines = [json.dumps({"Name": name, "Hash": cid_from_digest(sha256.digest()), "Size": str(size)})
+                 for name, sha256, size in files]
+        self._reply(200, ("\n".join(lines) + "\n").encode())
+
+
+def serve(port, latency=0.0):
+    handler = type("Handler", (IPFSHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos acrescentados a cada requisição")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency)
+    print(f"IPFS simulado em http://127.0.0.1:{server.server_address[1]}/api/v0", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
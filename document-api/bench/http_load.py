@@ -0,0 +1,84 @@
+"""
+Gerador de carga HTTP no estilo do wrk: para cada nível de concorrência,
+mantém N conexões keep-alive fazendo requisições em sequência durante um
+tempo fixo e reporta vazão e latência (p50/p95/p99) em JSON.
+
+    python bench/http_load.py --url http://127.0.0.1:5000/api/block/count --concurrency 1,10,50,100
+
+Compare o servidor embutido (python app.py) com o de produção
+(gunicorn -c gunicorn.conf.py wsgi:app) para ver a escala com a concorrência.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import http.client
+import json
+import time
+from urllib.parse import urlsplit
+
+import gevent
+
+from stats import summary
+
+
+def worker(url, deadline, latencies, errors, make_request=None, error_status=500):
+    """
+    make_request() retorna (método, caminho, corpo, cabeçalhos) de cada requisição;
+    sem ele, repete GET na URL. Respostas com status >= error_status contam como erro.
+    """
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    conn = None
+    while time.monotonic() < deadline:
+        if conn is None:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        method, request_path, body, headers = make_request() if make_request else ("GET", path, None, {})
+        started = time.monotonic()
+        try:
+            conn.request(method, request_path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= error_status:
+                errors.append(response.status)
+            else:
+                latencies.append(time.monotonic() - started)
+        except Exception as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def run_level(url, concurrency, duration, make_request=None, error_status=500):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    gevent.joinall([gevent.spawn(worker, url, deadline, latencies, errors, make_request, error_status)
+                    for _ in range(concurrency)])
+    elapsed = time.monotonic() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency": summary(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--concurrency", default="1,10,50,100", help="níveis separados por vírgula")
+    parser.add_argument("--duration", type=float, default=10, help="segundos por nível")
+    parser.add_argument("--label", default=None, help="identificação do servidor testado")
+    args = parser.parse_args()
+
+    levels = [run_level(args.url, int(level), args.duration) for level in args.concurrency.split(",")]
+    print(json.dumps({"label": args.label, "url": args.url, "levels": levels}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Latência de um upload ao IPFS simulado (bench/fake_ipfs.py): o caminho antigo,
+com POST /version antes de cada /add e um requests.post (conexão TCP nova) em
+cada um, contra o IPFSClient compartilhado, com sessão keep-alive e health
+check em cache. Resultado em JSON.
+
+    python bench/ipfs_add_latency.py --sizes 65536,1048576 --latencies 0,0.002 --runs 300
+
+--latencies acrescenta um atraso do simulado a cada requisição, como a ida e
+volta até um daemon em outro host; o caminho antigo o paga duas vezes.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import get_context
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_ipfs import serve
+from ipfs_client import IPFSClient
+from stats import summary
+
+
+def measure(upload, content, runs):
+    upload(content)  # aquece conexões e o health check
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        upload(content)
+        durations.append(time.perf_counter() - started)
+    return summary(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="65536,1048576", help="bytes de cada arquivo enviado")
+    parser.add_argument("--latencies", default="0,0.002", help="segundos acrescentados a cada requisição")
+    parser.add_argument("--runs", type=int, default=300)
+    args = parser.parse_args()
+
+    report = {"runs": args.runs, "cpus": os.cpu_count(), "results": []}
+    for latency in (float(value) for value in args.latencies.split(",")):
+        server = serve(0, latency)
+        process = get_context("fork").Process(target=server.serve_forever, daemon=True)
+        process.start()
+        server.server_close()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/api/v0"
+        client = IPFSClient(base_url)
+
+        def probe_and_add(content):
+            # Como connect_to_ipfs() mais o /add de antes: duas conexões novas por upload
+            if requests.post(f"{base_url}/version", timeout=10).status_code != 200:
+                raise RuntimeError("IPFS indisponível")
+            return requests.post(f"{base_url}/add", files={"file": content}, timeout=10).json()["Hash"]
+
+        def pooled_add(content):
+            if not client.is_available():
+                raise RuntimeError("IPFS indisponível")
+            return client.add(files={"file": content})
+
+        try:
+            for size in (int(value) for value in args.sizes.split(",")):
+                content = os.urandom(size)
+                result = {"latency": latency, "size": size,
+                          "probe_and_new_connections": measure(probe_and_add, content, args.runs),
+                          "pooled_client": measure(pooled_add, content, args.runs)}
+                report["results"].append(result)
+                print(f"latência {latency}, {size} bytes: medido", file=sys.stderr, flush=True)
+        finally:
+            process.terminate()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
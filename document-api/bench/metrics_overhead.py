@@ -0,0 +1,122 @@
+"""
+Custo da instrumentação do /metrics: compara a mesma API com METRICS_ENABLED=true
+e METRICS_ENABLED=false, alternando rodadas entre os dois servidores, e mede em
+processo o custo de cada observação (histograma, instrução SQLite medida).
+Resultado em JSON; o overhead de cada rota é a diferença entre as medianas.
+
+    METRICS_ENABLED=true  PORT=5000 gunicorn -c gunicorn.conf.py wsgi:app
+    METRICS_ENABLED=false PORT=5001 gunicorn -c gunicorn.conf.py wsgi:app
+    python bench/metrics_overhead.py --on http://127.0.0.1:5000 --off http://127.0.0.1:5001
+
+Sem --on/--off, apenas a medição em processo é executada.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from instrumentation import Histogram, TimedConnection
+from stats import percentile, summary
+
+DEFAULT_PATHS = "/api/block/count,/api/transaction/count,/api/registrations/1,/api/opreturn/download?identifier=x"
+
+
+def time_per_call(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+def micro(iterations):
+    """Custo em processo, em microssegundos por operação."""
+    histogram = Histogram("bench_seconds", "", ("route",))
+    observe = time_per_call(lambda: histogram.observe(0.0042, "/api/x"), iterations)
+
+    def query_cost(factory):
+        conn = sqlite3.connect(":memory:", factory=factory)
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, value TEXT)")
+        conn.executemany("INSERT INTO t (value) VALUES (?)", [(str(i),) for i in range(1000)])
+        cursor = conn.cursor()
+
+        def query():
+            cursor.execute("SELECT value FROM t WHERE id = ?", (random.randint(1, 1000),))
+            cursor.fetchall()
+        query()
+        return time_per_call(query, iterations)
+
+    plain = query_cost(sqlite3.Connection)
+    timed = query_cost(TimedConnection)
+    return {
+        "histogram_observe_us": round(observe * 1e6, 3),
+        "sqlite_query_plain_us": round(plain * 1e6, 3),
+        "sqlite_query_timed_us": round(timed * 1e6, 3),
+        "sqlite_query_overhead_us": round((timed - plain) * 1e6, 3),
+    }
+
+
+def request_latencies(base_url, path, count):
+    parts = urlsplit(base_url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    return latencies
+
+
+def compare(on_url, off_url, paths, rounds, per_round):
+    """
+    Rodadas alternadas (ordem sorteada a cada rodada) para que variações da
+    máquina afetem os dois servidores por igual.
+    """
+    results = []
+    for path in paths:
+        samples = {"on": [], "off": []}
+        for label, url in (("on", on_url), ("off", off_url)):
+            request_latencies(url, path, per_round)  # aquecimento
+        for _ in range(rounds):
+            order = [("on", on_url), ("off", off_url)]
+            random.shuffle(order)
+            for label, url in order:
+                samples[label] += request_latencies(url, path, per_round)
+        on_median = percentile(samples["on"], 0.5)
+        off_median = percentile(samples["off"], 0.5)
+        results.append({
+            "path": path,
+            "metrics_on": summary(samples["on"]),
+            "metrics_off": summary(samples["off"]),
+            "overhead_median_pct": round((on_median - off_median) / off_median * 100, 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--on", help="URL base da API com METRICS_ENABLED=true")
+    parser.add_argument("--off", help="URL base da API com METRICS_ENABLED=false")
+    parser.add_argument("--paths", default=DEFAULT_PATHS, help="rotas GET separadas por vírgula")
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--per-round", type=int, default=50, help="requisições por servidor em cada rodada")
+    parser.add_argument("--iterations", type=int, default=200000, help="repetições da medição em processo")
+    args = parser.parse_args()
+
+    output = {"micro": micro(args.iterations)}
+    if args.on and args.off:
+        output["http"] = compare(args.on, args.off, args.paths.split(","), args.rounds, args.per_round)
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
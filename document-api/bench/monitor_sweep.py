@@ -0,0 +1,109 @@
+"""
+Varredura do monitor de pagamentos (sweep_pending_transactions) com N registros
+aguardando pagamento, cada um com seu txid no mempool do bitcoind simulado: um
+gettransaction por registro, como antes dos lotes, contra os lotes JSON-RPC de
+MONITOR_BATCH_SIZE. Resultado em JSON.
+
+    python bench/monitor_sweep.py --pending 10000 --batch-sizes 100,500,1000 --latency 0.001
+
+As transações ficam sem confirmação, então cada varredura consulta os N txids
+e não altera o banco: as medições são repetíveis (mediana de --repeat).
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, API_DIR)
+
+from fake_bitcoind import FakeNode, serve
+
+
+def build_node(pending):
+    """Nó com N pagamentos no mempool, cada um para um endereço novo da carteira."""
+    node = FakeNode(blocks=101, txs_per_block=0)
+    txids = []
+    with node.lock:
+        for _ in range(pending):
+            address = node._new_address("payment")
+            txid = node._add_tx([{"txid": "00" * 32, "vout": node._next(), "sequence": 0xfffffffd}],
+                                [[address, 100000]])
+            node.mempool[txid] = node._tip()
+            txids.append(txid)
+    return node, txids
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return round(statistics.median(durations), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pending", type=int, default=10000, help="registros aguardando pagamento")
+    parser.add_argument("--batch-sizes", default="100,500,1000", help="valores de MONITOR_BATCH_SIZE medidos")
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos acrescentados a cada requisição RPC")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    node, txids = build_node(args.pending)
+    server = serve(0, latency=args.latency, node=node)
+    process = get_context("fork").Process(target=server.serve_forever, daemon=True)
+    process.start()
+    server.server_close()
+
+    workdir = tempfile.mkdtemp(prefix="monitor_sweep_")
+    os.environ.update(RPC_HOST="127.0.0.1", RPC_PORT=str(server.server_address[1]),
+                      DB_PATH=os.path.join(workdir, "transactions.db"), METRICS_ENABLED="false")
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            import app
+            from schema import migrate
+            with app.db.connection() as conn:
+                migrate(conn)
+                conn.executemany(
+                    "INSERT INTO transactions (client_address, hash, ipfs_hash, txid, status) "
+                    "VALUES (?, ?, ?, ?, 'awaiting_payment')",
+                    [(f"address-{index}", f"{index:064x}", f"cid-{index}", txid) for index, txid in enumerate(txids)]
+                )
+        rpc = app.get_rpc_connection("platform_wallet")
+
+        def one_by_one():
+            with app.db.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, txid, ipfs_hash FROM transactions WHERE status = 'awaiting_payment' AND txid IS NOT NULL"
+                ).fetchall()
+            for _, txid, _ in rows:
+                rpc.gettransaction(txid)
+
+        report = {"pending": args.pending, "latency": args.latency, "cpus": os.cpu_count(),
+                  "one_call_per_txid_seconds": timed(one_by_one, args.repeat), "batched": []}
+        for batch_size in (int(value) for value in args.batch_sizes.split(",")):
+            app.MONITOR_BATCH_SIZE = batch_size
+            seconds = timed(lambda: app.sweep_pending_transactions(rpc), args.repeat)
+            report["batched"].append({
+                "batch_size": batch_size, "sweep_seconds": seconds,
+                "batches": app.monitor_metrics["last_sweep_batches"],
+                "errors": app.monitor_metrics["last_sweep_errors"],
+                "speedup": round(report["one_call_per_txid_seconds"] / seconds, 1),
+            })
+            print(f"lotes de {batch_size}: {seconds} s", file=sys.stderr, flush=True)
+    finally:
+        process.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
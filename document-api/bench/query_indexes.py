@@ -0,0 +1,149 @@
+"""
+Latência das consultas de cada rota sobre a tabela transactions com N linhas,
+no esquema original (sem índices, journal padrão, sem pragmas) e depois das
+migrações de schema.py (índices, WAL e pragmas por conexão), no mesmo arquivo.
+Mede também a duração de migrate() sobre a tabela cheia. Resultado em JSON.
+
+    python bench/query_indexes.py --rows 1000000 --samples 50
+
+Cada consulta é a da rota no código original e no atual (o monitor passou de
+status 'pending' para 'awaiting_payment' na migração 6; o download trocou o OR
+por UNION ALL). Os valores são a mediana de --samples execuções, com chaves
+sorteadas; os UPDATE são desfeitos com rollback para não alterar as seguintes.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from schema import MIGRATIONS, configure_connection, migrate
+
+# (rota, consulta original, consulta atual, coluna da chave sorteada)
+QUERIES = [
+    ("monitor",
+     "SELECT id, txid, ipfs_hash FROM transactions WHERE status = 'pending' AND op_return_txid IS NOT NULL",
+     "SELECT id, txid, ipfs_hash FROM transactions WHERE status = 'awaiting_payment' AND txid IS NOT NULL",
+     None),
+    ("confirm",
+     "SELECT status FROM transactions WHERE txid = ?",
+     "SELECT status FROM transactions WHERE txid = ?",
+     "txid"),
+    ("send",
+     "UPDATE transactions SET txid = ? WHERE client_address = ?",
+     "UPDATE transactions SET txid = ? WHERE client_address = ?",
+     "client_address"),
+    ("opreturn",
+     "UPDATE transactions SET op_return_txid = ? WHERE hash = ?",
+     "UPDATE transactions SET op_return_txid = ? WHERE hash = ?",
+     "hash"),
+    ("download",
+     "SELECT ipfs_hash FROM transactions WHERE op_return_txid = ? OR ipfs_hash = ?",
+     "SELECT ipfs_hash FROM transactions WHERE op_return_txid = ? UNION ALL "
+     "SELECT ipfs_hash FROM transactions WHERE ipfs_hash = ? LIMIT 1",
+     "op_return_txid"),
+]
+
+
+def populate(conn, rows, pending, rng):
+    """Linhas com chaves únicas; uma fração 'pending' com pagamento e OP_RETURN, o resto 'confirmed'."""
+    batch = []
+    for index in range(rows):
+        status = "pending" if rng.random() < pending else "confirmed"
+        batch.append((f"bcrt1q{index:038x}", f"{rng.getrandbits(256):064x}", f"{rng.getrandbits(256):064x}",
+                      f"Qm{rng.getrandbits(256):064x}", f"{rng.getrandbits(256):064x}", status))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO transactions (client_address, hash, txid, ipfs_hash, op_return_txid, status) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO transactions (client_address, hash, txid, ipfs_hash, op_return_txid, status) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+
+
+def parameters(sql, key):
+    """Parâmetros da consulta para uma chave: UPDATE (novo valor, chave), download (chave, chave)."""
+    if key is None:
+        return ()
+    if sql.startswith("UPDATE"):
+        return (f"{key}-bench", key)
+    return (key,) * sql.count("?")
+
+
+def measure(conn, samples, current):
+    results = {}
+    for name, original, updated, column in QUERIES:
+        sql = updated if current else original
+        keys = [None] * len(samples["txid"]) if column is None else samples[column]
+        durations = []
+        for key in keys:
+            started = time.perf_counter()
+            conn.execute(sql, parameters(sql, key)).fetchall()
+            durations.append(time.perf_counter() - started)
+            if sql.startswith("UPDATE"):
+                conn.rollback()
+        plan = conn.execute("EXPLAIN QUERY PLAN " + sql, parameters(sql, keys[0])).fetchall()
+        results[name] = {"median_ms": round(statistics.median(durations) * 1000, 3),
+                         "plan": "; ".join(row[3] for row in plan)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--pending", type=float, default=0.01, help="fração das linhas aguardando pagamento")
+    parser.add_argument("--samples", type=int, default=50, help="chaves sorteadas por consulta")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="query_indexes_")
+    try:
+        # Esquema original: só a tabela, com o journal e os pragmas padrão do SQLite
+        conn = sqlite3.connect(os.path.join(workdir, "transactions.db"))
+        MIGRATIONS[0][2](conn.cursor())
+        started = time.perf_counter()
+        populate(conn, args.rows, args.pending, rng)
+        populate_seconds = time.perf_counter() - started
+
+        ids = rng.sample(range(1, args.rows + 1), args.samples)
+        samples = {column: [conn.execute(f"SELECT {column} FROM transactions WHERE id = ?", (row_id,)).fetchone()[0]
+                            for row_id in ids]
+                   for column in ("txid", "client_address", "hash", "op_return_txid")}
+
+        before = measure(conn, samples, current=False)
+        print("esquema original: medido", file=sys.stderr, flush=True)
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stderr):
+            version = migrate(conn)
+        migrate_seconds = time.perf_counter() - started
+        configure_connection(conn)
+        after = measure(conn, samples, current=True)
+
+        report = {"rows": args.rows, "pending": args.pending, "samples": args.samples,
+                  "populate_seconds": round(populate_seconds, 1), "migrate_seconds": round(migrate_seconds, 1),
+                  "schema_version": version, "queries": {}}
+        for name in before:
+            report["queries"][name] = {
+                "before_ms": before[name]["median_ms"], "after_ms": after[name]["median_ms"],
+                "speedup": round(before[name]["median_ms"] / max(after[name]["median_ms"], 0.001)),
+                "before_plan": before[name]["plan"], "after_plan": after[name]["plan"],
+            }
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Latência por página da listagem de registros (RegistrationListing, paginação
+por cursor) contra a paginação por OFFSET, em páginas cada vez mais profundas,
+sobre um banco migrado com N registros. Resultado em JSON.
+
+    python bench/registration_listing.py --rows 1000000 --limit 50 --pages 1,10,100,1000,10000
+
+Cada cenário percorre as páginas em sequência seguindo next_cursor e mede as
+páginas pedidas em --pages (mediana de --repeat execuções da mesma consulta);
+a consulta com OFFSET equivalente é medida nas mesmas páginas.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import Database
+from registrations import RegistrationListing
+from schema import migrate
+from stats import percentile
+
+STATUSES = ("anchored", "anchored", "anchored", "paid", "awaiting_payment")
+HOT_ADDRESS = "bcrt1qhotaddress"
+
+
+def populate(db, rows, seed):
+    """
+    rows registros em ordem de chegada, vários por segundo (o timestamp do SQLite
+    tem resolução de segundos), 60% ancorados e 10% em um mesmo endereço.
+    """
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1)
+    with db.connection() as conn:
+        # As mensagens das migrações vão para stderr: stdout é só o JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            migrate(conn)
+        for start in range(0, rows, 50000):
+            batch = []
+            for row_id in range(start + 1, min(start + 50000, rows) + 1):
+                timestamp = (started + timedelta(seconds=row_id // 3)).strftime("%Y-%m-%d %H:%M:%S")
+                address = HOT_ADDRESS if rng.random() < 0.1 else f"bcrt1q{rng.getrandbits(64):016x}"
+                batch.append((row_id, address, f"{rng.getrandbits(256):064x}", f"Qm{row_id}",
+                              rng.choice(STATUSES), timestamp))
+            conn.executemany(
+                "INSERT INTO transactions (id, client_address, hash, ipfs_hash, status, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)", batch
+            )
+            conn.executemany("INSERT INTO documents (hash, transaction_id) VALUES (?, ?)",
+                             [(entry[2], entry[0]) for entry in batch])
+        conn.execute("ANALYZE")
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return percentile(durations, 0.5)
+
+
+def offset_query(db, filters, limit, page):
+    conditions, params = [], []
+    for column, value in filters.items():
+        conditions.append(f"{column} = ?")
+        params.append(value)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = (f"SELECT id, hash, ipfs_hash, status, client_address, txid, timestamp FROM transactions{where} "
+             "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?")
+
+    def run():
+        with db.cursor() as cursor:
+            cursor.execute(query, params + [limit, (page - 1) * limit])
+            return cursor.fetchall()
+    return run
+
+
+def measure(db, listing, name, filters, limit, pages, repeat):
+    """Percorre as páginas seguindo o cursor; nas páginas pedidas, mede cursor e OFFSET."""
+    listing_filters = {"status": filters.get("status"), "address": filters.get("client_address")}
+    results = []
+    cursor, page = None, 1
+    walk_started = time.perf_counter()
+    while page <= max(pages):
+        if page in pages:
+            keyset = timed(lambda: listing.page(cursor=cursor, limit=limit, **listing_filters), repeat)
+            offset = timed(offset_query(db, filters, limit, page), repeat)
+            results.append({"page": page, "cursor_ms": round(keyset * 1000, 3), "offset_ms": round(offset * 1000, 3)})
+        rows, cursor = listing.page(cursor=cursor, limit=limit, **listing_filters)
+        if cursor is None:
+            break
+        page += 1
+    return {"scenario": name, "pages_walked": page, "walk_seconds": round(time.perf_counter() - walk_started, 2),
+            "pages": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=50, help="itens por página")
+    parser.add_argument("--pages", default="1,10,100,1000,10000", help="páginas medidas")
+    parser.add_argument("--repeat", type=int, default=21, help="execuções por medição (mediana)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="registration_listing_"), "listing.db")
+    db = Database(db_path)
+    started = time.perf_counter()
+    populate(db, args.rows, args.seed)
+    populate_seconds = time.perf_counter() - started
+
+    listing = RegistrationListing(db)
+    pages = sorted(int(page) for page in args.pages.split(","))
+    scenarios = [
+        measure(db, listing, "all", {}, args.limit, pages, args.repeat),
+        measure(db, listing, "status=anchored", {"status": "anchored"}, args.limit, pages, args.repeat),
+        measure(db, listing, "address", {"client_address": HOT_ADDRESS}, args.limit, pages, args.repeat),
+    ]
+
+    # Prefixo de hash: consulta isolada (não há páginas profundas com um prefixo seletivo)
+    with db.cursor() as cursor:
+        cursor.execute("SELECT hash FROM transactions WHERE id = ?", (args.rows // 2,))
+        prefix = cursor.fetchone()[0][:6]
+    hash_prefix_ms = timed(lambda: listing.page(hash_prefix=prefix, limit=args.limit), args.repeat) * 1000
+
+    print(json.dumps({
+        "rows": args.rows,
+        "limit": args.limit,
+        "populate_seconds": round(populate_seconds, 1),
+        "scenarios": scenarios,
+        "hash_prefix": {"prefix": prefix, "ms": round(hash_prefix_ms, 3)},
+    }, indent=2))
+    shutil.rmtree(os.path.dirname(db_path), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Upload de um arquivo grande: POST único em /api/ipfs/upload contra o upload
+retomável em blocos (/api/uploads) com 1 e N blocos simultâneos, mais um envio
+interrompido no meio e retomado, que mede os bytes reenviados. Resultado em JSON.
+
+    python bench/resumable_upload.py --url http://127.0.0.1:5000 --size-mb 512 --parallel 4
+
+Cada cenário usa conteúdo aleatório próprio: os documentos nunca são duplicados.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import time
+
+import requests
+from gevent.pool import Pool
+
+from stats import summary
+
+
+def make_file(size):
+    return os.urandom(size)
+
+
+def run_single(url, content):
+    """Arquivo inteiro em um POST multipart, com o hash calculado antes do envio."""
+    started = time.monotonic()
+    response = requests.post(
+        f"{url}/api/ipfs/upload",
+        data={"data": hashlib.sha256(content).hexdigest()},
+        files={"file": ("video.mp4", content)},
+        timeout=3600
+    )
+    duration = time.monotonic() - started
+    return {
+        "mode": "single",
+        "status_code": response.status_code,
+        "bytes_sent": len(content),
+        "duration_s": round(duration, 2),
+        "mb_per_second": round(len(content) / duration / 2**20, 1),
+    }
+
+
+def create_session(session, url, content):
+    response = session.post(f"{url}/api/uploads", json={"filename": "video.mp4", "size": len(content)}, timeout=60)
+    response.raise_for_status()
+    return response.json()
+
+
+def put_chunks(session, url, upload, content, indexes, parallel, stop_after=None):
+    """Envia os blocos 'indexes' com 'parallel' requisições simultâneas; retorna bytes enviados e latências."""
+    chunk_size = upload["chunk_size"]
+    sent, latencies = [0], []
+    pending = list(indexes)
+
+    def worker(_):
+        while pending and (stop_after is None or sent[0] < stop_after):
+            index = pending.pop(0)
+            chunk = content[index * chunk_size:(index + 1) * chunk_size]
+            started = time.monotonic()
+            response = session.put(
+                f"{url}/api/uploads/{upload['upload_id']}",
+                data=chunk,
+                headers={
+                    "Upload-Offset": str(index * chunk_size),
+                    "Upload-Checksum": "sha256 " + base64.b64encode(hashlib.sha256(chunk).digest()).decode(),
+                },
+                timeout=600
+            )
+            response.raise_for_status()
+            latencies.append(time.monotonic() - started)
+            sent[0] += len(chunk)
+
+    Pool(parallel).map(worker, range(parallel))
+    return sent[0], latencies
+
+
+def run_chunked(url, content, parallel):
+    session = requests.Session()
+    started = time.monotonic()
+    upload = create_session(session, url, content)
+    sent, latencies = put_chunks(session, url, upload, content, range(upload["chunk_count"]), parallel)
+    finalize_started = time.monotonic()
+    response = session.post(f"{url}/api/uploads/{upload['upload_id']}/finalize", timeout=3600)
+    finished = time.monotonic()
+    duration = finished - started
+    return {
+        "mode": "chunked",
+        "parallel": parallel,
+        "status_code": response.status_code,
+        "sha256_ok": response.json().get("hash") == hashlib.sha256(content).hexdigest(),
+        "chunk_size": upload["chunk_size"],
+        "bytes_sent": sent,
+        "duration_s": round(duration, 2),
+        "finalize_s": round(finished - finalize_started, 3),
+        "mb_per_second": round(len(content) / duration / 2**20, 1),
+        "chunk_latency": summary(latencies),
+    }
+
+
+def run_resume(url, content, parallel, drop_at):
+    """
+    Interrompe o envio depois de 'drop_at' do arquivo, descarta o estado do
+    cliente e retoma pela consulta de status: só os blocos faltantes são reenviados.
+    """
+    session = requests.Session()
+    started = time.monotonic()
+    upload = create_session(session, url, content)
+    first, _ = put_chunks(session, url, upload, content, range(upload["chunk_count"]), parallel,
+                          stop_after=int(len(content) * drop_at))
+
+    # Nova conexão, como um navegador reaberto
+    session = requests.Session()
+    status = session.get(f"{url}/api/uploads/{upload['upload_id']}", timeout=60).json()
+    second, _ = put_chunks(session, url, upload, content, status["missing"], parallel)
+    response = session.post(f"{url}/api/uploads/{upload['upload_id']}/finalize", timeout=3600)
+    duration = time.monotonic() - started
+    return {
+        "mode": "resume",
+        "parallel": parallel,
+        "drop_at": drop_at,
+        "status_code": response.status_code,
+        "bytes_before_drop": first,
+        "bytes_after_resume": second,
+        "bytes_resent": first + second - len(content),
+        "restart_from_zero_would_send": first + len(content),
+        "duration_s": round(duration, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", required=True, help="URL base da API")
+    parser.add_argument("--size-mb", type=int, default=512, help="tamanho do arquivo em MiB")
+    parser.add_argument("--parallel", type=int, default=4, help="blocos simultâneos no upload em blocos")
+    parser.add_argument("--drop-at", type=float, default=0.6, help="fração enviada antes da interrupção")
+    parser.add_argument("--mode", choices=("single", "chunked", "resume", "all"), default="all")
+    args = parser.parse_args()
+
+    size = args.size_mb * 2**20
+    results = []
+    if args.mode in ("single", "all"):
+        results.append(run_single(args.url, make_file(size)))
+    if args.mode in ("chunked", "all"):
+        for parallel in sorted({1, args.parallel}):
+            results.append(run_chunked(args.url, make_file(size), parallel))
+    if args.mode in ("resume", "all"):
+        results.append(run_resume(args.url, make_file(size), args.parallel, args.drop_at))
+    print(json.dumps({"url": args.url, "size_mb": args.size_mb, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Teste de carga do canal Socket.IO: N conexões, cada uma na sala de um endereço
+de pagamento, recebendo as transições publicadas pelo StatusNotifier.
+
+O servidor roda em um subprocesso (gevent) com um banco SQLite temporário e
+N registros; os clientes são greenlets falando o protocolo Engine.IO/Socket.IO
+diretamente sobre WebSocket. Mede a conexão, a confirmação da assinatura e a
+latência da publicação até a entrega, e confere que cada cliente recebe apenas
+os eventos da sua sala. O resultado sai em JSON.
+
+    python bench/socketio_load.py --clients 10000 --events 2000
+
+Cada conexão usa um descritor de arquivo em cada processo: ajuste 'ulimit -n'.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import base64
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import gevent
+import gevent.event
+import requests
+from gevent.pool import Pool
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from stats import summary  # noqa: E402
+
+
+def address_for(index):
+    return f"bcrt1qload{index:010d}"
+
+
+def serve(port, clients, db_path):
+    """Servidor do teste: Flask-SocketIO com o StatusNotifier real sobre um banco migrado."""
+    from flask import Flask, jsonify, request
+    from flask_socketio import SocketIO
+
+    from database import Database
+    from notifications import StatusNotifier
+    from schema import migrate
+
+    db = Database(db_path)
+    with db.connection() as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO transactions (id, client_address, hash, ipfs_hash, status) VALUES (?, ?, ?, ?, 'awaiting_payment')",
+            [(index + 1, address_for(index), f"{index:064x}", f"QmLoad{index}") for index in range(clients)]
+        )
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='gevent', cors_allowed_origins="*")
+    notifier = StatusNotifier(socketio, db)
+    notifier.register_handlers()
+
+    @app.route('/publish', methods=['POST'])
+    def publish():
+        # Publica 'paid' para os primeiros 'count' registros, como faz o monitor
+        count = int(request.args.get('count', 1))
+        sent_at = time.time()
+        for transaction_id in range(1, count + 1):
+            notifier.publish(transaction_id, "paid", time=sent_at, amount=0.0001)
+        return jsonify({"status": "success", "published": count})
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return jsonify(notifier.metrics)
+
+    socketio.start_background_task(notifier.run_forever)
+    socketio.run(app, host='127.0.0.1', port=port, log_output=False)
+
+
+class WebSocket:
+    """Cliente WebSocket mínimo (RFC 6455, apenas quadros de texto) sobre um socket cooperativo."""
+
+    def __init__(self, host, port, path):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        self.buffer = b""
+        while b"\r\n\r\n" not in self.buffer:
+            self._fill()
+        headers, self.buffer = self.buffer.split(b"\r\n\r\n", 1)
+        if b" 101 " not in headers.split(b"\r\n", 1)[0]:
+            raise RuntimeError(headers.split(b"\r\n", 1)[0].decode())
+
+    def _fill(self):
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("conexão encerrada")
+        self.buffer += data
+
+    def _read(self, size):
+        while len(self.buffer) < size:
+            self._fill()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def send(self, text, opcode=0x1):
+        payload = text.encode() if isinstance(text, str) else text
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([0x80 | len(payload)])
+        elif len(payload) < 65536:
+            header += bytes([0x80 | 126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", len(payload))
+        mask = os.urandom(4)
+        self.sock.sendall(header + mask + bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload)))
+
+    def receive(self):
+        """Próxima mensagem de texto; None quando o servidor fecha a conexão."""
+        while True:
+            first, second = self._read(2)
+            size = second & 0x7f
+            if size == 126:
+                size = struct.unpack("!H", self._read(2))[0]
+            elif size == 127:
+                size = struct.unpack("!Q", self._read(8))[0]
+            payload = self._read(size)
+            opcode = first & 0x0f
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self.send(payload, opcode=0xa)
+            elif opcode in (0x1, 0x0):
+                return payload.decode()
+
+
+class LoadClient:
+    """Cliente Socket.IO mínimo (Engine.IO v4 sobre WebSocket)."""
+
+    def __init__(self, port, address):
+        self.port = port
+        self.address = address
+        self.ws = None
+        self.events = []  # (recebido_em, payload)
+        self.subscribed = gevent.event.Event()
+
+    def connect(self):
+        self.ws = WebSocket("127.0.0.1", self.port, "/socket.io/?EIO=4&transport=websocket")
+        opened = self.ws.receive()  # '0{...}': handshake do Engine.IO
+        if not opened or not opened.startswith("0"):
+            raise RuntimeError(f"Handshake inesperado: {opened!r:.40}")
+        self.ws.send("40")
+        connected = self.ws.receive()  # '40{"sid": ...}'
+        if not connected or not connected.startswith("40"):
+            raise RuntimeError(f"Conexão recusada: {connected!r:.40}")
+
+    def subscribe(self):
+        self.ws.send("421" + json.dumps(["subscribe", {"address": self.address}]))
+
+    def run(self):
+        while True:
+            try:
+                message = self.ws.receive()
+            except Exception:  # conexão encerrada
+                return
+            if message is None:
+                return
+            if message == "2":  # ping do servidor
+                self.ws.send("3")
+            elif message.startswith("431"):
+                self.subscribed.set()
+            elif message.startswith("42"):
+                event, payload = json.loads(message[2:])
+                if event == "registration_status":
+                    self.events.append((time.time(), payload))
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("O servidor do teste não iniciou.")
+
+
+def run(args):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    db_path = os.path.join(tempfile.mkdtemp(prefix="socketio_load_"), "load.db")
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+         "--clients", str(args.clients), "--db", db_path],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port(port)
+        clients = [LoadClient(port, address_for(index)) for index in range(args.clients)]
+
+        connect_times, subscribe_times, errors = [], [], []
+
+        def connect(client):
+            started = time.monotonic()
+            try:
+                client.connect()
+            except Exception as e:
+                errors.append(str(e))
+                return
+            connect_times.append(time.monotonic() - started)
+            gevent.spawn(client.run)
+            started = time.monotonic()
+            client.subscribe()
+            if client.subscribed.wait(30):
+                subscribe_times.append(time.monotonic() - started)
+            else:
+                errors.append("subscribe timeout")
+
+        started = time.monotonic()
+        Pool(args.concurrency).map(connect, clients)
+        connect_duration = time.monotonic() - started
+
+        published_at = time.time()
+        requests.post(f"http://127.0.0.1:{port}/publish", params={"count": args.events}, timeout=60)
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            if sum(len(client.events) for client in clients[:args.events]) >= args.events:
+                break
+            gevent.sleep(0.05)
+        # Dá tempo para eventuais entregas indevidas às demais salas
+        gevent.sleep(1)
+
+        delivery_times = []
+        misdirected = 0
+        for client in clients:
+            for received_at, payload in client.events:
+                if payload.get("address") != client.address:
+                    misdirected += 1
+                delivery_times.append(received_at - published_at)
+        unexpected = sum(len(client.events) for client in clients[args.events:])
+        server_metrics = requests.get(f"http://127.0.0.1:{port}/metrics", timeout=10).json()
+
+        return {
+            "clients": args.clients,
+            "connected": len(connect_times),
+            "connect_duration_s": round(connect_duration, 2),
+            "connect": summary(connect_times),
+            "subscribe_ack": summary(subscribe_times),
+            "events_published": args.events,
+            "events_delivered": len(delivery_times),
+            "delivery": summary(delivery_times),
+            "misdirected": misdirected,
+            "delivered_to_other_rooms": unexpected,
+            "errors": len(errors),
+            "first_errors": errors[:5],
+            "server": server_metrics,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10000, help="conexões simultâneas")
+    parser.add_argument("--events", type=int, default=1000, help="salas que recebem uma transição")
+    parser.add_argument("--concurrency", type=int, default=500, help="conexões abertas em paralelo")
+    parser.add_argument("--timeout", type=float, default=60, help="espera máxima pelas entregas (segundos)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.clients, args.db)
+        return
+    args.events = min(args.events, args.clients)
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
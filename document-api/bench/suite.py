@@ -0,0 +1,300 @@
+"""
+Suíte de carga da API sem o docker-compose: sobe o bitcoind e o IPFS simulados
+(bench/fake_bitcoind.py e bench/fake_ipfs.py) e a API com gunicorn apontando
+para eles, com banco SQLite temporário, e mede os caminhos principais em cada
+nível de concorrência. Resultado em JSON: vazão e latência p50/p95/p99 por
+cenário e nível.
+
+    python bench/suite.py --concurrency 1,10,50 --duration 10 > baseline.json
+    python bench/suite.py --concurrency 1,10,50 --duration 10 --baseline baseline.json
+
+Com --baseline, cenários com vazão menor ou p95 maior que o da execução de
+referência além de --tolerance são listados em "regressions" e o processo
+termina com código 1 (uso em CI).
+
+Cenários:
+  upload   POST /api/ipfs/upload (arquivo novo a cada requisição)
+  send     POST /api/transaction/send (pagamento a um endereço de documento)
+  confirm  GET  /api/transaction/confirm/<txid>
+  anchor   POST /api/transaction/opreturn/confirm (OP_RETURN com UTXOs reservados)
+  history  GET  /api/transactions/<endereço>
+  count    GET  /api/transaction/count
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from http_load import run_level
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+SCENARIOS = ("upload", "send", "confirm", "anchor", "history", "count")
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_until_ready(process, port, path=None, timeout=120):
+    """Espera a porta aceitar conexões e, com path, o GET responder sem erro 5xx."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{os.path.basename(process.args[-1])} terminou durante a inicialização.")
+        try:
+            if path is None:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return
+            if requests.get(f"http://127.0.0.1:{port}{path}", timeout=2).status_code < 500:
+                return
+        except (OSError, requests.RequestException):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"A porta {port} não respondeu em {timeout} segundos.")
+
+
+class Stack:
+    """bitcoind e IPFS simulados mais a API (gunicorn), cada um em seu subprocesso."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="bench_suite_")
+        self.processes = []
+        self.log = open(os.path.join(self.workdir, "stack.log"), "w")
+
+    def _spawn(self, command, env=None, cwd=None):
+        process = subprocess.Popen(command, cwd=cwd, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        return process
+
+    def start(self):
+        rpc_port, ipfs_port, api_port = free_port(), free_port(), free_port()
+        node = self._spawn([
+            sys.executable, os.path.join(BENCH_DIR, "fake_bitcoind.py"), "--port", str(rpc_port),
+            "--latency", str(self.args.node_latency), "--block-interval", str(self.args.block_interval)
+        ])
+        ipfs = self._spawn([
+            sys.executable, os.path.join(BENCH_DIR, "fake_ipfs.py"), "--port", str(ipfs_port),
+            "--latency", str(self.args.ipfs_latency)
+        ])
+        wait_until_ready(ipfs, ipfs_port)
+        wait_until_ready(node, rpc_port)
+        self.rpc_url = f"http://127.0.0.1:{rpc_port}"
+
+        env = dict(
+            os.environ,
+            RPC_HOST="127.0.0.1", RPC_PORT=str(rpc_port),
+            IPFS_API_URL=f"http://127.0.0.1:{ipfs_port}/api/v0",
+            PORT=str(api_port), WEB_CONCURRENCY=str(self.args.workers),
+            RUN_SERVICES="true" if self.args.services else "false",
+            DB_PATH=os.path.join(self.workdir, "transactions.db"),
+            INIT_LOCK_PATH=os.path.join(self.workdir, "init.lock"),
+            SERVICES_LOCK_PATH=os.path.join(self.workdir, "services.lock"),
+        )
+        if self.args.services is None:
+            # Sem RUN_SERVICES, o primeiro worker a obter a trava executa os serviços (como em produção)
+            del env["RUN_SERVICES"]
+        api = self._spawn([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"], env=env, cwd=API_DIR)
+        wait_until_ready(api, api_port, "/api/block/count")
+        return f"http://127.0.0.1:{api_port}"
+
+    def stop(self, keep_logs=False):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.log.close()
+        if keep_logs:
+            print(f"Saída dos processos em {self.log.name}", file=sys.stderr)
+        else:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def multipart(fields, boundary):
+    """Corpo multipart/form-data com os campos na ordem dada: [(nome, nome do arquivo ou None, bytes)]."""
+    body = b""
+    for name, filename, value in fields:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + value + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+def json_request(method, path, payload):
+    return method, path, json.dumps(payload).encode(), {"Content-Type": "application/json"}
+
+
+class Scenarios:
+    """
+    Geradores de requisições de cada cenário. A preparação registra documentos e
+    pagamentos reais na API, de modo que confirm e history consultam dados existentes.
+    """
+
+    def __init__(self, url, file_size):
+        self.url = url
+        self.file_size = file_size
+        self.counter = itertools.count()
+        self.addresses = []  # documentos pagos na preparação (confirm, history)
+        self.txids = []
+        self.payees = []  # documentos que recebem os pagamentos do cenário send
+
+    def _upload_request(self):
+        # Conteúdo único por requisição: documentos repetidos cairiam no atalho de deduplicação
+        content = os.urandom(self.file_size)
+        boundary = f"bench{next(self.counter)}"
+        body = multipart([("data", None, hashlib.sha256(content).hexdigest().encode()),
+                          ("file", "document.pdf", content)], boundary)
+        return "POST", "/api/ipfs/upload", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+    def prepare(self, documents, amount):
+        """
+        Registra 2 x documents documentos: metade é paga agora e não recebe outros
+        pagamentos (o send regravaria o txid consultado pelo confirm), a outra
+        metade é o destino do cenário send.
+        """
+        session = requests.Session()
+        addresses = []
+        for _ in range(2 * documents):
+            method, path, body, headers = self._upload_request()
+            response = session.post(self.url + path, data=body, headers=headers, timeout=60).json()
+            if response.get("status") != "success":
+                raise RuntimeError(f"Falha ao preparar o upload: {response}")
+            addresses.append(response["address"])
+        self.addresses, self.payees = addresses[:documents], addresses[documents:]
+        for address in self.addresses:
+            response = session.post(f"{self.url}/api/transaction/send",
+                                    json={"address": address, "amount": amount}, timeout=60).json()
+            if response.get("status") != "success":
+                raise RuntimeError(f"Falha ao preparar o pagamento: {response}")
+            self.txids.append(response["txid"])
+
+    def build(self, name, amount):
+        addresses, txids, payees = (itertools.cycle(self.addresses), itertools.cycle(self.txids),
+                                    itertools.cycle(self.payees))
+        if name == "upload":
+            return self._upload_request
+        if name == "send":
+            return lambda: json_request("POST", "/api/transaction/send", {"address": next(payees), "amount": amount})
+        if name == "confirm":
+            return lambda: ("GET", f"/api/transaction/confirm/{next(txids)}", None, {})
+        if name == "anchor":
+            # O campo data vai direto para o OP_RETURN: CID em hex, como a ancoragem em lote grava
+            return lambda: json_request("POST", "/api/transaction/opreturn/confirm", {
+                "wallet_name": "platform_wallet",
+                "data": f"bench-{next(self.counter)}".encode().hex()
+            })
+        if name == "history":
+            return lambda: ("GET", f"/api/transactions/{next(addresses)}", None, {})
+        if name == "count":
+            return lambda: ("GET", "/api/transaction/count", None, {})
+        raise ValueError(f"Cenário desconhecido: {name}")
+
+
+def find_regressions(results, baseline, tolerance):
+    reference = {(entry["scenario"], entry["concurrency"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        previous = reference.get((entry["scenario"], entry["concurrency"]))
+        if not previous:
+            continue
+        if entry["requests_per_second"] < previous["requests_per_second"] * (1 - tolerance):
+            regressions.append({"scenario": entry["scenario"], "concurrency": entry["concurrency"],
+                                "metric": "requests_per_second", "baseline": previous["requests_per_second"],
+                                "current": entry["requests_per_second"]})
+        p95, previous_p95 = entry["latency"]["p95_ms"], previous["latency"]["p95_ms"]
+        if p95 is not None and previous_p95 is not None and p95 > previous_p95 * (1 + tolerance):
+            regressions.append({"scenario": entry["scenario"], "concurrency": entry["concurrency"],
+                                "metric": "p95_ms", "baseline": previous_p95, "current": p95})
+    return regressions
+
+
+def run(args):
+    stack = None
+    url = args.url
+    failed = True
+    try:
+        if not url:
+            stack = Stack(args)
+            url = stack.start()
+        print(f"API em {url}; preparando {args.documents} documentos...", file=sys.stderr)
+        scenarios = Scenarios(url, args.file_size)
+        scenarios.prepare(args.documents, args.amount)
+
+        levels = [int(level) for level in args.concurrency.split(",")]
+        results = []
+        for name in args.scenarios.split(","):
+            make_request = scenarios.build(name, args.amount)
+            if args.warmup:
+                run_level(url, levels[0], args.warmup, make_request, error_status=400)
+            for level in levels:
+                print(f"{name}: concorrência {level}...", file=sys.stderr)
+                result = run_level(url, level, args.duration, make_request, error_status=400)
+                results.append(dict(scenario=name, **result))
+        failed = False
+        return url, results
+    finally:
+        if stack:
+            stack.stop(keep_logs=failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="API já em execução (apontando para os simulados); sem ela, a suíte sobe tudo")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="cenários separados por vírgula")
+    parser.add_argument("--concurrency", default="1,10,50", help="níveis separados por vírgula")
+    parser.add_argument("--duration", type=float, default=10, help="segundos por cenário e nível")
+    parser.add_argument("--warmup", type=float, default=1, help="segundos descartados antes de cada cenário")
+    parser.add_argument("--documents", type=int, default=50, help="documentos pagos na preparação (e outros tantos para o send)")
+    parser.add_argument("--file-size", type=int, default=16 * 1024, help="bytes de cada arquivo enviado")
+    parser.add_argument("--amount", type=float, default=0.0001, help="BTC de cada pagamento")
+    parser.add_argument("--workers", type=int, default=1, help="WEB_CONCURRENCY do gunicorn")
+    parser.add_argument("--services", action="store_true", help="executa também os serviços de fundo na API")
+    parser.add_argument("--node-latency", type=float, default=0.001, help="latência do bitcoind simulado (s)")
+    parser.add_argument("--ipfs-latency", type=float, default=0.002, help="latência do IPFS simulado (s)")
+    parser.add_argument("--block-interval", type=float, default=2, help="segundos entre blocos do bitcoind simulado")
+    parser.add_argument("--label", default=None, help="identificação da execução (ex.: commit)")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="variação aceita em relação ao baseline")
+    args = parser.parse_args()
+
+    url, results = run(args)
+    output = {
+        "label": args.label,
+        "url": url if args.url else "local",
+        "config": {
+            "duration": args.duration, "workers": args.workers, "services": args.services,
+            "file_size": args.file_size, "node_latency": args.node_latency,
+            "ipfs_latency": args.ipfs_latency, "block_interval": args.block_interval,
+        },
+        "results": results,
+    }
+    regressions = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.tolerance)
+        output["regressions"] = regressions
+    print(json.dumps(output, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
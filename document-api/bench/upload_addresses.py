@@ -0,0 +1,79 @@
+"""
+Uploads simultâneos (POST /api/ipfs/upload) com vários workers do gunicorn:
+cada upload recebe um endereço do pool (AddressPool). Mede vazão e latência
+p50/p95/p99, quantos uploads geraram o endereço na hora (getnewaddress fora
+de lote, no caminho da requisição) e quantos endereços ainda estão livres no
+pool ao final. Resultado em JSON.
+
+    python bench/upload_addresses.py --workers 4 --concurrency 200 --duration 30
+
+Só um worker executa os serviços de fundo (trava em arquivo, como em produção),
+inclusive a reposição do pool; os demais reivindicam os endereços que ele gera.
+Um endereço gerado na hora custa um getnewaddress dentro da transação de escrita
+do SQLite, então --node-latency simula o RPC de um bitcoind real.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from types import SimpleNamespace
+
+import requests
+
+from http_load import run_level
+from suite import Scenarios, Stack
+
+
+def pool_free(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM address_pool WHERE assigned_at IS NULL").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def single_getnewaddress(rpc_url):
+    """getnewaddress fora de lote atendidos pelo bitcoind simulado (a reposição do pool usa lotes)."""
+    response = requests.post(rpc_url, json={"method": "getbenchstats", "params": [], "id": 1}, timeout=10).json()
+    return response["result"]["single_calls"].get("getnewaddress", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="workers do gunicorn (WEB_CONCURRENCY)")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--file-size", type=int, default=4096)
+    parser.add_argument("--node-latency", type=float, default=0.02, help="segundos acrescentados a cada RPC")
+    parser.add_argument("--pool-size", type=int, default=500, help="ADDRESS_POOL_SIZE")
+    args = parser.parse_args()
+
+    os.environ.update(ADDRESS_POOL_SIZE=str(args.pool_size), ADDRESS_POOL_BATCH=str(args.pool_size // 5))
+    stack = Stack(SimpleNamespace(node_latency=args.node_latency, block_interval=0, ipfs_latency=0.0,
+                                  workers=args.workers, services=None))
+    failed = True
+    try:
+        url = stack.start()
+        db_path = os.path.join(stack.workdir, "transactions.db")
+        scenarios = Scenarios(url, args.file_size)
+        # Aquecimento: abre as conexões keep-alive dos workers com o IPFS e o bitcoind
+        run_level(url, args.workers, 2, scenarios.build("upload", 0), error_status=400)
+        before = single_getnewaddress(stack.rpc_url)
+        print(f"{args.concurrency} uploads simultâneos por {args.duration} s...", file=sys.stderr)
+        result = run_level(url, args.concurrency, args.duration, scenarios.build("upload", 0), error_status=400)
+        report = {"workers": args.workers, "pool_size": args.pool_size, "node_latency": args.node_latency, **result,
+                  "addresses_generated_in_request": single_getnewaddress(stack.rpc_url) - before,
+                  "pool_free": pool_free(db_path)}
+        failed = False
+    finally:
+        stack.stop(keep_logs=failed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Pico de memória (RSS) e tempo de um único upload grande em /api/ipfs/upload,
+no modo em streaming (STREAM_UPLOADS=true) e no modo com arquivo temporário
+(STREAM_UPLOADS=false), contra o IPFS e o bitcoind simulados. Resultado em JSON.
+
+    python bench/upload_memory.py --sizes 10M,500M,2G --buffered-sizes 10M,500M
+
+Cada medição sobe uma API nova (gunicorn, um worker), para que o pico de RSS
+(VmHWM do worker) seja o daquele upload. write_mb são os bytes gravados em disco
+pelo worker durante o upload (/proc/<pid>/io), ou seja, as cópias temporárias.
+O modo com arquivo temporário monta o corpo do /add inteiro em memória
+(requests files=), então só roda nos tamanhos de --buffered-sizes.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from suite import Stack
+
+BLOCK = 1024 * 1024
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(value):
+    value = value.strip().upper()
+    return int(float(value[:-1]) * UNITS[value[-1]]) if value[-1] in UNITS else int(value)
+
+
+def content_blocks(size, seed):
+    """Conteúdo pseudoaleatório gerado em blocos: o cliente também não guarda o arquivo."""
+    rng = random.Random(seed)
+    remaining = size
+    while remaining > 0:
+        block = rng.randbytes(min(BLOCK, remaining))
+        remaining -= len(block)
+        yield block
+
+
+def proc_status(pid, key):
+    """Valor em kB de uma linha de /proc/<pid>/status (VmRSS, VmHWM)."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(key + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def proc_write_bytes(pid):
+    with open(f"/proc/{pid}/io") as io:
+        for line in io:
+            if line.startswith("write_bytes:"):
+                return int(line.split()[1])
+    return 0
+
+
+def worker_pid(master_pid, timeout=30):
+    """PID do worker do gunicorn (filho do master)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as children:
+            pids = children.read().split()
+        if pids:
+            return int(pids[0])
+        time.sleep(0.2)
+    raise RuntimeError("Worker do gunicorn não encontrado.")
+
+
+def upload(url, size, seed):
+    """POST multipart com Content-Length: o hash vai antes do arquivo, que é enviado em blocos."""
+    digest = hashlib.sha256()
+    for block in content_blocks(size, seed):
+        digest.update(block)
+    boundary = f"bench{seed}"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"data\"\r\n\r\n{digest.hexdigest()}\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"video.mp4\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n").encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    host, port = url.split("//")[1].split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=600)
+    started = time.monotonic()
+    conn.putrequest("POST", "/api/ipfs/upload")
+    conn.putheader("Content-Type", f"multipart/form-data; boundary={boundary}")
+    conn.putheader("Content-Length", str(len(head) + size + len(tail)))
+    conn.endheaders()
+    conn.send(head)
+    try:
+        for block in content_blocks(size, seed):
+            conn.send(block)
+        conn.send(tail)
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # a API pode responder (ex.: erro) antes de ler o corpo inteiro
+    response = conn.getresponse()
+    body = json.loads(response.read() or b"{}")
+    seconds = time.monotonic() - started
+    conn.close()
+    return response.status, body, seconds
+
+
+def measure(args, mode, size, seed):
+    os.environ["STREAM_UPLOADS"] = "true" if mode == "stream" else "false"
+    stack = Stack(SimpleNamespace(node_latency=0.0, block_interval=0, ipfs_latency=0.0, workers=1, services=False))
+    try:
+        url = stack.start()
+        pid = worker_pid(stack.processes[-1].pid)
+        idle_rss = proc_status(pid, "VmRSS")
+        written = proc_write_bytes(pid)
+        status, body, seconds = upload(url, size, seed)
+        result = {
+            "mode": mode,
+            "size_mb": round(size / BLOCK),
+            "status": status,
+            "seconds": round(seconds, 2),
+            "mb_per_second": round(size / BLOCK / seconds, 1),
+            "idle_rss_mb": round(idle_rss / 1024, 1),
+            "peak_rss_mb": round(proc_status(pid, "VmHWM") / 1024, 1),
+            "write_mb": round((proc_write_bytes(pid) - written) / BLOCK, 1),
+        }
+        if status != 200:
+            result["error"] = body.get("message")
+        return result
+    finally:
+        stack.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10M,500M,2G", help="tamanhos medidos no modo em streaming")
+    parser.add_argument("--buffered-sizes", default="10M,500M",
+                        help="tamanhos medidos no modo com arquivo temporário (o corpo do /add fica em memória)")
+    args = parser.parse_args()
+
+    runs = []
+    for mode, sizes in (("stream", args.sizes), ("buffered", args.buffered_sizes)):
+        for index, size in enumerate(parse_size(value) for value in sizes.split(",") if value):
+            runs.append(measure(args, mode, size, seed=index))
+            print(f"{mode} {runs[-1]['size_mb']} MB: {runs[-1]['seconds']} s", file=sys.stderr, flush=True)
+    print(json.dumps({"runs": runs}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import os
+import threading
+
+# Quantidade de chamadas agrupadas em cada requisição JSON-RPC em lote
+BATCH_SIZE = int(os.getenv('BLOCK_INDEX_BATCH_SIZE', 500))
+
+_sync_lock = threading.Lock()
+
+
+def init_block_index(cursor):
+    """Cria a tabela do índice de blocos (altura -> hash -> quantidade de transações)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blocks (
+            height INTEGER PRIMARY KEY,
+            hash TEXT NOT NULL,
+            tx_count INTEGER NOT NULL,
+            cumulative_tx_count INTEGER NOT NULL
+        )
+    ''')
+
+
+def batch_call(rpc, method, params_list, batch_size=BATCH_SIZE):
+    """Executa o mesmo método RPC para vários parâmetros, em lotes de batch_size."""
+    results = []
+    for start in range(0, len(params_list), batch_size):
+        chunk = params_list[start:start + batch_size]
+        results.extend(rpc.batch_([[method, *params] for params in chunk]))
+    return results
+
+
+def indexed_tip(cursor):
+    """(altura, hash, transações acumuladas) do último bloco indexado, ou None com o índice vazio."""
+    cursor.execute("SELECT height, hash, cumulative_tx_count FROM blocks ORDER BY height DESC LIMIT 1")
+    return cursor.fetchone()
+
+
+def _find_fork_height(rpc, cursor, height):
+    """
+    Percorre o índice para trás até encontrar um bloco cujo hash ainda está na
+    cadeia principal. Retorna a altura desse bloco (-1 se nenhum coincidir).
+    """
+    while height >= 0:
+        cursor.execute("SELECT hash FROM blocks WHERE height = ?", (height,))
+        row = cursor.fetchone()
+        if row and row[0] == rpc.getblockhash(height):
+            return height
+        height -= 1
+    return -1
+
+
+def sync_block_index(rpc, conn, blocking=True):
+    """
+    Estende o índice de blocos até o topo atual da cadeia. Na primeira execução
+    faz o backfill completo; depois só processa os blocos novos. Reorganizações
+    são detectadas comparando o hash armazenado com o da cadeia principal.
+    Com blocking=False retorna None se outra sincronização estiver em andamento.
+    """
+    if not _sync_lock.acquire(blocking):
+        return None
+    try:
+        cursor = conn.cursor()
+        block_count = rpc.getblockcount()
+
+        tip = indexed_tip(cursor)
+        last_height = -1
+        if tip:
+            last_height = min(tip[0], block_count)
+            if last_height != tip[0] or tip[1] != rpc.getblockhash(last_height):
+                last_height = _find_fork_height(rpc, cursor, last_height)
+            cursor.execute("DELETE FROM blocks WHERE height > ?", (last_height,))
+
+        cumulative = 0
+        if last_height >= 0:
+            cursor.execute("SELECT cumulative_tx_count FROM blocks WHERE height = ?", (last_height,))
+            cumulative = cursor.fetchone()[0]
+
+        for start in range(last_height + 1, block_count + 1, BATCH_SIZE):
+            heights = list(range(start, min(start + BATCH_SIZE, block_count + 1)))
+            hashes = batch_call(rpc, "getblockhash", [[h] for h in heights])
+            headers = batch_call(rpc, "getblockheader", [[block_hash] for block_hash in hashes])
+
+            rows = []
+            for height, block_hash, header in zip(heights, hashes, headers):
+                cumulative += header['nTx']
+                rows.append((height, block_hash, header['nTx'], cumulative))
+            cursor.executemany(
+                "INSERT INTO blocks (height, hash, tx_count, cumulative_tx_count) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+
+        conn.commit()
+        return indexed_tip(cursor)
+    finally:
+        _sync_lock.release()
+
@@ -0,0 +1,79 @@
+import os
+
+try:
+    import zmq
+except ImportError:  # pyzmq é opcional; sem ele usamos o long-poll via RPC
+    zmq = None
+
+# Modo de notificação de blocos: 'auto', 'zmq', 'longpoll' ou 'poll' (varredura periódica)
+BLOCK_NOTIFY_MODE = os.getenv('BLOCK_NOTIFY_MODE', 'auto').lower()
+# Endpoint do zmqpubhashblock do bitcoind (ex.: tcp://bitcoin-core:28332)
+ZMQ_BLOCK_URL = os.getenv('ZMQ_BLOCK_URL', '')
+
+
+def _zmq_module():
+    """Com o gevent ativo, usa a variante cooperativa do pyzmq para não bloquear o servidor."""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('socket'):
+            import zmq.green as zmq_green
+            return zmq_green
+    except ImportError:
+        pass
+    return zmq
+
+
+class ZMQBlockListener:
+    """Recebe os hashes de novos blocos publicados pelo bitcoind via zmqpubhashblock."""
+
+    def __init__(self, url):
+        zmq_module = _zmq_module()
+        self.context = zmq_module.Context.instance()
+        self.socket = self.context.socket(zmq_module.SUB)
+        self.socket.setsockopt(zmq_module.RCVHWM, 0)
+        self.socket.setsockopt_string(zmq_module.SUBSCRIBE, "hashblock")
+        self.socket.connect(url)
+
+    def wait(self, timeout):
+        """Aguarda até timeout segundos. Retorna o hash do bloco ou None."""
+        if not self.socket.poll(int(timeout * 1000)):
+            return None
+
+        block_hash = None
+        # Consome todas as notificações acumuladas; o monitor processa o intervalo inteiro
+        while self.socket.poll(0):
+            topic, body, *_ = self.socket.recv_multipart()
+            if topic == b"hashblock":
+                block_hash = body.hex()
+        return block_hash
+
+
+class LongPollBlockListener:
+    """Alternativa sem ZMQ: mantém uma chamada waitfornewblock aberta no bitcoind."""
+
+    def __init__(self, rpc):
+        self.rpc = rpc
+        self.tip = None
+
+    def wait(self, timeout):
+        """Aguarda até timeout segundos. Retorna o hash do bloco ou None."""
+        result = self.rpc.waitfornewblock(int(timeout * 1000))
+        if result["hash"] == self.tip:
+            return None
+        self.tip = result["hash"]
+        return self.tip
+
+
+def create_block_listener(rpc, mode=BLOCK_NOTIFY_MODE):
+    """Cria o listener de blocos do modo configurado, ou None para o modo de varredura."""
+    if mode == 'poll':
+        return None
+    if mode == 'zmq' or (mode == 'auto' and ZMQ_BLOCK_URL and zmq is not None):
+        if zmq is None:
+            raise RuntimeError("BLOCK_NOTIFY_MODE=zmq requer o pacote pyzmq.")
+        if not ZMQ_BLOCK_URL:
+            raise RuntimeError("BLOCK_NOTIFY_MODE=zmq requer ZMQ_BLOCK_URL.")
+        print(f"Recebendo notificações de blocos via ZMQ em {ZMQ_BLOCK_URL}.")
+        return ZMQBlockListener(ZMQ_BLOCK_URL)
+    print("Recebendo notificações de blocos via waitfornewblock.")
+    return LongPollBlockListener(rpc)
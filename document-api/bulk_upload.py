@@ -0,0 +1,385 @@
+import hashlib
+import json
+import os
+import tarfile
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from decimal import Decimal
+
+from werkzeug.http import parse_options_header
+
+from dedup import normalize_hash
+from streaming_upload import StreamingUpload, StreamingUploadError
+
+# Arquivos aceitos por lote e tamanho máximo de cada um (o conteúdo fica em memória até o envio ao IPFS)
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 50000))
+BULK_MAX_ITEM_SIZE = int(os.getenv('BULK_MAX_ITEM_SIZE', 8 * 1024 * 1024))
+# Envios simultâneos ao IPFS; no máximo o dobro disso aguarda em memória
+BULK_PIN_CONCURRENCY = int(os.getenv('BULK_PIN_CONCURRENCY', 8))
+# Arquivos por chamada /add: o custo de cada requisição HTTP domina para arquivos pequenos
+BULK_PIN_GROUP = int(os.getenv('BULK_PIN_GROUP', 32))
+BULK_PIN_GROUP_BYTES = 4 * 1024 * 1024
+# Registros gravados por transação SQLite
+BULK_DB_CHUNK = int(os.getenv('BULK_DB_CHUNK', 500))
+# Valor cobrado por documento registrado; o lote é pago de uma vez
+BULK_PRICE_PER_DOCUMENT = Decimal(os.getenv('BULK_PRICE_PER_DOCUMENT', '0.0001'))
+# Arquivos .zip são gravados em disco acima deste tamanho (o formato exige acesso aleatório)
+BULK_ZIP_SPOOL_SIZE = 64 * 1024 * 1024
+
+MANIFEST_NAME = "manifest.json"
+TAR_MIMETYPES = {"application/x-tar", "application/tar", "application/gzip", "application/x-gzip", "application/x-gtar"}
+ZIP_MIMETYPES = {"application/zip", "application/x-zip-compressed"}
+
+
+class BulkUploadError(Exception):
+    """Corpo do upload em lote inválido."""
+
+
+def create_batches_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_address TEXT NOT NULL,
+            amount TEXT,
+            item_count INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("ALTER TABLE transactions ADD COLUMN batch_id INTEGER REFERENCES batches (id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_batch_id ON transactions (batch_id) WHERE batch_id IS NOT NULL")
+
+
+def parse_manifest(text):
+    """Manifesto {"nome do arquivo": "sha256", ...}; os nomes seguem os do upload."""
+    try:
+        manifest = json.loads(text)
+    except ValueError:
+        raise BulkUploadError("Manifesto inválido: JSON malformado.")
+    if not isinstance(manifest, dict) or not all(isinstance(value, str) for value in manifest.values()):
+        raise BulkUploadError("Manifesto inválido: esperado um objeto {nome: sha256}.")
+    return manifest
+
+
+def multipart_items(stream, content_type, chunk_size, max_size=BULK_MAX_ITEM_SIZE):
+    """
+    Arquivos de um corpo multipart/form-data com várias partes 'files' (ou 'file').
+    O hash de cada arquivo vem no campo 'hash' logo antes dele ou no campo
+    'manifest', enviado antes dos arquivos.
+    """
+    try:
+        upload = StreamingUpload(stream, content_type, chunk_size)
+    except StreamingUploadError as e:
+        raise BulkUploadError(str(e))
+
+    def generate():
+        manifest = None
+        for name, content in upload.iter_files(max_size=max_size):
+            if manifest is None and "manifest" in upload.fields:
+                manifest = parse_manifest(upload.fields["manifest"])
+            expected = upload.fields.pop("hash", None) or (manifest or {}).get(name)
+            yield name, content, expected
+    return generate()
+
+
+def tar_items(stream, max_size=BULK_MAX_ITEM_SIZE):
+    """
+    Arquivos de um .tar (opcionalmente .tar.gz) lido em streaming. Um manifest.json
+    só vale para os arquivos que vêm depois dele: deve ser o primeiro membro.
+    """
+    try:
+        archive = tarfile.open(fileobj=stream, mode="r|*")
+    except tarfile.TarError as e:
+        raise BulkUploadError(f"Arquivo tar inválido: {str(e)}")
+
+    def generate():
+        manifest = {}
+        with archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                if member.size > max_size:
+                    yield member.name, None, manifest.get(member.name)
+                    continue
+                content = archive.extractfile(member).read()
+                if member.name == MANIFEST_NAME:
+                    manifest = parse_manifest(content)
+                    continue
+                yield member.name, content, manifest.get(member.name)
+    return generate()
+
+
+def zip_items(stream, max_size=BULK_MAX_ITEM_SIZE):
+    """Arquivos de um .zip, gravado antes em um arquivo temporário; o manifest.json pode estar em qualquer posição."""
+    spool = tempfile.SpooledTemporaryFile(max_size=BULK_ZIP_SPOOL_SIZE)
+    while True:
+        chunk = stream.read(1024 * 1024)
+        if not chunk:
+            break
+        spool.write(chunk)
+    try:
+        archive = zipfile.ZipFile(spool)
+    except zipfile.BadZipFile as e:
+        spool.close()
+        raise BulkUploadError(f"Arquivo zip inválido: {str(e)}")
+
+    def generate():
+        with spool, archive:
+            manifest = {}
+            if MANIFEST_NAME in archive.namelist():
+                manifest = parse_manifest(archive.read(MANIFEST_NAME))
+            for info in archive.infolist():
+                if info.is_dir() or info.filename == MANIFEST_NAME:
+                    continue
+                content = archive.read(info) if info.file_size <= max_size else None
+                yield info.filename, content, manifest.get(info.filename)
+    return generate()
+
+
+def read_items(stream, content_type, chunk_size):
+    """Escolhe o leitor pelo Content-Type; gera (nome, conteúdo ou None, hash informado ou None)."""
+    mimetype, _ = parse_options_header(content_type or "")
+    if mimetype == "multipart/form-data":
+        return multipart_items(stream, content_type, chunk_size)
+    if mimetype in TAR_MIMETYPES:
+        return tar_items(stream)
+    if mimetype in ZIP_MIMETYPES:
+        return zip_items(stream)
+    raise BulkUploadError("Envie multipart/form-data, application/x-tar ou application/zip.")
+
+
+class BulkRegistration:
+    """
+    Registro de vários documentos em uma única requisição. O lote recebe um
+    único endereço de pagamento e, após o pagamento, é ancorado inteiro sob a
+    mesma raiz de Merkle (ver AnchorBatcher). O lote e o endereço só são criados
+    quando o primeiro arquivo já enviado ao IPFS vai ser gravado: um envio só de
+    duplicados ou de erros (inclusive falhas do /add) não consome endereço do pool.
+
+    Os arquivos são lidos do corpo em sequência e enviados ao IPFS em grupos de
+    até BULK_PIN_GROUP por chamada /add, por um pool de BULK_PIN_CONCURRENCY
+    threads; os CIDs são gravados no SQLite em
+    transações de BULK_DB_CHUNK registros. O resultado de cada arquivo é uma
+    linha NDJSON. Enquanto o corpo é lido, as linhas ficam acumuladas: um
+    cliente que só lê a resposta após terminar o envio não trava a conexão.
+    """
+
+    def __init__(self, db, ipfs, document_index, address_pool, discard_pin, concurrency=BULK_PIN_CONCURRENCY,
+                 group_size=BULK_PIN_GROUP, db_chunk=BULK_DB_CHUNK, max_items=BULK_MAX_ITEMS,
+                 price=BULK_PRICE_PER_DOCUMENT):
+        self.db = db
+        self.ipfs = ipfs
+        self.document_index = document_index
+        self.address_pool = address_pool
+        # Recebe o CID de um arquivo que não foi registrado e desfaz o pin se nenhum registro o usa
+        self.discard_pin = discard_pin
+        self.concurrency = concurrency
+        self.group_size = group_size
+        self.db_chunk = db_chunk
+        self.max_items = max_items
+        self.price = price
+        self.metrics = {"batches": 0, "registered": 0, "duplicates": 0, "errors": 0}
+
+    def _open_batch(self):
+        with self.db.connection() as conn:
+            address = self.address_pool.acquire(conn)
+            cursor = conn.execute(
+                "INSERT INTO batches (client_address, status) VALUES (?, 'receiving')", (address,)
+            )
+            return cursor.lastrowid, address
+
+    def _close_batch(self, batch_id, registered):
+        amount = self.price * registered
+        with self.db.connection() as conn:
+            conn.execute(
+                "UPDATE batches SET amount = ?, item_count = ?, status = 'closed' WHERE id = ?",
+                (str(amount), registered, batch_id)
+            )
+        return amount
+
+    def _pin(self, group):
+        return self.ipfs.add_many([content for _, content in group])
+
+    def _register(self, batch_id, address, pinned):
+        """Grava os arquivos já enviados ao IPFS em uma transação; retorna as linhas de resultado."""
+        lines, duplicates = [], []
+        with self.db.connection() as conn:
+            for item, ipfs_hash in pinned:
+                cursor = conn.execute(
+                    "INSERT INTO transactions (client_address, hash, ipfs_hash, status, batch_id) "
+                    "VALUES (?, ?, ?, 'awaiting_payment', ?)",
+                    (address, item["hash"], ipfs_hash, batch_id)
+                )
+                transaction_id = cursor.lastrowid
+                if not self.document_index.try_register(conn, item["hash"], transaction_id):
+                    # Outro upload do mesmo documento chegou antes
+                    conn.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+                    duplicates.append((item, ipfs_hash))
+                    continue
+                lines.append(dict(
+                    item, status="registered", registration_id=transaction_id, ipfs_hash=ipfs_hash,
+                    download_url=f"http://127.0.0.1:8080/ipfs/{ipfs_hash}"
+                ))
+        # Fora da transação: o pin do arquivo duplicado é desfeito e o registro existente é devolvido
+        for item, ipfs_hash in duplicates:
+            self.discard_pin(ipfs_hash)
+            lines.append(self._duplicate(item, self.document_index.lookup(item["hash"], use_filter=False)))
+        return lines
+
+    def _duplicate(self, item, existing):
+        self.metrics["duplicates"] += 1
+        return dict(
+            item, status="duplicate", registration_id=existing["id"], address=existing["address"],
+            ipfs_hash=existing["ipfs_hash"], download_url=f"http://127.0.0.1:8080/ipfs/{existing['ipfs_hash']}",
+            registration_status=existing["status"], txid=existing["txid"], op_return_txid=existing["op_return_txid"]
+        )
+
+    def _error(self, item, message):
+        self.metrics["errors"] += 1
+        return dict(item, status="error", message=message)
+
+    def run(self, items):
+        """
+        Gera as linhas NDJSON (dicts) do lote: um 'item' por arquivo, na ordem em
+        que o IPFS conclui, 'batch' com o endereço logo antes do primeiro arquivo
+        registrado e 'summary' com o valor a pagar. Sem arquivos registrados não
+        há lote: nem 'batch', e 'summary' sem endereço.
+        """
+        batch_id = address = None
+        lines = []
+        group, group_bytes = [], 0  # (item, conteúdo) aguardando o próximo /add
+        in_flight = {}  # future -> itens do grupo
+        pinned = []
+        seen = {}  # hash -> índice do primeiro arquivo do lote com esse conteúdo
+        counts = {"registered": 0, "duplicate": 0, "error": 0}
+        executor = ThreadPoolExecutor(self.concurrency)
+
+        def record(new_lines):
+            for line in new_lines:
+                counts[line["status"]] += 1
+            lines.extend(new_lines)
+
+        def open_batch():
+            nonlocal batch_id, address
+            batch_id, address = self._open_batch()
+            self.metrics["batches"] += 1
+            lines.append({"type": "batch", "batch_id": batch_id, "address": address})
+
+        def collect(return_when):
+            done, _ = wait(in_flight, return_when=return_when)
+            for future in done:
+                items_sent = in_flight.pop(future)
+                try:
+                    pinned.extend(zip(items_sent, future.result()))
+                except Exception as e:
+                    record([self._error(item, f"Erro ao enviar arquivo para o IPFS: {str(e)}") for item in items_sent])
+            if len(pinned) >= self.db_chunk or (not in_flight and pinned):
+                if batch_id is None:
+                    open_batch()
+                record(self._register(batch_id, address, pinned))
+                pinned.clear()
+
+        def submit():
+            nonlocal group, group_bytes
+            in_flight[executor.submit(self._pin, group)] = [item for item, _ in group]
+            group, group_bytes = [], 0
+
+        received = 0
+        closed = False
+        try:
+            try:
+                for index, (name, content, expected) in enumerate(items):
+                    item = {"type": "item", "index": index, "name": name}
+                    if index >= self.max_items:
+                        lines.append({"type": "error", "message": f"Limite de {self.max_items} arquivos por lote atingido."})
+                        break
+                    received += 1
+                    if content is None:
+                        record([self._error(item, "Arquivo excede o tamanho máximo.")])
+                        continue
+                    document_hash = hashlib.sha256(content).hexdigest()
+                    item["hash"] = document_hash
+                    if expected is not None and normalize_hash(expected) != document_hash:
+                        record([self._error(item, "Hash do arquivo não confere com o conteúdo enviado.")])
+                        continue
+                    if document_hash in seen:
+                        self.metrics["duplicates"] += 1
+                        record([dict(item, status="duplicate", duplicate_of=seen[document_hash])])
+                        continue
+                    seen[document_hash] = index
+
+                    existing = self.document_index.lookup(document_hash)
+                    if existing:
+                        record([self._duplicate(item, existing)])
+                        continue
+
+                    group.append((item, content))
+                    group_bytes += len(content)
+                    if len(group) >= self.group_size or group_bytes >= BULK_PIN_GROUP_BYTES:
+                        submit()
+                        if len(in_flight) >= 2 * self.concurrency:
+                            collect(FIRST_COMPLETED)
+            except (BulkUploadError, StreamingUploadError, tarfile.TarError, zipfile.BadZipFile, EOFError, zlib.error) as e:
+                # Corpo truncado ou malformado: os arquivos já lidos seguem para o registro
+                lines.append({"type": "error", "message": str(e)})
+
+            if group:
+                submit()
+            # Corpo lido por completo: daqui em diante cada resultado sai assim que fica pronto
+            yield from lines
+            lines.clear()
+            while in_flight or pinned:
+                collect(FIRST_COMPLETED)
+                yield from lines
+                lines.clear()
+
+            amount = self._close_batch(batch_id, counts["registered"]) if batch_id is not None else Decimal(0)
+            closed = True
+            yield {
+                "type": "summary",
+                "batch_id": batch_id,
+                "address": address,
+                "amount": float(amount),
+                "items": received,
+                "registered": counts["registered"],
+                "duplicates": counts["duplicate"],
+                "errors": counts["error"],
+            }
+        finally:
+            # Cliente desconectado no meio do lote: vale o que já foi gravado
+            executor.shutdown(wait=False)
+            if not closed and batch_id is not None:
+                self._close_batch(batch_id, counts["registered"])
+            self.metrics["registered"] += counts["registered"]
+
+    def status(self, batch_id):
+        """Dados do lote e quantidade de registros em cada etapa."""
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT client_address, amount, item_count, status, created_at FROM batches WHERE id = ?", (batch_id,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute(
+                "SELECT status, COUNT(*) FROM transactions WHERE batch_id = ? GROUP BY status", (batch_id,)
+            )
+            stages = dict(cursor.fetchall())
+            cursor.execute(
+                "SELECT DISTINCT anchor_id, op_return_txid FROM transactions WHERE batch_id = ? AND anchor_id IS NOT NULL",
+                (batch_id,)
+            )
+            anchors = [{"anchor_id": anchor_id, "op_return_txid": txid} for anchor_id, txid in cursor.fetchall()]
+        address, amount, item_count, upload_status, created_at = row
+        return {
+            "batch_id": batch_id,
+            "address": address,
+            "amount": float(amount) if amount is not None else None,
+            "item_count": item_count,
+            "upload_status": upload_status,
+            "created_at": created_at,
+            "stages": stages,
+            "anchors": anchors,
+        }
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from database import Database
+
+# Entradas mantidas em memória (LRU)
+CHAIN_CACHE_SIZE = int(os.getenv('CHAIN_CACHE_SIZE', 2000))
+# Profundidade a partir da qual blocos e transações são tratados como imutáveis
+CHAIN_CACHE_MIN_CONFIRMATIONS = int(os.getenv('CHAIN_CACHE_MIN_CONFIRMATIONS', 6))
+# Arquivo SQLite da camada em disco (vazio desativa)
+CHAIN_CACHE_PATH = os.getenv('CHAIN_CACHE_PATH', '')
+# Validade da altura do topo consultada via getblockcount (o monitor também a atualiza a cada bloco)
+CHAIN_CACHE_TIP_TTL = float(os.getenv('CHAIN_CACHE_TIP_TTL', 5))
+
+
+def _dumps(value):
+    # Valores do RPC usam Decimal; float preserva os 8 decimais e volta como Decimal no _loads
+    return json.dumps(value, default=float, separators=(',', ':'))
+
+
+def _loads(value):
+    return json.loads(value, parse_float=Decimal)
+
+
+class ChainCache:
+    """
+    Cache de leitura para dados da cadeia que não mudam mais: hash por altura,
+    blocos e transações com pelo menos CHAIN_CACHE_MIN_CONFIRMATIONS
+    confirmações. Dados mais rasos sempre vêm do bitcoind. O campo
+    'confirmations' é recalculado a partir do topo atual a cada leitura.
+
+    A cada novo topo, o hash da maior altura em cache é conferido com a cadeia;
+    se uma reorganização mais profunda que o limite o invalidou, o cache é limpo.
+    """
+
+    def __init__(self, rpc, size=CHAIN_CACHE_SIZE, min_confirmations=CHAIN_CACHE_MIN_CONFIRMATIONS,
+                 disk_path=CHAIN_CACHE_PATH):
+        self.rpc = rpc
+        self.size = size
+        self.min_confirmations = min_confirmations
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._tip = None  # (consultado_em, altura)
+        self._checkpoint = None  # (altura, hash) do bloco mais alto com dados em cache
+        self.disk = Database(disk_path) if disk_path else None
+        if self.disk:
+            with self.disk.connection() as conn:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS chain_cache "
+                    "(key TEXT PRIMARY KEY, height INTEGER NOT NULL, block_hash TEXT NOT NULL, value TEXT NOT NULL) "
+                    "WITHOUT ROWID"
+                )
+                self._checkpoint = conn.execute(
+                    "SELECT height, block_hash FROM chain_cache ORDER BY height DESC LIMIT 1"
+                ).fetchone()
+        self.metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "uncacheable": 0, "invalidations": 0}
+
+    def _count(self, metric):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def _get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return value
+
+        if self.disk:
+            with self.disk.cursor() as cursor:
+                cursor.execute("SELECT value FROM chain_cache WHERE key = ?", (key,))
+                row = cursor.fetchone()
+            if row:
+                value = _loads(row[0])
+                self._put_memory(key, value)
+                self._count("disk_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def _put_memory(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.size:
+                self._memory.popitem(last=False)
+
+    def _put(self, key, value, height, block_hash):
+        """Grava o valor, que pertence ao bloco (height, block_hash) da cadeia principal."""
+        self._put_memory(key, value)
+        with self._lock:
+            if self._checkpoint is None or height > self._checkpoint[0]:
+                self._checkpoint = (height, block_hash)
+        if self.disk:
+            with self.disk.connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO chain_cache (key, height, block_hash, value) VALUES (?, ?, ?, ?)",
+                    (key, height, block_hash, _dumps(value))
+                )
+
+    def tip_height(self, refresh=False):
+        with self._lock:
+            tip = self._tip
+        if refresh or tip is None or time.monotonic() - tip[0] > CHAIN_CACHE_TIP_TTL:
+            return self.set_tip(self.rpc.getblockcount())
+        return tip[1]
+
+    def set_tip(self, height):
+        """Atualiza o topo (chamado pelo monitor a cada bloco) e descarta o cache após uma reorganização profunda."""
+        with self._lock:
+            previous = self._tip
+            self._tip = (time.monotonic(), height)
+            checkpoint = self._checkpoint
+        # Só um topo diferente do anterior pode indicar uma reorganização
+        if previous is not None and previous[1] == height:
+            return height
+        # Se o bloco mais alto em cache continua na cadeia principal, todos os abaixo dele também
+        if checkpoint is not None and (checkpoint[0] > height or self.rpc.getblockhash(checkpoint[0]) != checkpoint[1]):
+            print("Reorganização profunda detectada: cache da cadeia descartado.")
+            self.clear()
+        return height
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._checkpoint = None
+            self.metrics["invalidations"] += 1
+        if self.disk:
+            with self.disk.connection() as conn:
+                conn.execute("DELETE FROM chain_cache")
+
+    def _is_deep(self, height, tip):
+        return tip - height + 1 >= self.min_confirmations
+
+    def get_block_hash(self, height):
+        key = f"height:{height}"
+        block_hash = self._get(key)
+        if block_hash is not None:
+            return block_hash
+
+        block_hash = self.rpc.getblockhash(height)
+        if self._is_deep(height, self.tip_height()):
+            self._put(key, block_hash, height, block_hash)
+        else:
+            self._count("uncacheable")
+        return block_hash
+
+    def get_block(self, block_hash):
+        """getblock (verbosidade 1) com 'confirmations' atualizado."""
+        key = f"block:{block_hash}"
+        block = self._get(key)
+        if block is None:
+            block = self.rpc.getblock(block_hash)
+            if block.get("confirmations", 0) >= self.min_confirmations:
+                self._put(key, block, block["height"], block_hash)
+            else:
+                self._count("uncacheable")
+                return block
+
+        block = dict(block)
+        block["confirmations"] = self.tip_height() - block["height"] + 1
+        return block
+
+    def get_raw_transaction(self, txid):
+        """getrawtransaction verboso com 'confirmations' atualizado."""
+        key = f"rawtx:{txid}"
+        entry = self._get(key)
+        if entry is None:
+            transaction = self.rpc.getrawtransaction(txid, True)
+            confirmations = transaction.get("confirmations", 0)
+            if confirmations < self.min_confirmations:
+                self._count("uncacheable")
+                return transaction
+            # A resposta não traz a altura do bloco: deriva do topo atual
+            height = self.tip_height(refresh=True) - confirmations + 1
+            entry = {"height": height, "transaction": transaction}
+            self._put(key, entry, height, transaction["blockhash"])
+
+        transaction = dict(entry["transaction"])
+        transaction["confirmations"] = self.tip_height() - entry["height"] + 1
+        return transaction
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from instrumentation import METRICS_ENABLED, TimedConnection
+from schema import configure_connection
+
+# Conexões ociosas mantidas para reuso e tamanho do cache de instruções preparadas
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 16))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 256))
+
+
+class Database:
+    """
+    Camada de acesso ao SQLite. As conexões são reaproveitadas entre requisições
+    (threads ou greenlets), cada uma com seu cache de instruções preparadas, e
+    emprestadas com exclusividade durante um bloco 'with'.
+    """
+
+    def __init__(self, path, pool_size=DB_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,  # o empréstimo exclusivo garante um usuário por vez
+            cached_statements=DB_STATEMENT_CACHE_SIZE,
+            # Mede cada instrução em db_query_duration_seconds
+            factory=TimedConnection if METRICS_ENABLED else sqlite3.Connection
+        )
+        return configure_connection(conn)
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Empresta uma conexão. Ao fim do bloco faz commit; em caso de exceção faz
+        rollback. A conexão volta ao pool ou é fechada se o pool estiver cheio.
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._release(conn)
+            raise
+        self._release(conn)
+
+    @contextmanager
+    def cursor(self):
+        """Atalho para blocos que usam apenas um cursor."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,157 @@
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+
+# Capacidade planejada do filtro de Bloom e taxa de falsos positivos aceita
+DEDUP_BLOOM_CAPACITY = int(os.getenv('DEDUP_BLOOM_CAPACITY', 1000000))
+DEDUP_BLOOM_ERROR_RATE = float(os.getenv('DEDUP_BLOOM_ERROR_RATE', 0.01))
+# Hashes recentes mantidos em memória com o registro correspondente
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', 10000))
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre um bytearray; 'não contém' é definitivo, 'contém' é provável."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Dupla dispersão: k posições derivadas de dois inteiros de 64 bits
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def normalize_hash(document_hash):
+    return document_hash.strip().lower()
+
+
+class DocumentIndex:
+    """
+    Índice de deduplicação dos documentos pelo SHA-256 enviado pelo cliente.
+    A tabela documents (hash único) é a fonte da verdade; à frente dela ficam
+    um filtro de Bloom, que descarta sem consultar o banco os hashes nunca
+    vistos, e um LRU com o registro dos hashes consultados recentemente.
+    O status é sempre lido do banco, pois muda ao longo do registro.
+
+    O filtro e o LRU são de cada processo e só recebem os hashes carregados na
+    inicialização e os registrados pelo próprio processo. Um documento gravado
+    por outro worker depois disso passa pelo filtro como novo: o upload segue
+    até o IPFS e só é reconhecido como duplicado pela chave única de documents
+    em register, quando o chamador deve desfazer o pin e devolver o registro
+    existente (lookup com use_filter=False). Acima de DEDUP_BLOOM_CAPACITY
+    hashes, a taxa de falsos positivos cresce, o que custa apenas consultas.
+    """
+
+    def __init__(self, db, capacity=DEDUP_BLOOM_CAPACITY, error_rate=DEDUP_BLOOM_ERROR_RATE,
+                 cache_size=DEDUP_CACHE_SIZE):
+        self.db = db
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # hash -> id da transação
+        self._lock = threading.Lock()
+        self.metrics = {"lookups": 0, "bloom_negatives": 0, "cache_hits": 0, "duplicates": 0}
+
+    def load(self):
+        """Carrega no filtro de Bloom os hashes já registrados (chamar após as migrações)."""
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT hash FROM documents")
+            with self._lock:
+                for (document_hash,) in cursor:
+                    self.bloom.add(document_hash)
+
+    def _remember(self, document_hash, transaction_id):
+        with self._lock:
+            self.bloom.add(document_hash)
+            self._cache[document_hash] = transaction_id
+            self._cache.move_to_end(document_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def lookup(self, document_hash, use_filter=True):
+        """
+        Retorna o registro existente do documento (dict) ou None. Com use_filter=False
+        consulta o banco mesmo para hashes ausentes do filtro (ex.: gravados por outro processo).
+        """
+        document_hash = normalize_hash(document_hash)
+        with self._lock:
+            self.metrics["lookups"] += 1
+            if use_filter and document_hash not in self.bloom:
+                self.metrics["bloom_negatives"] += 1
+                return None
+            transaction_id = self._cache.get(document_hash)
+            if transaction_id is not None:
+                self._cache.move_to_end(document_hash)
+                self.metrics["cache_hits"] += 1
+
+        with self.db.cursor() as cursor:
+            if transaction_id is not None:
+                cursor.execute(
+                    "SELECT id, client_address, ipfs_hash, txid, op_return_txid, status "
+                    "FROM transactions WHERE id = ?",
+                    (transaction_id,)
+                )
+            else:
+                cursor.execute(
+                    "SELECT t.id, t.client_address, t.ipfs_hash, t.txid, t.op_return_txid, t.status "
+                    "FROM documents d JOIN transactions t ON t.id = d.transaction_id WHERE d.hash = ?",
+                    (document_hash,)
+                )
+            row = cursor.fetchone()
+        if row is None:
+            if transaction_id is not None:
+                # Registro desfeito (rollback) depois de entrar no cache
+                with self._lock:
+                    self._cache.pop(document_hash, None)
+            return None
+
+        self._remember(document_hash, row[0])
+        with self._lock:
+            self.metrics["duplicates"] += 1
+        return {
+            "id": row[0],
+            "address": row[1],
+            "ipfs_hash": row[2],
+            "txid": row[3],
+            "op_return_txid": row[4],
+            "status": row[5],
+        }
+
+    def register(self, conn, document_hash, transaction_id):
+        """
+        Associa o hash ao registro na transação do chamador. Lança
+        sqlite3.IntegrityError se outro upload do mesmo documento chegou antes.
+        """
+        document_hash = normalize_hash(document_hash)
+        conn.execute(
+            "INSERT INTO documents (hash, transaction_id) VALUES (?, ?)",
+            (document_hash, transaction_id)
+        )
+        self._remember(document_hash, transaction_id)
+
+    def try_register(self, conn, document_hash, transaction_id):
+        """
+        Como register, mas sem exceção: retorna False se o documento já estava
+        registrado, sem desfazer o restante da transação do chamador (ex.: um lote).
+        """
+        document_hash = normalize_hash(document_hash)
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO documents (hash, transaction_id) VALUES (?, ?)",
+            (document_hash, transaction_id)
+        )
+        if not cursor.rowcount:
+            return False
+        self._remember(document_hash, transaction_id)
+        return True
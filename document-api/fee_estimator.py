@@ -0,0 +1,164 @@
+import math
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_CEILING
+
+# Alvo de confirmação (em blocos) das transações novas e das substituições (RBF) de ancoragens presas
+FEE_CONF_TARGET = int(os.getenv('FEE_CONF_TARGET', 6))
+FEE_BUMP_CONF_TARGET = int(os.getenv('FEE_BUMP_CONF_TARGET', 2))
+FEE_ESTIMATE_MODE = os.getenv('FEE_ESTIMATE_MODE', 'economical')
+# Validade da tabela de taxas consultada via estimatesmartfee (segundos)
+FEE_CACHE_TTL = float(os.getenv('FEE_CACHE_TTL', 60))
+# Limites da taxa em sat/vB; a taxa de reserva vale quando o nó não tem estimativa (ex.: regtest recém-criado)
+FEE_MIN_RATE = Decimal(os.getenv('FEE_MIN_RATE', '1'))
+FEE_MAX_RATE = Decimal(os.getenv('FEE_MAX_RATE', '500'))
+FEE_FALLBACK_RATE = Decimal(os.getenv('FEE_FALLBACK_RATE', '10'))
+# Uma ancoragem é acelerada após FEE_BUMP_AFTER_BLOCKS blocos fora da cadeia; cada substituição
+# paga pelo menos FEE_BUMP_INCREMENT sat/vB a mais (regra 4 do BIP125)
+FEE_BUMP_AFTER_BLOCKS = int(os.getenv('FEE_BUMP_AFTER_BLOCKS', 2))
+FEE_BUMP_INCREMENT = Decimal(os.getenv('FEE_BUMP_INCREMENT', '1'))
+
+# Alvos consultados juntos em um único lote JSON-RPC
+FEE_TABLE_TARGETS = (1, 2, 3, 6, 12, 24, 144)
+
+SATOSHI = Decimal('0.00000001')
+# Sinaliza substituição por taxa (BIP125) em todas as entradas
+RBF_SEQUENCE = 0xfffffffd
+
+# Tamanhos virtuais (vbytes): cabeçalho com marcador segwit, entradas pelo tipo do script gasto
+TX_OVERHEAD_VSIZE = Decimal('10.5')
+INPUT_VSIZE_P2WPKH = Decimal('68')
+INPUT_VSIZES = {
+    "0014": INPUT_VSIZE_P2WPKH,  # P2WPKH
+    "5120": Decimal('57.5'),  # P2TR (caminho da chave)
+    "a914": Decimal('91'),  # P2SH-P2WPKH
+    "76a9": Decimal('148'),  # P2PKH
+}
+
+
+def input_vsize(script_pub_key):
+    """Tamanho virtual da entrada que gasta o script informado (hex); P2WPKH se desconhecido."""
+    return INPUT_VSIZES.get((script_pub_key or "")[:4], INPUT_VSIZE_P2WPKH)
+
+
+def output_vsize(address, value=None):
+    """
+    Tamanho da saída: 8 bytes do valor, 1 do tamanho do script e o script, deduzido
+    do formato do endereço. Para "data" (OP_RETURN), value é o dado em hex.
+    """
+    if address == "data":
+        length = len(value or "") // 2
+        push = 1 if length <= 75 else 2  # OP_PUSHDATA1 acima de 75 bytes
+        return 8 + 1 + 1 + push + length
+    address = address.lower()
+    if "1" in address:
+        hrp, data = address.rsplit("1", 1)
+        if hrp in ("bc", "tb", "bcrt") and data:
+            # Bech32: versão 0 com programa de 20 bytes (P2WPKH) ou de 32 bytes (P2WSH, P2TR)
+            return 31 if data[0] == "q" and len(data) == 39 else 43
+    if address[0] in "1mn":
+        return 34  # P2PKH
+    if address[0] in "32":
+        return 32  # P2SH
+    return 43
+
+
+def estimate_vsize(input_vsizes, outputs, change=True):
+    """
+    Tamanho virtual estimado da transação com as entradas (vsize de cada uma) e as
+    saídas ({endereço ou "data": valor}), mais uma saída de troco P2WPKH se change.
+    """
+    vsize = TX_OVERHEAD_VSIZE + sum(input_vsizes, Decimal(0))
+    vsize += sum(output_vsize(address, value) for output in outputs for address, value in output.items())
+    if change:
+        vsize += 31
+    return int(math.ceil(vsize))
+
+
+def fee_for(vsize, fee_rate):
+    """Taxa em BTC para vsize vbytes a fee_rate sat/vB, arredondada para cima no satoshi."""
+    return (Decimal(vsize) * Decimal(fee_rate) * SATOSHI).quantize(SATOSHI, rounding=ROUND_CEILING)
+
+
+def clamp_rate(fee_rate):
+    return min(max(Decimal(fee_rate), FEE_MIN_RATE), FEE_MAX_RATE)
+
+
+def plan_bump(entry, tip_height, target_rate, after_blocks=FEE_BUMP_AFTER_BLOCKS):
+    """
+    Nova taxa (sat/vB) para substituir a transação descrita por getmempoolentry,
+    ou None se ela ainda não está presa, tem descendentes (o bumpfee recusaria) ou
+    já paga o limite FEE_MAX_RATE.
+    """
+    if tip_height - entry["height"] < after_blocks or entry.get("descendantcount", 1) > 1:
+        return None
+    current_rate = Decimal(str(entry["fees"]["base"])) / SATOSHI / Decimal(entry["vsize"])
+    new_rate = min(max(Decimal(target_rate), current_rate + FEE_BUMP_INCREMENT), FEE_MAX_RATE)
+    if new_rate <= current_rate:
+        return None
+    return new_rate.quantize(Decimal('0.001'), rounding=ROUND_CEILING)
+
+
+class FeeEstimator:
+    """
+    Tabela de taxas (alvo em blocos -> sat/vB) obtida do estimatesmartfee em um
+    único lote JSON-RPC e mantida em cache por FEE_CACHE_TTL segundos. Sem
+    estimativa do nó, vale FEE_FALLBACK_RATE; a taxa mínima do mempool
+    (mempoolminfee) e os limites FEE_MIN_RATE/FEE_MAX_RATE são sempre aplicados.
+    """
+
+    def __init__(self, rpc, ttl=FEE_CACHE_TTL, mode=FEE_ESTIMATE_MODE, fallback_rate=FEE_FALLBACK_RATE):
+        self.rpc = rpc
+        self.ttl = ttl
+        self.mode = mode
+        self.fallback_rate = Decimal(fallback_rate)
+        self._lock = threading.Lock()
+        self._table = None  # (consultada_em, {alvo: sat/vB})
+        self.metrics = {"refreshes": 0, "fallbacks": 0, "errors": 0}
+
+    def _refresh(self):
+        calls = [["estimatesmartfee", target, self.mode] for target in FEE_TABLE_TARGETS] + [["getmempoolinfo"]]
+        results = self.rpc.batch_results(calls)
+        mempool_info, error = results[-1]
+        min_rate = FEE_MIN_RATE
+        if not error and mempool_info.get("mempoolminfee"):
+            # BTC/kvB -> sat/vB
+            min_rate = max(min_rate, Decimal(str(mempool_info["mempoolminfee"])) * Decimal(100000))
+
+        table = {}
+        for target, (estimate, error) in zip(FEE_TABLE_TARGETS, results):
+            if error or not estimate.get("feerate"):
+                continue
+            table[target] = clamp_rate(max(Decimal(str(estimate["feerate"])) * Decimal(100000), min_rate))
+        if not table:
+            self.metrics["fallbacks"] += 1
+            table = {target: clamp_rate(max(self.fallback_rate, min_rate)) for target in FEE_TABLE_TARGETS}
+        self.metrics["refreshes"] += 1
+        return table
+
+    def table(self):
+        """Tabela atual, recarregada do nó quando expira."""
+        with self._lock:
+            if self._table is None or time.monotonic() - self._table[0] > self.ttl:
+                try:
+                    self._table = (time.monotonic(), self._refresh())
+                except Exception as e:
+                    self.metrics["errors"] += 1
+                    print(f"Erro ao consultar estimativas de taxa: {e}")
+                    if self._table is None:
+                        rate = clamp_rate(self.fallback_rate)
+                        return {target: rate for target in FEE_TABLE_TARGETS}
+                    # Mantém a tabela anterior por mais um período em vez de consultar o nó a cada chamada
+                    self._table = (time.monotonic(), self._table[1])
+            return dict(self._table[1])
+
+    def fee_rate(self, conf_target=FEE_CONF_TARGET):
+        """Taxa em sat/vB para confirmar em até conf_target blocos (alvo mais próximo da tabela)."""
+        table = self.table()
+        eligible = [target for target in table if target <= conf_target]
+        return table[max(eligible)] if eligible else table[min(table)]
+
+    def stats(self):
+        table = self.table()
+        return dict(self.metrics, fee_rates={str(target): float(rate) for target, rate in sorted(table.items())})
@@ -0,0 +1,23 @@
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+
+# Cada worker é um processo gevent que atende milhares de conexões (HTTP e WebSocket).
+# Com mais de um worker, o Socket.IO exige SOCKETIO_MESSAGE_QUEUE e sessões fixas no balanceador.
+# As métricas de /metrics ficam na memória de cada worker: com WEB_CONCURRENCY > 1, cada coleta
+# mostra só o worker que atendeu (o balanceamento alterna entre eles), e os serviços de fundo só
+# aparecem no processo que os executa.
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+worker_class = "geventwebsocket.gunicorn.workers.GeventWebSocketWorker"
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', 1000))
+
+# Uploads grandes e chamadas RPC longas (ex.: waitfornewblock) não devem derrubar o worker
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Sem preload_app: create_app() inicia tarefas de fundo e abre travas que não sobrevivem ao fork
+preload_app = False
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = "-"
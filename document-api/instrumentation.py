@@ -0,0 +1,287 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+# Desativa a coleta (os pontos instrumentados continuam chamando observe, que retorna de imediato)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Limites superiores (segundos) dos buckets dos histogramas de latência
+METRICS_BUCKETS = tuple(sorted(float(bound) for bound in os.getenv(
+    'METRICS_BUCKETS', '0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30'
+).split(',')))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monotônico por combinação de rótulos."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Histograma cumulativo de latências por combinação de rótulos. observe() só
+    incrementa o bucket do valor; os acumulados são somados na exposição.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # rótulos -> [contagem por bucket (+Inf no fim), soma]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        bucket = bisect_left(self.buckets, value)
+        # Com a trava, como Counter.inc: threads do modo 'threading' e os pools de threads não perdem observações
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in list(self._series.items())}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class GaugeCallback:
+    """
+    Valor lido no momento da exposição: collect() retorna um número ou um
+    dicionário {tupla de rótulos: número}. Falhas omitem a métrica nessa coleta.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, collect, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        try:
+            values = self.collect()
+        except Exception as e:
+            print(f"Erro ao coletar a métrica {self.name}: {e}")
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Registry:
+    """Conjunto de métricas do processo, exposto no formato texto do Prometheus."""
+
+    def __init__(self, prefix="document_api"):
+        self.prefix = prefix
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(f"{self.prefix}_{name}", documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        return self._add(Histogram(f"{self.prefix}_{name}", documentation, labelnames, buckets))
+
+    def gauge_callback(self, name, documentation, collect, labelnames=()):
+        return self._add(GaugeCallback(f"{self.prefix}_{name}", documentation, collect, labelnames))
+
+    def bridge(self, component, collect):
+        """
+        Expõe os valores numéricos de um dicionário de métricas já existente
+        (ex.: chain_cache.metrics) como a série <prefixo>_<componente>{key="..."}.
+        """
+        name = _INVALID_NAME_CHARS.sub("_", component)
+        return self.gauge_callback(
+            name, f"Métricas internas de {component} (ver /api/monitor/metrics).",
+            lambda: {(key,): value for key, value in collect().items()}, ("key",)
+        )
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            samples = list(metric.samples())
+            if not samples:
+                continue
+            documentation = metric.documentation.replace('\\', '\\\\').replace('\n', '\\n')
+            lines.append(f"# HELP {metric.name} {documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Pontos instrumentados do caminho crítico
+http_request_duration = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota.", ("method", "route", "status")
+)
+rpc_request_duration = REGISTRY.histogram(
+    "rpc_request_duration_seconds", "Latência das chamadas JSON-RPC ao bitcoind por método.", ("method",)
+)
+rpc_errors = REGISTRY.counter("rpc_errors_total", "Chamadas JSON-RPC que falharam, por método.", ("method",))
+rpc_pool_wait = REGISTRY.histogram(
+    "rpc_pool_wait_seconds", "Espera por uma conexão livre no pool RPC.", ()
+)
+ipfs_request_duration = REGISTRY.histogram(
+    "ipfs_request_duration_seconds", "Latência das chamadas à API HTTP do IPFS por endpoint.", ("endpoint",)
+)
+ipfs_errors = REGISTRY.counter("ipfs_errors_total", "Chamadas à API do IPFS que falharam.", ("endpoint",))
+db_query_duration = REGISTRY.histogram(
+    "db_query_duration_seconds", "Execução das instruções SQLite (execute e fetch) por operação.", ("operation",)
+)
+monitor_sweep_duration = REGISTRY.histogram(
+    "monitor_sweep_duration_seconds", "Duração da varredura completa de pagamentos pendentes.", ()
+)
+
+
+def _operation(sql):
+    """Primeira palavra da instrução (SELECT, INSERT, ...): rótulo de baixa cardinalidade."""
+    word = sql.lstrip().split(None, 1)
+    return word[0].upper() if word else "EMPTY"
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que mede execute/executemany e as leituras seguintes da mesma instrução."""
+
+    _operation = None
+
+    def execute(self, sql, parameters=()):
+        self._operation = _operation(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, self._operation)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._operation = _operation(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, self._operation)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, self._operation or "FETCH")
+
+
+class TimedConnection(sqlite3.Connection):
+    """Conexão SQLite cujos cursores (inclusive os de conn.execute) são TimedCursor."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def instrument_app(app):
+    """Mede a latência de cada requisição Flask, rotulada pelo padrão da rota (não pela URL)."""
+    if not METRICS_ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started, request.method, route, str(response.status_code)
+            )
+        return response
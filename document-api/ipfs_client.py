@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from instrumentation import ipfs_errors, ipfs_request_duration
+
+# URL base da API HTTP do IPFS
+IPFS_API_URL = os.getenv('IPFS_API_URL', 'http://ipfs:5001/api/v0')
+# Tempo máximo para conectar e para aguardar cada resposta (o /add de arquivos grandes demora mais)
+IPFS_CONNECT_TIMEOUT = float(os.getenv('IPFS_CONNECT_TIMEOUT', 5))
+IPFS_TIMEOUT = float(os.getenv('IPFS_TIMEOUT', 10))
+IPFS_ADD_TIMEOUT = float(os.getenv('IPFS_ADD_TIMEOUT', 300))
+# Novas tentativas em falhas de conexão, antes de qualquer byte do corpo ser enviado
+IPFS_RETRIES = int(os.getenv('IPFS_RETRIES', 2))
+# Conexões keep-alive mantidas com o daemon do IPFS
+IPFS_POOL_SIZE = int(os.getenv('IPFS_POOL_SIZE', 16))
+# Validade do resultado do health check (/version)
+IPFS_HEALTH_TTL = float(os.getenv('IPFS_HEALTH_TTL', 30))
+
+
+class IPFSError(Exception):
+    """Falha de comunicação ou resposta inesperada da API do IPFS."""
+
+
+class IPFSClient:
+    """
+    Cliente da API HTTP do IPFS sobre uma sessão requests com conexões
+    keep-alive reaproveitadas. O /version é consultado apenas pelo health
+    check, cujo resultado positivo fica em cache por IPFS_HEALTH_TTL segundos.
+    """
+
+    def __init__(self, base_url=IPFS_API_URL, pool_size=IPFS_POOL_SIZE, retries=IPFS_RETRIES,
+                 health_ttl=IPFS_HEALTH_TTL):
+        self.base_url = base_url.rstrip('/')
+        self.health_ttl = health_ttl
+        self.session = requests.Session()
+        # Só falhas de conexão são repetidas: um /add em streaming não pode ser reenviado
+        retry = Retry(total=retries, connect=retries, read=0, status=0, backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._health_lock = threading.Lock()
+        self._health = None  # (verificado_em, disponível, versão)
+
+    def _post(self, path, timeout=IPFS_TIMEOUT, **kwargs):
+        # Com corpo em streaming, a duração inclui o envio do arquivo (medido em ipfs_request_duration_seconds)
+        started = time.perf_counter()
+        try:
+            response = self.session.post(
+                f"{self.base_url}/{path}",
+                timeout=(IPFS_CONNECT_TIMEOUT, timeout),
+                **kwargs
+            )
+        except requests.RequestException as e:
+            self._mark_unhealthy()
+            ipfs_errors.inc(path)
+            raise IPFSError(f"Falha ao conectar ao IPFS: {e}") from e
+        finally:
+            ipfs_request_duration.observe(time.perf_counter() - started, path)
+        if response.status_code != 200:
+            ipfs_errors.inc(path)
+            raise IPFSError(f"IPFS respondeu {response.status_code} em /{path}: {response.text[:200]}")
+        return response
+
+    def _mark_unhealthy(self):
+        with self._health_lock:
+            self._health = (time.monotonic(), False, None)
+
+    def version(self):
+        """Consulta /version e atualiza o cache do health check."""
+        try:
+            version = self._post("version").json()
+        except ValueError as e:
+            self._mark_unhealthy()
+            raise IPFSError("Resposta inválida do IPFS em /version.") from e
+        with self._health_lock:
+            self._health = (time.monotonic(), True, version)
+        return version
+
+    def is_available(self):
+        """
+        Health check com cache: enquanto o daemon responde, o /version só é
+        consultado quando o resultado expira; após uma falha, a cada chamada.
+        """
+        with self._health_lock:
+            health = self._health
+        if health and health[1] and time.monotonic() - health[0] < self.health_ttl:
+            return True
+        try:
+            self.version()
+            return True
+        except IPFSError:
+            return False
+
+    def add(self, files=None, data=None, headers=None):
+        """Adiciona conteúdo ao IPFS (arquivos ou corpo multipart já montado) e retorna o CID."""
+        response = self._post("add", timeout=IPFS_ADD_TIMEOUT, files=files, data=data, headers=headers)
+        try:
+            return response.json()['Hash']
+        except (ValueError, KeyError) as e:
+            raise IPFSError("Resposta inválida do IPFS em /add.") from e
+
+    def add_many(self, contents):
+        """
+        Adiciona vários arquivos pequenos (lista de bytes) em um único /add. O IPFS
+        responde uma linha JSON por arquivo, identificada pelo nome da parte (o índice);
+        retorna os CIDs na ordem recebida.
+        """
+        parts = [("file", (str(index), content)) for index, content in enumerate(contents)]
+        response = self._post("add", timeout=IPFS_ADD_TIMEOUT, files=parts)
+        cids = {}
+        try:
+            for line in response.text.splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    cids[entry['Name']] = entry['Hash']
+            return [cids[str(index)] for index in range(len(contents))]
+        except (ValueError, KeyError) as e:
+            raise IPFSError("Resposta inválida do IPFS em /add.") from e
+
+    def add_file(self, file_path):
+        with open(file_path, 'rb') as file:
+            return self.add(files={'file': file})
+
+    def pin_rm(self, ipfs_hash):
+        self._post("pin/rm", params={"arg": ipfs_hash})
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ipfs_client():
+    """Retorna o cliente IPFS compartilhado do processo."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = IPFSClient()
+        return _client
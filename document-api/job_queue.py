@@ -0,0 +1,206 @@
+import json
+import os
+import random
+import threading
+import time
+
+# Espera máxima de um worker ocioso antes de consultar a fila novamente
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+# Tentativas por job e backoff exponencial entre elas (segundos)
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 8))
+JOB_BACKOFF_BASE = float(os.getenv('JOB_BACKOFF_BASE', 2))
+JOB_BACKOFF_MAX = float(os.getenv('JOB_BACKOFF_MAX', 300))
+# Um job em execução cujo worker morreu volta para a fila após este prazo
+JOB_LEASE_TIMEOUT = float(os.getenv('JOB_LEASE_TIMEOUT', 600))
+
+
+def create_jobs_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stage TEXT NOT NULL,
+            transaction_id INTEGER REFERENCES transactions (id),
+            idempotency_key TEXT UNIQUE,
+            payload TEXT,
+            state TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_at REAL NOT NULL,
+            locked_until REAL,
+            last_error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Busca do próximo job de cada etapa
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_stage_state_run_at ON jobs (stage, state, run_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_transaction_id ON jobs (transaction_id)")
+
+
+class JobQueue:
+    """
+    Fila de jobs persistida no SQLite. Cada etapa do pipeline tem seu próprio
+    conjunto de workers (threads). Um job é reservado por um prazo (lease);
+    se o processo cair no meio da execução, o job volta para a fila quando o
+    prazo expira. Os handlers devem ser idempotentes, pois um job pode rodar
+    mais de uma vez. Jobs com a mesma chave de idempotência são enfileirados
+    uma única vez.
+    """
+
+    def __init__(self, db, max_attempts=JOB_MAX_ATTEMPTS, lease_timeout=JOB_LEASE_TIMEOUT):
+        self.db = db
+        self.max_attempts = max_attempts
+        self.lease_timeout = lease_timeout
+        self._handlers = {}  # etapa -> (handler, número de workers)
+        self._wakeups = {}  # etapa -> Event
+        self._threads = []
+
+    def register(self, stage, handler, workers=1):
+        """Associa o handler (recebe o job como dict) à etapa, com workers threads."""
+        self._handlers[stage] = (handler, workers)
+        self._wakeups[stage] = threading.Event()
+
+    def enqueue(self, stage, transaction_id=None, payload=None, idempotency_key=None, conn=None, delay=0):
+        """
+        Enfileira um job e retorna o seu id. Com conn, o job é gravado na mesma
+        transação do chamador; após o commit, o chamador deve chamar wake(stage).
+        """
+        if conn is None:
+            with self.db.connection() as conn:
+                job_id = self.enqueue(stage, transaction_id, payload, idempotency_key, conn, delay)
+            self.wake(stage)
+            return job_id
+
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO jobs (stage, transaction_id, idempotency_key, payload, run_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (stage, transaction_id, idempotency_key, json.dumps(payload or {}), time.time() + delay)
+        )
+        if cursor.rowcount:
+            job_id = cursor.lastrowid
+        else:
+            job_id = conn.execute("SELECT id FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()[0]
+        return job_id
+
+    def wake(self, stage):
+        wakeup = self._wakeups.get(stage)
+        if wakeup:
+            wakeup.set()
+
+    def find(self, idempotency_key):
+        """Retorna o job com a chave de idempotência informada, ou None."""
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, stage, transaction_id, state, attempts, last_error FROM jobs WHERE idempotency_key = ?",
+                (idempotency_key,)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "stage", "transaction_id", "state", "attempts", "last_error"), row))
+
+    def _claim(self, stage):
+        """Reserva o próximo job da etapa: na fila e vencido, ou em execução com lease expirado."""
+        now = time.time()
+        with self.db.connection() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT id, transaction_id, payload, attempts, state FROM jobs "
+                    "WHERE stage = ? AND ((state = 'queued' AND run_at <= ?) "
+                    "OR (state = 'running' AND locked_until < ?)) "
+                    "ORDER BY run_at LIMIT 1",
+                    (stage, now, now)
+                ).fetchone()
+                if row is None:
+                    return None
+
+                job_id, transaction_id, payload, attempts, state = row
+                cursor = conn.execute(
+                    "UPDATE jobs SET state = 'running', locked_until = ?, attempts = attempts + 1, "
+                    "updated_at = CURRENT_TIMESTAMP WHERE id = ? AND state = ? AND attempts = ?",
+                    (now + self.lease_timeout, job_id, state, attempts)
+                )
+                conn.commit()
+                # Outro worker reservou o mesmo job entre a consulta e a atualização
+                if cursor.rowcount:
+                    return {
+                        "id": job_id,
+                        "stage": stage,
+                        "transaction_id": transaction_id,
+                        "payload": json.loads(payload or "{}"),
+                        "attempts": attempts + 1,
+                    }
+
+    def _finish(self, job, error=None):
+        with self.db.connection() as conn:
+            if error is None:
+                conn.execute(
+                    "UPDATE jobs SET state = 'done', locked_until = NULL, last_error = NULL, "
+                    "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (job["id"],)
+                )
+            elif job["attempts"] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET state = 'failed', locked_until = NULL, last_error = ?, "
+                    "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (error, job["id"])
+                )
+            else:
+                # Backoff exponencial com jitter para não sincronizar as novas tentativas
+                delay = min(JOB_BACKOFF_BASE * 2 ** (job["attempts"] - 1), JOB_BACKOFF_MAX)
+                delay *= random.uniform(0.5, 1.0)
+                conn.execute(
+                    "UPDATE jobs SET state = 'queued', locked_until = NULL, run_at = ?, last_error = ?, "
+                    "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (time.time() + delay, error, job["id"])
+                )
+
+    def _run_worker(self, stage):
+        handler, _ = self._handlers[stage]
+        wakeup = self._wakeups[stage]
+        while True:
+            try:
+                job = self._claim(stage)
+            except Exception as e:
+                print(f"Erro ao buscar job da etapa {stage}: {e}")
+                job = None
+
+            if job is None:
+                wakeup.wait(JOB_POLL_INTERVAL)
+                wakeup.clear()
+                continue
+
+            try:
+                handler(job)
+                self._finish(job)
+            except Exception as e:
+                print(f"Erro no job {job['id']} ({stage}, tentativa {job['attempts']}): {e}")
+                try:
+                    self._finish(job, str(e))
+                except Exception as finish_error:
+                    # O lease expira e o job volta para a fila
+                    print(f"Erro ao registrar falha do job {job['id']}: {finish_error}")
+
+    def start(self):
+        """Inicia os workers de todas as etapas registradas."""
+        for stage, (_, workers) in self._handlers.items():
+            for _ in range(workers):
+                thread = threading.Thread(target=self._run_worker, args=(stage,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def depth(self):
+        """Jobs ainda não concluídos, por (etapa, estado): a profundidade da fila."""
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT stage, state, COUNT(*) FROM jobs WHERE state IN ('queued', 'running') GROUP BY stage, state"
+            )
+            return {(stage, state): count for stage, state, count in cursor.fetchall()}
+
+    def stats(self):
+        """Quantidade de jobs por etapa e estado."""
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT stage, state, COUNT(*) FROM jobs GROUP BY stage, state")
+            stats = {}
+            for stage, state, count in cursor.fetchall():
+                stats.setdefault(stage, {})[state] = count
+        return stats
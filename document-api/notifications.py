@@ -0,0 +1,197 @@
+import os
+import time
+from collections import deque
+
+from flask_socketio import join_room, leave_room, rooms
+
+from dedup import normalize_hash
+
+# Intervalo entre as entregas dos eventos acumulados (segundos)
+NOTIFY_INTERVAL = float(os.getenv('NOTIFY_INTERVAL', 0.2))
+# Salas por conexão: limita o custo de um cliente que assina muitos endereços
+NOTIFY_MAX_ROOMS = int(os.getenv('NOTIFY_MAX_ROOMS', 20))
+# Registros consultados por instrução ao montar os eventos
+NOTIFY_QUERY_CHUNK = 500
+
+REGISTRATION_FIELDS = ("id", "address", "hash", "ipfs_hash", "txid", "op_return_txid", "status", "anchor_id")
+REGISTRATION_COLUMNS = "id, client_address, hash, ipfs_hash, txid, op_return_txid, status, anchor_id"
+
+
+def address_room(address):
+    return f"address:{address}"
+
+
+def document_room(document_hash):
+    return f"document:{normalize_hash(document_hash)}"
+
+
+class StatusNotifier:
+    """
+    Canal de eventos do pipeline via Socket.IO. O cliente entra na sala do seu
+    endereço de pagamento ou do hash do documento (evento 'subscribe') e recebe
+    'registration_status' a cada mudança de etapa (pinned, awaiting_payment,
+    paid, anchored, confirmed) apenas dos seus registros.
+
+    As etapas rodam em threads (fila de jobs, monitor, ancoragem); elas só
+    acumulam a transição em publish(). A entrega fica em uma única tarefa de
+    fundo do Socket.IO (greenlet com gevent), que a cada NOTIFY_INTERVAL
+    consulta os registros de todas as transições acumuladas de uma vez.
+
+    Com uma fila de mensagens (message_queue), os clientes podem estar
+    conectados a outros workers: os eventos vão sempre para a fila, sem o
+    filtro pelas salas do gerenciador local.
+    """
+
+    def __init__(self, socketio, db, interval=NOTIFY_INTERVAL, message_queue=None):
+        self.socketio = socketio
+        self.db = db
+        self.interval = interval
+        self.message_queue = message_queue
+        self._pending = deque()  # (tipo, id, etapa, campos extras)
+        self.metrics = {"published": 0, "emitted": 0, "skipped": 0, "subscriptions": 0}
+
+    def publish(self, transaction_id, status, **extra):
+        """Registra a transição de um registro; pode ser chamado de qualquer thread."""
+        self._pending.append(("transaction", transaction_id, status, extra))
+        self.metrics["published"] += 1
+
+    def publish_anchor(self, anchor_id, status):
+        """Registra a transição de todos os registros de um lote de ancoragem."""
+        self._pending.append(("anchor", anchor_id, status, {}))
+        self.metrics["published"] += 1
+
+    def _fetch(self, column, keys):
+        """Registros por id ou por anchor_id, em consultas de até NOTIFY_QUERY_CHUNK chaves."""
+        rows = []
+        keys = list(keys)
+        with self.db.cursor() as cursor:
+            for start in range(0, len(keys), NOTIFY_QUERY_CHUNK):
+                chunk = keys[start:start + NOTIFY_QUERY_CHUNK]
+                cursor.execute(
+                    f"SELECT {REGISTRATION_COLUMNS} FROM transactions "
+                    f"WHERE {column} IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                )
+                rows += [dict(zip(REGISTRATION_FIELDS, row)) for row in cursor.fetchall()]
+        return rows
+
+    def _rooms(self, registration):
+        target = []
+        if registration["address"]:
+            target.append(address_room(registration["address"]))
+        if registration["hash"]:
+            target.append(document_room(registration["hash"]))
+        return target
+
+    def _listening(self, target):
+        # O gerenciador local só conhece as salas deste processo
+        if self.message_queue:
+            return target
+        # Salas vazias deixam de existir no gerenciador: nada a codificar nem enviar
+        namespace_rooms = self.socketio.server.manager.rooms.get('/', {})
+        return [room for room in target if room in namespace_rooms]
+
+    def _payload(self, registration, status):
+        payload = {key: registration[key] for key in REGISTRATION_FIELDS if key != "anchor_id"}
+        payload["status"] = status
+        payload["download_url"] = f"http://127.0.0.1:8080/ipfs/{registration['ipfs_hash']}" if registration["ipfs_hash"] else None
+        return payload
+
+    def flush(self):
+        """Entrega as transições acumuladas. Retorna a quantidade de eventos emitidos."""
+        pending = []
+        while self._pending:
+            pending.append(self._pending.popleft())
+        if not pending:
+            return 0
+
+        by_id = {row["id"]: row for row in self._fetch(
+            "id", {key for kind, key, _, _ in pending if kind == "transaction"})}
+        by_anchor = {}
+        for row in self._fetch("anchor_id", {key for kind, key, _, _ in pending if kind == "anchor"}):
+            by_anchor.setdefault(row["anchor_id"], []).append(row)
+
+        emitted = 0
+        for kind, key, status, extra in pending:
+            registrations = [by_id[key]] if kind == "transaction" and key in by_id else by_anchor.get(key, [])
+            for registration in registrations:
+                target = self._listening(self._rooms(registration))
+                if not target:
+                    self.metrics["skipped"] += 1
+                    continue
+                payload = self._payload(registration, status)
+                payload.update(extra)
+                self.socketio.emit("registration_status", payload, to=target)
+                if status == "paid" and registration["address"]:
+                    # Evento anterior ao canal por etapas, mantido para clientes existentes
+                    self.socketio.emit("payment_confirmed", {
+                        "txid": registration["txid"],
+                        "status": "confirmed",
+                        "time": extra.get("time"),
+                        "amount": extra.get("amount"),
+                        "address": registration["address"],
+                        "download_url": payload["download_url"],
+                    }, to=address_room(registration["address"]))
+                emitted += 1
+        self.metrics["emitted"] += emitted
+        return emitted
+
+    def run_forever(self):
+        """Laço de entrega; iniciar com socketio.start_background_task."""
+        while True:
+            started = time.monotonic()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erro ao enviar notificações: {e}")
+            self.socketio.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def current(self, address=None, document_hash=None):
+        """Estado atual dos registros de um endereço ou de um documento."""
+        with self.db.cursor() as cursor:
+            if address:
+                cursor.execute(
+                    f"SELECT {REGISTRATION_COLUMNS} FROM transactions WHERE client_address = ? ORDER BY id",
+                    (address,)
+                )
+            else:
+                cursor.execute(
+                    f"SELECT {', '.join('t.' + column for column in REGISTRATION_COLUMNS.split(', '))} "
+                    "FROM documents d JOIN transactions t ON t.id = d.transaction_id WHERE d.hash = ?",
+                    (normalize_hash(document_hash),)
+                )
+            registrations = [dict(zip(REGISTRATION_FIELDS, row)) for row in cursor.fetchall()]
+        return [self._payload(registration, registration["status"]) for registration in registrations]
+
+    def register_handlers(self):
+        """Eventos 'subscribe' e 'unsubscribe' ({"address": ...} ou {"hash": ...})."""
+
+        def target_room(data):
+            data = data if isinstance(data, dict) else {}
+            address = str(data.get("address") or "").strip()
+            document_hash = str(data.get("hash") or "").strip()
+            if address and len(address) <= 100 and address.isalnum():
+                return address_room(address), address, None
+            if document_hash and len(document_hash) == 64:
+                return document_room(document_hash), None, document_hash
+            return None, None, None
+
+        @self.socketio.on('subscribe')
+        def subscribe(data):
+            room, address, document_hash = target_room(data)
+            if room is None:
+                return {"status": "error", "message": "Informe 'address' ou 'hash' (SHA-256) válido."}
+            # rooms() inclui a sala individual da conexão
+            if room not in rooms() and len(rooms()) > NOTIFY_MAX_ROOMS:
+                return {"status": "error", "message": f"Limite de {NOTIFY_MAX_ROOMS} assinaturas por conexão."}
+            join_room(room)
+            self.metrics["subscriptions"] += 1
+            # O estado atual vai na confirmação: o cliente não precisa consultar a API antes
+            return {"status": "success", "room": room, "registrations": self.current(address, document_hash)}
+
+        @self.socketio.on('unsubscribe')
+        def unsubscribe(data):
+            room, _, _ = target_room(data)
+            if room is not None:
+                leave_room(room)
+            return {"status": "success", "room": room}
@@ -0,0 +1,280 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from block_index import batch_call
+
+# Blocos por faixa: cada faixa é gravada em uma transação e é a unidade de retomada
+OPRETURN_SCAN_CHUNK = int(os.getenv('OPRETURN_SCAN_CHUNK', 500))
+# Faixas varridas em paralelo
+OPRETURN_SCAN_WORKERS = int(os.getenv('OPRETURN_SCAN_WORKERS', 4))
+# Blocos completos (getblock verbosidade 2) por requisição JSON-RPC em lote
+OPRETURN_SCAN_BATCH = int(os.getenv('OPRETURN_SCAN_BATCH', 20))
+
+OP_RETURN = 0x6a
+OP_PUSHDATA1 = 0x4c
+OP_PUSHDATA2 = 0x4d
+OP_PUSHDATA4 = 0x4e
+
+# Prefixos de CID reconhecidos (CIDv0 e CIDv1 em base32)
+CID_PREFIXES = ("Qm", "bafy")
+
+
+def create_opreturn_index_table(cursor):
+    # Um registro por saída OP_RETURN reconhecida: CID do IPFS ou raiz de Merkle de um lote
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS opreturn_index (
+            txid TEXT NOT NULL,
+            vout INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            height INTEGER NOT NULL,
+            block_hash TEXT NOT NULL,
+            blocktime INTEGER NOT NULL,
+            PRIMARY KEY (txid, vout)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_opreturn_index_payload ON opreturn_index (payload)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_opreturn_index_height ON opreturn_index (height)")
+    # Faixas de altura já varridas; end_hash detecta reorganizações acima delas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS opreturn_scan (
+            start_height INTEGER PRIMARY KEY,
+            end_height INTEGER NOT NULL,
+            end_hash TEXT NOT NULL
+        )
+    ''')
+
+
+def decode_op_return(script_hex):
+    """
+    Decodifica um scriptPubKey (hex) do tipo OP_RETURN e retorna os dados
+    empurrados, concatenados, ou None se o script não for um OP_RETURN válido.
+    """
+    try:
+        script = bytes.fromhex(script_hex)
+    except (TypeError, ValueError):
+        return None
+    if not script or script[0] != OP_RETURN:
+        return None
+
+    data = bytearray()
+    position = 1
+    while position < len(script):
+        opcode = script[position]
+        position += 1
+        if opcode < OP_PUSHDATA1:
+            size = opcode
+        elif opcode == OP_PUSHDATA1:
+            size = int.from_bytes(script[position:position + 1], 'little')
+            position += 1
+        elif opcode == OP_PUSHDATA2:
+            size = int.from_bytes(script[position:position + 2], 'little')
+            position += 2
+        elif opcode == OP_PUSHDATA4:
+            size = int.from_bytes(script[position:position + 4], 'little')
+            position += 4
+        else:
+            # Apenas instruções de push são padrão depois do OP_RETURN
+            return None
+        if position + size > len(script):
+            return None
+        data += script[position:position + size]
+        position += size
+    return bytes(data)
+
+
+def classify_payload(data):
+    """Retorna (payload, tipo) para um CID ou uma raiz de Merkle de 32 bytes; None para outros dados."""
+    if not data:
+        return None
+    if len(data) == 32:
+        return data.hex(), "merkle_root"
+    try:
+        cid = data.decode('ascii')
+    except UnicodeDecodeError:
+        return None
+    if cid.startswith(CID_PREFIXES) and cid.isalnum():
+        return cid, "cid"
+    return None
+
+
+def extract_op_returns(transaction):
+    """Gera (vout, payload, tipo) para as saídas OP_RETURN reconhecidas de uma transação decodificada."""
+    for output in transaction.get("vout", []):
+        script_hex = output.get("scriptPubKey", {}).get("hex", "")
+        # Atalho barato antes de decodificar: todo OP_RETURN começa com 6a
+        if not script_hex.startswith("6a"):
+            continue
+        classified = classify_payload(decode_op_return(script_hex))
+        if classified:
+            yield (output["n"], *classified)
+
+
+class OpReturnIndex:
+    """
+    Índice local CID -> (txid, altura, horário do bloco) construído varrendo a
+    cadeia, independente da tabela de transações: registra também ancoragens
+    feitas fora deste banco e pode ser refeito apenas a partir da cadeia.
+
+    A varredura divide as alturas ainda não cobertas em faixas, processadas em
+    paralelo; cada faixa é gravada em uma transação junto com o seu registro em
+    opreturn_scan, de modo que uma varredura interrompida retoma de onde parou.
+    """
+
+    def __init__(self, db, rpc, chunk=OPRETURN_SCAN_CHUNK, workers=OPRETURN_SCAN_WORKERS,
+                 batch_size=OPRETURN_SCAN_BATCH):
+        self.db = db
+        self.rpc = rpc
+        self.chunk = chunk
+        self.workers = workers
+        self.batch_size = batch_size
+        self._scan_lock = threading.Lock()
+        self.metrics = {"blocks_scanned": 0, "outputs_indexed": 0, "ranges_rolled_back": 0}
+
+    def _rollback_reorg(self, conn, tip_height):
+        """Descarta, de cima para baixo, as faixas cujo último bloco saiu da cadeia principal."""
+        while True:
+            row = conn.execute(
+                "SELECT start_height, end_height, end_hash FROM opreturn_scan ORDER BY end_height DESC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return
+            start_height, end_height, end_hash = row
+            if end_height <= tip_height and self.rpc.getblockhash(end_height) == end_hash:
+                return
+            conn.execute("DELETE FROM opreturn_index WHERE height >= ?", (start_height,))
+            conn.execute("DELETE FROM opreturn_scan WHERE start_height = ?", (start_height,))
+            self.metrics["ranges_rolled_back"] += 1
+
+    def _compact(self, conn):
+        """
+        Une faixas contíguas de até self.chunk blocos no total, para manter
+        opreturn_scan pequena sem que uma reorganização obrigue a varrer de novo
+        mais do que uma faixa.
+        """
+        ranges = conn.execute(
+            "SELECT start_height, end_height, end_hash FROM opreturn_scan ORDER BY start_height"
+        ).fetchall()
+        merged = []
+        for start_height, end_height, end_hash in ranges:
+            if merged and merged[-1][1] + 1 == start_height and end_height - merged[-1][0] < self.chunk:
+                merged[-1] = (merged[-1][0], end_height, end_hash)
+            else:
+                merged.append((start_height, end_height, end_hash))
+        if len(merged) != len(ranges):
+            conn.execute("DELETE FROM opreturn_scan")
+            conn.executemany(
+                "INSERT INTO opreturn_scan (start_height, end_height, end_hash) VALUES (?, ?, ?)",
+                merged
+            )
+
+    def _missing_ranges(self, conn, tip_height):
+        """Faixas de até self.chunk alturas entre 0 e o topo que ainda não foram varridas."""
+        missing = []
+        next_height = 0
+        ranges = conn.execute("SELECT start_height, end_height FROM opreturn_scan ORDER BY start_height").fetchall()
+        for start_height, end_height in ranges + [(tip_height + 1, tip_height)]:
+            for start in range(next_height, start_height, self.chunk):
+                missing.append((start, min(start + self.chunk, start_height) - 1))
+            next_height = max(next_height, end_height + 1)
+        return missing
+
+    def _scan_range(self, start_height, end_height):
+        heights = list(range(start_height, end_height + 1))
+        hashes = batch_call(self.rpc, "getblockhash", [[height] for height in heights])
+
+        rows = []
+        for start in range(0, len(hashes), self.batch_size):
+            blocks = batch_call(self.rpc, "getblock", [[block_hash, 2] for block_hash in hashes[start:start + self.batch_size]])
+            for block in blocks:
+                for transaction in block["tx"]:
+                    for vout, payload, kind in extract_op_returns(transaction):
+                        rows.append((transaction["txid"], vout, payload, kind, block["height"], block["hash"], block["time"]))
+
+        with self.db.connection() as conn:
+            # Dados de uma varredura anterior interrompida por reorganização
+            conn.execute("DELETE FROM opreturn_index WHERE height BETWEEN ? AND ?", (start_height, end_height))
+            conn.executemany(
+                "INSERT OR REPLACE INTO opreturn_index (txid, vout, payload, kind, height, block_hash, blocktime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO opreturn_scan (start_height, end_height, end_hash) VALUES (?, ?, ?)",
+                (start_height, end_height, hashes[-1])
+            )
+        self.metrics["blocks_scanned"] += len(heights)
+        self.metrics["outputs_indexed"] += len(rows)
+
+    def scan(self, tip_height=None, blocking=True):
+        """
+        Varre os blocos ainda não indexados até o topo. Retorna a quantidade de
+        blocos varridos. Com blocking=False não espera por uma varredura em andamento.
+        """
+        if not self._scan_lock.acquire(blocking):
+            return 0
+        try:
+            if tip_height is None:
+                tip_height = self.rpc.getblockcount()
+            with self.db.connection() as conn:
+                self._rollback_reorg(conn, tip_height)
+                self._compact(conn)
+                missing = self._missing_ranges(conn, tip_height)
+            if not missing:
+                return 0
+
+            if len(missing) == 1 or self.workers <= 1:
+                for start_height, end_height in missing:
+                    self._scan_range(start_height, end_height)
+            else:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    # list() propaga a primeira exceção; as faixas já gravadas ficam para a retomada
+                    list(executor.map(lambda bounds: self._scan_range(*bounds), missing))
+
+            with self.db.connection() as conn:
+                self._compact(conn)
+            return sum(end_height - start_height + 1 for start_height, end_height in missing)
+        finally:
+            self._scan_lock.release()
+
+    def scanned_height(self):
+        """Altura até a qual a cadeia está indexada sem lacunas (-1 se nada foi varrido)."""
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT start_height, end_height FROM opreturn_scan ORDER BY start_height")
+            ranges = cursor.fetchall()
+        height = -1
+        for start_height, end_height in ranges:
+            if start_height != height + 1:
+                break
+            height = end_height
+        return height
+
+    def find_by_payload(self, payload):
+        """Ocorrências de um CID ou raiz de Merkle (hex) na cadeia, da mais antiga para a mais recente."""
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT txid, vout, kind, height, block_hash, blocktime FROM opreturn_index "
+                "WHERE payload = ? ORDER BY height, txid",
+                (payload,)
+            )
+            rows = cursor.fetchall()
+        return [dict(zip(("txid", "vout", "kind", "height", "block_hash", "blocktime"), row)) for row in rows]
+
+    def find_by_document(self, document_hash):
+        """
+        Ocorrências na cadeia do documento registrado com o SHA-256 informado:
+        o CID no OP_RETURN ou a raiz de Merkle do lote em que ele foi ancorado.
+        """
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT t.ipfs_hash, o.txid, o.vout, o.kind, o.height, o.block_hash, o.blocktime "
+                "FROM documents d "
+                "JOIN transactions t ON t.id = d.transaction_id "
+                "LEFT JOIN anchors a ON a.id = t.anchor_id "
+                "JOIN opreturn_index o ON o.payload IN (t.ipfs_hash, a.merkle_root) "
+                "WHERE d.hash = ? ORDER BY o.height, o.txid",
+                (document_hash,)
+            )
+            rows = cursor.fetchall()
+        return [dict(zip(("ipfs_hash", "txid", "vout", "kind", "height", "block_hash", "blocktime"), row)) for row in rows]
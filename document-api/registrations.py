@@ -0,0 +1,152 @@
+import base64
+import binascii
+import json
+import os
+from datetime import datetime, timezone
+
+# Itens por página (padrão e máximo aceito em ?limit=)
+LISTING_PAGE_SIZE = int(os.getenv('LISTING_PAGE_SIZE', 50))
+LISTING_MAX_PAGE_SIZE = int(os.getenv('LISTING_MAX_PAGE_SIZE', 500))
+# Prefixo mínimo do filtro por hash: prefixos curtos casariam boa parte da tabela,
+# e os registros encontrados pela faixa de hashes precisam ser ordenados a cada página
+LISTING_MIN_HASH_PREFIX = int(os.getenv('LISTING_MIN_HASH_PREFIX', 4))
+
+# Campo exposto -> coluna da tabela transactions
+LISTING_FIELDS = {
+    "id": "id",
+    "hash": "hash",
+    "ipfs_hash": "ipfs_hash",
+    "status": "status",
+    "address": "client_address",
+    "txid": "txid",
+    "op_return_txid": "op_return_txid",
+    "anchor_id": "anchor_id",
+    "batch_id": "batch_id",
+    "timestamp": "timestamp",
+}
+LISTING_DEFAULT_FIELDS = ("id", "hash", "ipfs_hash", "status", "address", "txid", "timestamp")
+
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # formato do CURRENT_TIMESTAMP do SQLite (UTC)
+
+
+class ListingError(Exception):
+    """Parâmetro inválido na listagem; vira uma resposta 400."""
+
+
+def create_listing_indexes(cursor):
+    # Índices na ordem da paginação (timestamp, id): cada página é uma busca no índice a partir do cursor.
+    # O índice por endereço substitui o anterior, que era prefixo deste.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_status_timestamp ON transactions (status, timestamp, id)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_address_timestamp ON transactions (client_address, timestamp, id)"
+    )
+    cursor.execute("DROP INDEX IF EXISTS idx_transactions_client_address")
+
+
+def encode_cursor(timestamp, row_id):
+    """Cursor opaco com a chave (timestamp, id) do último item da página."""
+    payload = json.dumps([timestamp, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        raise ListingError("Cursor inválido.")
+    if not isinstance(timestamp, str) or not isinstance(row_id, int):
+        raise ListingError("Cursor inválido.")
+    return timestamp, row_id
+
+
+def parse_timestamp(value, name):
+    """Data (AAAA-MM-DD) ou data e hora ISO 8601, em UTC, no formato gravado pelo SQLite."""
+    try:
+        moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ListingError(f"'{name}' deve ser uma data ISO 8601 (ex.: 2024-05-01 ou 2024-05-01T12:00:00Z).")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime(_TIMESTAMP_FORMAT)
+
+
+def parse_fields(value):
+    if not value:
+        return LISTING_DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(",") if field.strip()))
+    unknown = [field for field in fields if field not in LISTING_FIELDS]
+    if unknown or not fields:
+        raise ListingError(f"Campos desconhecidos: {', '.join(unknown)}. Disponíveis: {', '.join(LISTING_FIELDS)}.")
+    return fields
+
+
+class RegistrationListing:
+    """
+    Listagem dos registros (tabela transactions) com paginação por cursor sobre
+    (timestamp, id): cada página continua a partir da chave do último item, com
+    uma busca no índice em vez de OFFSET, então a página 10.000 custa o mesmo que
+    a primeira. Filtros por status, endereço, intervalo de datas e prefixo do
+    hash, e seleção dos campos retornados.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.metrics = {"pages": 0, "rows": 0}
+
+    def page(self, status=None, address=None, since=None, until=None, hash_prefix=None, cursor=None,
+             limit=LISTING_PAGE_SIZE, fields=LISTING_DEFAULT_FIELDS, order="desc"):
+        """
+        Retorna (linhas, próximo cursor ou None). Cada linha é uma tupla com os
+        valores de fields, na mesma ordem. since é inclusivo e until exclusivo.
+        """
+        if order not in ("asc", "desc"):
+            raise ListingError("'order' deve ser 'asc' ou 'desc'.")
+        if not 1 <= limit <= LISTING_MAX_PAGE_SIZE:
+            raise ListingError(f"'limit' deve estar entre 1 e {LISTING_MAX_PAGE_SIZE}.")
+
+        conditions, params = [], []
+        if status:
+            statuses = [value.strip() for value in status.split(",") if value.strip()]
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params += statuses
+        if address:
+            conditions.append("client_address = ?")
+            params.append(address)
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        if hash_prefix:
+            hash_prefix = hash_prefix.strip().lower()
+            if len(hash_prefix) < LISTING_MIN_HASH_PREFIX or any(c not in "0123456789abcdef" for c in hash_prefix):
+                raise ListingError(
+                    f"'hash_prefix' deve ter pelo menos {LISTING_MIN_HASH_PREFIX} caracteres hexadecimais."
+                )
+            # Faixa [prefixo, prefixo + 'g') na chave da tabela documents, que guarda o hash em minúsculas
+            conditions.append("id IN (SELECT transaction_id FROM documents WHERE hash >= ? AND hash < ?)")
+            params += [hash_prefix, hash_prefix + "g"]
+        if cursor:
+            conditions.append(f"(timestamp, id) {'<' if order == 'desc' else '>'} (?, ?)")
+            params += list(decode_cursor(cursor))
+
+        direction = "DESC" if order == "desc" else "ASC"
+        columns = [LISTING_FIELDS[field] for field in fields]
+        query = (
+            f"SELECT {', '.join(columns)}, timestamp, id FROM transactions"
+            + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+            + f" ORDER BY timestamp {direction}, id {direction} LIMIT ?"
+        )
+        with self.db.cursor() as db_cursor:
+            db_cursor.execute(query, params + [limit + 1])
+            rows = db_cursor.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+        self.metrics["pages"] += 1
+        self.metrics["rows"] += len(rows)
+        return [row[:-2] for row in rows], next_cursor
@@ -0,0 +1,418 @@
+import base64
+import binascii
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+# Tamanho dos blocos de uma sessão (o último pode ser menor) e tamanho máximo do arquivo
+UPLOAD_SESSION_CHUNK_SIZE = int(os.getenv('UPLOAD_SESSION_CHUNK_SIZE', 8 * 1024 * 1024))
+UPLOAD_SESSION_MAX_SIZE = int(os.getenv('UPLOAD_SESSION_MAX_SIZE', 16 * 1024 ** 3))
+# Uma sessão sem novos blocos por este prazo expira e é removida pela coleta (segundos)
+UPLOAD_SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600))
+UPLOAD_SESSION_GC_INTERVAL = float(os.getenv('UPLOAD_SESSION_GC_INTERVAL', 600))
+# Sem novos blocos por este prazo, o /add em andamento é encerrado e a finalização lê o arquivo do disco
+UPLOAD_SESSION_IDLE_TIMEOUT = float(os.getenv('UPLOAD_SESSION_IDLE_TIMEOUT', 300))
+# Blocos aguardando o envio ao IPFS por sessão; com o IPFS mais lento, os PUTs esperam
+UPLOAD_SESSION_FEED_DEPTH = int(os.getenv('UPLOAD_SESSION_FEED_DEPTH', 4))
+# Espera máxima pelo CID na finalização, após o último bloco (segundos)
+UPLOAD_SESSION_FINALIZE_TIMEOUT = float(os.getenv('UPLOAD_SESSION_FINALIZE_TIMEOUT', 600))
+
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Marcadores da fila de envio ao IPFS
+_END = object()
+_ABORT = object()
+
+
+class UploadSessionError(Exception):
+    """Requisição inválida para a sessão de upload; status_code é o código HTTP da resposta."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def create_upload_session_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            filename TEXT,
+            size INTEGER NOT NULL,
+            chunk_size INTEGER NOT NULL,
+            hash TEXT,
+            status TEXT NOT NULL DEFAULT 'open',
+            expires_at REAL NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires_at ON upload_sessions (expires_at)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_chunks (
+            upload_id TEXT NOT NULL REFERENCES upload_sessions (id) ON DELETE CASCADE,
+            chunk_index INTEGER NOT NULL,
+            PRIMARY KEY (upload_id, chunk_index)
+        ) WITHOUT ROWID
+    ''')
+
+
+def parse_checksum(header):
+    """Cabeçalho Upload-Checksum do tus: 'sha256 <digest em base64>'."""
+    algorithm, _, value = (header or "").strip().partition(" ")
+    if algorithm.lower() != "sha256":
+        raise UploadSessionError("Upload-Checksum deve usar sha256.")
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise UploadSessionError("Upload-Checksum inválido.")
+
+
+class IngestPipeline:
+    """
+    Consome o prefixo contíguo do arquivo de uma sessão: atualiza o SHA-256 e
+    alimenta um único /add do IPFS em streaming, que roda em uma thread desde
+    a criação da sessão. Um bloco que chega em ordem passa da requisição
+    direto para o hash e o IPFS; os que chegam adiantados ficam no arquivo
+    parcial e são lidos de lá quando a lacuna antes deles é preenchida.
+    """
+
+    def __init__(self, ipfs, filename, chunk_count, idle_timeout=UPLOAD_SESSION_IDLE_TIMEOUT):
+        self.ipfs = ipfs
+        self.filename = filename
+        self.chunk_count = chunk_count
+        self.idle_timeout = idle_timeout
+        self.sha256 = hashlib.sha256()
+        self.next_index = 0
+        self.received = set()
+        self.boundary = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._feed = queue.Queue(maxsize=UPLOAD_SESSION_FEED_DEPTH)
+        self._done = threading.Event()
+        self._cid = None
+        self._error = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _body(self):
+        yield (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{self.filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        while True:
+            try:
+                data = self._feed.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                raise UploadSessionError("Sessão de upload ociosa.", 410)
+            if data is _END:
+                break
+            if data is _ABORT:
+                raise UploadSessionError("Sessão de upload cancelada.", 410)
+            yield data
+        yield f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+    def _run(self):
+        try:
+            self._cid = self.ipfs.add(
+                data=self._body(), headers={"Content-Type": f"multipart/form-data; boundary={self.boundary}"}
+            )
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+    def _put(self, data):
+        # Não espera para sempre se o envio ao IPFS já terminou com erro
+        while not self._done.is_set():
+            try:
+                self._feed.put(data, timeout=1)
+                return
+            except queue.Full:
+                continue
+        raise UploadSessionError(f"Erro ao enviar arquivo para o IPFS: {self._error}", 502)
+
+    def advance(self, index, data, read_chunk):
+        """
+        Registra o bloco recebido (data, ou None para lê-lo do disco) e consome
+        o prefixo contíguo. read_chunk(índice) lê um bloco do arquivo parcial.
+        """
+        with self._lock:
+            self.received.add(index)
+            while self.next_index in self.received:
+                chunk = data if self.next_index == index and data is not None else read_chunk(self.next_index)
+                self.sha256.update(chunk)
+                self._put(chunk)
+                self.next_index += 1
+                if self.next_index == self.chunk_count:
+                    self._put(_END)
+
+    def failed(self):
+        return self._done.is_set() and self._error is not None
+
+    def finish(self, timeout=UPLOAD_SESSION_FINALIZE_TIMEOUT):
+        """Aguarda o CID do IPFS; retorna (SHA-256 em hex, CID)."""
+        if self.next_index < self.chunk_count:
+            raise UploadSessionError("Upload incompleto.", 409)
+        if not self._done.wait(timeout):
+            raise UploadSessionError("O IPFS não concluiu o envio a tempo.", 504)
+        if self._error is not None:
+            raise UploadSessionError(f"Erro ao enviar arquivo para o IPFS: {self._error}", 502)
+        return self.sha256.hexdigest(), self._cid
+
+    def abort(self):
+        while True:
+            try:
+                self._feed.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self._feed.put_nowait(_ABORT)
+        except queue.Full:
+            pass
+
+
+class UploadSessions:
+    """
+    Upload retomável no estilo do tus: o cliente cria a sessão, envia os
+    blocos por offset em qualquer ordem e em paralelo e finaliza. Os blocos
+    são gravados com pwrite direto na posição final de um único arquivo
+    parcial (sem montagem posterior) e registrados no SQLite, de modo que a
+    sessão sobrevive a quedas da conexão e a reinícios do processo.
+
+    O hash e o envio ao IPFS acompanham o upload (IngestPipeline). O pipeline
+    vive no processo que criou a sessão; se ele não existir na finalização
+    (reinício ou outro worker), o arquivo parcial é lido uma vez do disco.
+    Sessões expiradas são removidas por collect_garbage.
+    """
+
+    def __init__(self, db, ipfs, folder, chunk_size=UPLOAD_SESSION_CHUNK_SIZE, max_size=UPLOAD_SESSION_MAX_SIZE,
+                 ttl=UPLOAD_SESSION_TTL):
+        self.db = db
+        self.ipfs = ipfs
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self._pipelines = {}  # id da sessão -> IngestPipeline deste processo
+        self._lock = threading.Lock()
+        self.metrics = {"created": 0, "chunks": 0, "chunks_from_disk": 0, "finalized": 0, "expired": 0}
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, upload_id):
+        return os.path.join(self.folder, f"{upload_id}.part")
+
+    @staticmethod
+    def _chunk_count(size, chunk_size):
+        return (size + chunk_size - 1) // chunk_size
+
+    def create(self, filename, size, document_hash=None):
+        """Cria a sessão e reserva o arquivo parcial com o tamanho final (esparso)."""
+        if not isinstance(size, int) or size <= 0:
+            raise UploadSessionError("Informe o tamanho do arquivo em bytes.")
+        if size > self.max_size:
+            raise UploadSessionError(f"Arquivo excede o tamanho máximo de {self.max_size} bytes.", 413)
+
+        upload_id = uuid.uuid4().hex
+        with open(self._path(upload_id), "wb") as file:
+            file.truncate(size)
+        expires_at = time.time() + self.ttl
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT INTO upload_sessions (id, filename, size, chunk_size, hash, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (upload_id, filename, size, self.chunk_size, document_hash, expires_at)
+            )
+        chunk_count = self._chunk_count(size, self.chunk_size)
+        with self._lock:
+            self._pipelines[upload_id] = IngestPipeline(self.ipfs, filename, chunk_count)
+        self.metrics["created"] += 1
+        return {
+            "upload_id": upload_id,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "chunk_count": chunk_count,
+            "expires_at": expires_at,
+        }
+
+    def _load(self, upload_id):
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+            raise UploadSessionError("Sessão de upload não encontrada.", 404)
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT filename, size, chunk_size, hash, status, expires_at FROM upload_sessions WHERE id = ?",
+                (upload_id,)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise UploadSessionError("Sessão de upload não encontrada.", 404)
+        filename, size, chunk_size, document_hash, upload_status, expires_at = row
+        if expires_at < time.time():
+            raise UploadSessionError("Sessão de upload expirada.", 410)
+        return {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunk_count": self._chunk_count(size, chunk_size),
+            "hash": document_hash,
+            "upload_status": upload_status,
+            "expires_at": expires_at,
+        }
+
+    def _received(self, upload_id):
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT chunk_index FROM upload_chunks WHERE upload_id = ? ORDER BY chunk_index", (upload_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    def status(self, upload_id):
+        """Blocos recebidos e faltantes; 'offset' é o tamanho do prefixo contíguo já recebido."""
+        session = self._load(upload_id)
+        received = self._received(upload_id)
+        received_set = set(received)
+        contiguous = 0
+        while contiguous in received_set:
+            contiguous += 1
+        session["offset"] = min(contiguous * session["chunk_size"], session["size"])
+        session["received"] = len(received)
+        session["missing"] = [index for index in range(session["chunk_count"]) if index not in received_set]
+        return session
+
+    def _read_chunk(self, upload_id, chunk_size, size):
+        def read_chunk(index):
+            offset = index * chunk_size
+            fd = os.open(self._path(upload_id), os.O_RDONLY)
+            try:
+                self.metrics["chunks_from_disk"] += 1
+                return os.pread(fd, min(chunk_size, size - offset), offset)
+            finally:
+                os.close(fd)
+        return read_chunk
+
+    def write_chunk(self, upload_id, offset, stream, checksum=None):
+        """
+        Grava o bloco que começa em offset (múltiplo de chunk_size) lendo-o do
+        stream da requisição. Reenviar um bloco já recebido não tem efeito.
+        """
+        session = self._load(upload_id)
+        if session["upload_status"] != "open":
+            raise UploadSessionError("Sessão de upload já finalizada.", 409)
+        chunk_size, size = session["chunk_size"], session["size"]
+        if offset < 0 or offset >= size or offset % chunk_size:
+            raise UploadSessionError(f"Offset inválido: use múltiplos de {chunk_size} menores que {size}.", 409)
+        index = offset // chunk_size
+        expected = min(chunk_size, size - offset)
+
+        data = bytearray()
+        while len(data) <= expected:
+            block = stream.read(min(1024 * 1024, expected + 1 - len(data)))
+            if not block:
+                break
+            data.extend(block)
+        if len(data) != expected:
+            raise UploadSessionError(f"Tamanho do bloco não confere: esperado {expected} bytes, recebido {len(data)}.")
+        data = bytes(data)
+        if checksum is not None and hashlib.sha256(data).digest() != parse_checksum(checksum):
+            raise UploadSessionError("Checksum do bloco não confere.", 460)
+
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM upload_chunks WHERE upload_id = ? AND chunk_index = ?", (upload_id, index)
+            )
+            if cursor.fetchone():
+                return index
+
+        fd = os.open(self._path(upload_id), os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+        with self.db.connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO upload_chunks (upload_id, chunk_index) VALUES (?, ?)", (upload_id, index))
+            conn.execute("UPDATE upload_sessions SET expires_at = ? WHERE id = ?", (time.time() + self.ttl, upload_id))
+        self.metrics["chunks"] += 1
+
+        with self._lock:
+            pipeline = self._pipelines.get(upload_id)
+        if pipeline is not None:
+            try:
+                pipeline.advance(index, data, self._read_chunk(upload_id, chunk_size, size))
+            except UploadSessionError as e:
+                # O bloco já está em disco: sem o pipeline, a finalização lê o arquivo parcial
+                print(f"Envio ao IPFS da sessão {upload_id} interrompido: {e}")
+                with self._lock:
+                    self._pipelines.pop(upload_id, None)
+        return index
+
+    def finalize(self, upload_id):
+        """
+        Conclui a sessão com todos os blocos recebidos e a remove. Retorna a
+        sessão com o SHA-256 calculado ('sha256') e o CID do IPFS ('ipfs_hash').
+        """
+        session = self.status(upload_id)
+        if session["missing"]:
+            error = UploadSessionError(f"Upload incompleto: faltam {len(session['missing'])} blocos.", 409)
+            error.missing = session["missing"]
+            raise error
+        with self.db.connection() as conn:
+            cursor = conn.execute(
+                "UPDATE upload_sessions SET status = 'finalizing' WHERE id = ? AND status = 'open'", (upload_id,)
+            )
+        if not cursor.rowcount:
+            raise UploadSessionError("Sessão de upload já está sendo finalizada.", 409)
+
+        with self._lock:
+            pipeline = self._pipelines.pop(upload_id, None)
+        try:
+            if pipeline is None or pipeline.failed():
+                # Sessão de outro processo ou anterior a um reinício: lê o arquivo parcial do disco
+                pipeline = IngestPipeline(self.ipfs, session["filename"], session["chunk_count"])
+            read_chunk = self._read_chunk(upload_id, session["chunk_size"], session["size"])
+            for index in range(session["chunk_count"]):
+                if index not in pipeline.received:
+                    pipeline.advance(index, None, read_chunk)
+            session["sha256"], session["ipfs_hash"] = pipeline.finish()
+        except Exception:
+            pipeline.abort()
+            with self.db.connection() as conn:
+                conn.execute("UPDATE upload_sessions SET status = 'open' WHERE id = ?", (upload_id,))
+            raise
+        self.discard(upload_id)
+        self.metrics["finalized"] += 1
+        return session
+
+    def discard(self, upload_id):
+        """Remove a sessão, seus blocos e o arquivo parcial, cancelando o envio ao IPFS em andamento."""
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+            return False
+        with self._lock:
+            pipeline = self._pipelines.pop(upload_id, None)
+        if pipeline is not None:
+            pipeline.abort()
+        with self.db.connection() as conn:
+            cursor = conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+        try:
+            os.remove(self._path(upload_id))
+        except FileNotFoundError:
+            pass
+        return cursor.rowcount > 0
+
+    def collect_garbage(self):
+        """Remove as sessões expiradas; retorna quantas foram removidas."""
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT id FROM upload_sessions WHERE expires_at < ?", (time.time(),))
+            expired = [row[0] for row in cursor.fetchall()]
+        for upload_id in expired:
+            self.discard(upload_id)
+        self.metrics["expired"] += len(expired)
+        return len(expired)
+
+    def run_forever(self):
+        while True:
+            try:
+                removed = self.collect_garbage()
+                if removed:
+                    print(f"{removed} sessões de upload expiradas removidas.")
+            except Exception as e:
+                print(f"Erro ao remover sessões de upload expiradas: {e}")
+            time.sleep(UPLOAD_SESSION_GC_INTERVAL)
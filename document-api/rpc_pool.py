@@ -0,0 +1,268 @@
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from bitcoinrpc.authproxy import AuthServiceProxy, EncodeDecimal, JSONRPCException, USER_AGENT
+
+from instrumentation import rpc_errors, rpc_pool_wait, rpc_request_duration
+
+# Configurações do pool de conexões RPC
+RPC_POOL_SIZE = int(os.getenv('RPC_POOL_SIZE', 8))
+RPC_TIMEOUT = int(os.getenv('RPC_TIMEOUT', 30))
+RPC_POOL_ACQUIRE_TIMEOUT = int(os.getenv('RPC_POOL_ACQUIRE_TIMEOUT', 30))
+RPC_HEALTH_CHECK_INTERVAL = int(os.getenv('RPC_HEALTH_CHECK_INTERVAL', 60))
+
+# Falhas de uma conexão keep-alive já encerrada pelo bitcoind: a chamada é
+# repetida uma vez em uma conexão nova. Para NON_IDEMPOTENT_METHODS, só se a
+# falha ocorreu antes de a requisição ser enviada por inteiro: depois do envio,
+# qualquer uma delas (reset, abort, BadStatusLine/RemoteDisconnected) significa
+# resposta perdida, e o bitcoind pode ter executado a chamada.
+STALE_CONNECTION_ERRORS = (
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    http.client.ResponseNotReady,
+)
+# Métodos que movem fundos ou publicam transações: executá-los duas vezes não é seguro
+NON_IDEMPOTENT_METHODS = frozenset({
+    "sendtoaddress", "sendmany", "send", "sendall", "sendrawtransaction", "bumpfee", "psbtbumpfee",
+})
+
+
+class RPCPoolExhausted(Exception):
+    """Nenhuma conexão RPC ficou disponível dentro do tempo limite."""
+
+
+class SendTrackingMixin:
+    """Registra se o último request() enviou a requisição por inteiro."""
+
+    request_sent = False
+
+    def request(self, *args, **kwargs):
+        self.request_sent = False
+        super().request(*args, **kwargs)
+        self.request_sent = True
+
+
+class SendTrackingHTTPConnection(SendTrackingMixin, http.client.HTTPConnection):
+    pass
+
+
+class SendTrackingHTTPSConnection(SendTrackingMixin, http.client.HTTPSConnection):
+    pass
+
+
+class KeepAliveProxy(AuthServiceProxy):
+    """
+    AuthServiceProxy com lotes JSON-RPC tolerantes a falhas: ao contrário de
+    batch_(), um erro em um item não descarta os resultados dos demais. A
+    conexão registra se a última requisição chegou a ser enviada (request_sent).
+    """
+
+    def __init__(self, service_url, timeout=RPC_TIMEOUT):
+        url = urlparse(service_url)
+        if url.scheme == 'https':
+            connection = SendTrackingHTTPSConnection(url.hostname, url.port or 443, timeout=timeout)
+        else:
+            connection = SendTrackingHTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+        super().__init__(service_url, timeout=timeout, connection=connection)
+
+    def request_sent(self):
+        return self._AuthServiceProxy__conn.request_sent
+
+    def rpc_method(self, name):
+        """
+        Método RPC pelo nome, como o __getattr__ do AuthServiceProxy, mas sem
+        confundi-lo com os atributos desta classe (ex.: batch_results).
+        """
+        return AuthServiceProxy(self._AuthServiceProxy__service_url, name, self._AuthServiceProxy__timeout,
+                                self._AuthServiceProxy__conn)
+
+    def batch_results(self, rpc_calls):
+        """
+        Envia [[método, parâmetros...], ...] em um único POST e retorna uma lista
+        de (resultado, erro) na mesma ordem das chamadas.
+        """
+        batch_data = [
+            {"version": "1.1", "method": rpc_call[0], "params": list(rpc_call[1:]), "id": index}
+            for index, rpc_call in enumerate(rpc_calls)
+        ]
+        # Os atributos de conexão do AuthServiceProxy são privados (name mangling)
+        url = self._AuthServiceProxy__url
+        conn = self._AuthServiceProxy__conn
+        conn.request('POST', url.path, json.dumps(batch_data, default=EncodeDecimal),
+                     {'Host': url.hostname,
+                      'User-Agent': USER_AGENT,
+                      'Authorization': self._AuthServiceProxy__auth_header,
+                      'Content-type': 'application/json'})
+        conn.sock.settimeout(self._AuthServiceProxy__timeout)
+
+        responses = self._get_response()
+        if not isinstance(responses, list):
+            raise JSONRPCException(responses.get('error') or {
+                'code': -343, 'message': 'missing JSON-RPC batch result'})
+
+        # O JSON-RPC não garante a ordem das respostas, então o pareamento é pelo id
+        by_id = {response.get('id'): response for response in responses}
+        results = []
+        for index in range(len(batch_data)):
+            response = by_id.get(index)
+            if response is None:
+                results.append((None, {'code': -343, 'message': 'missing JSON-RPC result'}))
+            elif response.get('error') is not None:
+                results.append((None, response['error']))
+            else:
+                results.append((response.get('result'), None))
+        return results
+
+
+class RPCConnectionPool:
+    """
+    Pool limitado e thread-safe de conexões keep-alive para um endpoint RPC
+    (nó ou carteira). Cada chamada toma uma conexão emprestada com exclusividade
+    e a devolve ao final, descartando-a se o estado HTTP ficou inconsistente.
+    """
+
+    def __init__(self, url, size=RPC_POOL_SIZE, timeout=RPC_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # pilha de (proxy, instante do último uso)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        return KeepAliveProxy(self.url, timeout=self.timeout)
+
+    def _checkout(self):
+        with self._lock:
+            proxy, last_used = self._idle.pop() if self._idle else (None, 0)
+
+        if proxy is None:
+            return self._connect()
+
+        # Conexões ociosas há muito tempo passam por uma verificação antes do uso
+        if time.monotonic() - last_used > RPC_HEALTH_CHECK_INTERVAL:
+            try:
+                proxy.uptime()
+            except Exception:
+                return self._connect()
+        return proxy
+
+    def _checkin(self, proxy):
+        with self._lock:
+            self._idle.append((proxy, time.monotonic()))
+
+    def run(self, fn, retries=1, idempotent=True):
+        """
+        Executa fn(proxy) com uma conexão emprestada do pool. Com idempotent=False,
+        a chamada só é repetida se a conexão caiu antes do envio completo da requisição.
+        """
+        started = time.perf_counter()
+        acquired = self._slots.acquire(timeout=RPC_POOL_ACQUIRE_TIMEOUT)
+        rpc_pool_wait.observe(time.perf_counter() - started)
+        if not acquired:
+            raise RPCPoolExhausted(f"Nenhuma conexão RPC disponível para {self.url.split('@')[-1]}")
+        try:
+            proxy = self._checkout()
+            while True:
+                try:
+                    result = fn(proxy)
+                except STALE_CONNECTION_ERRORS:
+                    if retries <= 0 or (not idempotent and proxy.request_sent()):
+                        raise
+                    retries -= 1
+                    # As demais conexões ociosas provavelmente caíram junto (ex.: bitcoind reiniciado)
+                    proxy = self._connect()
+                    continue
+                except JSONRPCException as e:
+                    # Erros -342/-343 indicam resposta HTTP não lida por completo
+                    if e.code not in (-342, -343):
+                        self._checkin(proxy)
+                    raise
+                # Timeouts e demais falhas descartam a conexão sem repetir a chamada,
+                # pois o bitcoind pode ter executado o comando.
+                self._checkin(proxy)
+                return result
+        finally:
+            self._slots.release()
+
+    def _timed(self, method, fn, idempotent=True):
+        """run(fn) medido em rpc_request_duration_seconds (inclui a espera pelo pool e as novas tentativas)."""
+        started = time.perf_counter()
+        try:
+            return self.run(fn, idempotent=idempotent)
+        except Exception:
+            rpc_errors.inc(method)
+            raise
+        finally:
+            rpc_request_duration.observe(time.perf_counter() - started, method)
+
+    def call(self, method, *args):
+        return self._timed(method, lambda proxy: proxy.rpc_method(method)(*args),
+                           idempotent=method not in NON_IDEMPOTENT_METHODS)
+
+    def batch(self, rpc_calls):
+        # batch_ consome o nome do método de cada lista, então cada tentativa usa cópias
+        return self._timed(_batch_label(rpc_calls),
+                           lambda proxy: proxy.batch_([list(rpc_call) for rpc_call in rpc_calls]),
+                           idempotent=_batch_idempotent(rpc_calls))
+
+    def batch_results(self, rpc_calls):
+        return self._timed(_batch_label(rpc_calls), lambda proxy: proxy.batch_results(rpc_calls),
+                           idempotent=_batch_idempotent(rpc_calls))
+
+
+def _batch_idempotent(rpc_calls):
+    return not any(rpc_call[0] in NON_IDEMPOTENT_METHODS for rpc_call in rpc_calls)
+
+
+def _batch_label(rpc_calls):
+    """Rótulo do lote pelo método da primeira chamada (ex.: batch:gettransaction)."""
+    return f"batch:{rpc_calls[0][0]}" if rpc_calls else "batch:empty"
+
+
+class PooledRPCProxy:
+    """
+    Substituto do AuthServiceProxy que pode ser compartilhado entre threads:
+    cada método chamado toma uma conexão do pool apenas durante a chamada.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        return lambda *args: self._pool.call(name, *args)
+
+    def call_(self, method, *args):
+        """Chama o método RPC pelo nome, sem passar pelos atributos do proxy (ex.: batch_, _pool)."""
+        return self._pool.call(method, *args)
+
+    def batch_(self, rpc_calls):
+        return self._pool.batch(rpc_calls)
+
+    def batch_results(self, rpc_calls):
+        return self._pool.batch_results(rpc_calls)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(url):
+    """Retorna o pool associado à URL (uma por carteira), criando-o se necessário."""
+    with _pools_lock:
+        pool = _pools.get(url)
+        if pool is None:
+            pool = _pools[url] = RPCConnectionPool(url)
+        return pool
+
+
+def get_pooled_proxy(url):
+    return PooledRPCProxy(get_pool(url))
@@ -0,0 +1,176 @@
+from block_index import init_block_index
+from job_queue import create_jobs_table
+from address_pool import create_address_pool_table
+from opreturn_index import create_opreturn_index_table
+from bulk_upload import create_batches_table
+from resumable_upload import create_upload_session_tables
+from registrations import create_listing_indexes
+from utxo_manager import create_utxo_locks_table
+
+# Pragmas aplicados a cada conexão SQLite
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA synchronous = NORMAL",  # seguro com WAL e evita um fsync por commit
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",  # ~16 MB de cache de páginas
+    "PRAGMA foreign_keys = ON",
+)
+
+
+def _create_transactions(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_address TEXT,
+            hash TEXT,
+            txid TEXT,
+            ipfs_hash TEXT,
+            op_return_txid TEXT,
+            status TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _create_transaction_indexes(cursor):
+    # Um índice por coluna usada como filtro nas rotas e no monitor
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_txid ON transactions (txid)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_client_address ON transactions (client_address)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_hash ON transactions (hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_ipfs_hash ON transactions (ipfs_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_op_return_txid ON transactions (op_return_txid)")
+    # Índice parcial: só as linhas pendentes, já com as colunas lidas pelo monitor
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_pending
+        ON transactions (txid, ipfs_hash)
+        WHERE status = 'pending'
+    ''')
+
+
+def _create_anchors(cursor):
+    # Lotes de documentos ancorados por uma única raiz de Merkle no OP_RETURN
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS anchors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            merkle_root TEXT NOT NULL,
+            leaf_count INTEGER NOT NULL,
+            op_return_txid TEXT,
+            status TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("ALTER TABLE transactions ADD COLUMN anchor_id INTEGER REFERENCES anchors (id)")
+    cursor.execute("ALTER TABLE transactions ADD COLUMN merkle_proof TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_anchor_id ON transactions (anchor_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_paid ON transactions (id) WHERE status = 'paid'")
+
+
+def _create_documents(cursor):
+    # Um registro por documento (SHA-256 do cliente); o primeiro upload de cada hash é o canônico
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            hash TEXT PRIMARY KEY,
+            transaction_id INTEGER NOT NULL REFERENCES transactions (id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO documents (hash, transaction_id)
+        SELECT lower(hash), MIN(id) FROM transactions WHERE hash IS NOT NULL GROUP BY lower(hash)
+    ''')
+
+
+def _create_pipeline(cursor):
+    # Fila de jobs e estados explícitos do pipeline:
+    # received -> pinned -> awaiting_payment -> paid -> anchored -> confirmed
+    create_jobs_table(cursor)
+    cursor.execute("UPDATE transactions SET status = 'awaiting_payment' WHERE status = 'pending'")
+    cursor.execute("UPDATE transactions SET status = 'anchored' WHERE status = 'confirmed'")
+    cursor.execute("DROP INDEX IF EXISTS idx_transactions_pending")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_awaiting_payment
+        ON transactions (txid, ipfs_hash)
+        WHERE status = 'awaiting_payment'
+    ''')
+    # Transação OP_RETURN assinada, gravada antes do envio para que uma retomada a reenvie em vez de criar outra
+    cursor.execute("ALTER TABLE anchors ADD COLUMN raw_tx TEXT")
+
+
+def _track_anchor_fees(cursor):
+    # Envio e confirmação de cada lote (latência de ancoragem) e substituições por taxa (RBF)
+    cursor.execute("ALTER TABLE anchors ADD COLUMN broadcast_at REAL")
+    cursor.execute("ALTER TABLE anchors ADD COLUMN confirmed_at REAL")
+    cursor.execute("ALTER TABLE anchors ADD COLUMN bump_count INTEGER NOT NULL DEFAULT 0")
+
+
+def _create_anchor_txids(cursor):
+    # Todas as transações enviadas para cada lote (original e substitutas por RBF): qualquer uma pode ser minerada
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS anchor_txids (
+            txid TEXT PRIMARY KEY,
+            anchor_id INTEGER NOT NULL REFERENCES anchors (id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_anchor_txids_anchor_id ON anchor_txids (anchor_id)")
+    cursor.execute(
+        "INSERT OR IGNORE INTO anchor_txids (txid, anchor_id) "
+        "SELECT op_return_txid, id FROM anchors WHERE op_return_txid IS NOT NULL"
+    )
+
+
+# Migrações em ordem; a versão aplicada fica em PRAGMA user_version
+MIGRATIONS = [
+    (1, "tabela de transações", _create_transactions),
+    (2, "índice de blocos", init_block_index),
+    (3, "índices das consultas de transações", _create_transaction_indexes),
+    (4, "ancoragem em lote com árvore de Merkle", _create_anchors),
+    (5, "deduplicação de documentos pelo hash", _create_documents),
+    (6, "fila de jobs e estados do pipeline", _create_pipeline),
+    (7, "pool de endereços de pagamento", create_address_pool_table),
+    (8, "índice de OP_RETURN da cadeia", create_opreturn_index_table),
+    (9, "registro de documentos em lote", create_batches_table),
+    (10, "sessões de upload retomável", create_upload_session_tables),
+    (11, "taxas e aceleração das ancoragens", _track_anchor_fees),
+    (12, "paginação por cursor da listagem de registros", create_listing_indexes),
+    (13, "transações enviadas de cada ancoragem", _create_anchor_txids),
+    (14, "travas de UTXOs da carteira", create_utxo_locks_table),
+]
+
+
+def configure_connection(conn):
+    """Aplica os pragmas por conexão."""
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def migrate(conn):
+    """
+    Ativa o journal WAL (persistente no arquivo) e aplica, cada uma em sua
+    própria transação, as migrações com versão acima de PRAGMA user_version.
+    Depois de aplicar alguma, atualiza as estatísticas do planejador (ANALYZE).
+    """
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    applied = False
+    for version, description, apply in MIGRATIONS:
+        if version <= current_version:
+            continue
+        applied = True
+        print(f"Aplicando migração {version}: {description}...")
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            apply(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if applied:
+        # Sem estatísticas completas, o monitor usa o índice (status, timestamp) em vez
+        # do índice parcial dos registros aguardando pagamento
+        conn.execute("ANALYZE")
+        conn.commit()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
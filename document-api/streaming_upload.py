@@ -0,0 +1,157 @@
+import hashlib
+import uuid
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from werkzeug.utils import secure_filename
+
+# Tamanho máximo aceito para campos de texto do formulário (ex.: 'data')
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class StreamingUploadError(Exception):
+    """Corpo multipart/form-data inválido ou incompleto."""
+
+
+class StreamingUpload:
+    """
+    Lê um corpo multipart/form-data em blocos diretamente do stream da requisição
+    e o reencaminha ao endpoint /add do IPFS (ou o grava em disco, no modo
+    assíncrono), calculando o SHA-256 do arquivo no caminho. Nenhuma cópia
+    completa do arquivo é mantida em memória.
+    """
+
+    def __init__(self, stream, content_type, chunk_size=1024 * 1024):
+        mimetype, options = parse_options_header(content_type or "")
+        boundary = options.get("boundary")
+        if mimetype != "multipart/form-data" or not boundary:
+            raise StreamingUploadError("Conteúdo multipart/form-data inválido.")
+
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = MultipartDecoder(boundary.encode("latin-1"), MAX_FIELD_SIZE + 2 * chunk_size)
+        self.fields = {}
+        self.filename = None
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.ipfs_boundary = uuid.uuid4().hex
+        self._events = self._read_events()
+        self._field_name = None
+        self._field_value = bytearray()
+
+    @property
+    def ipfs_content_type(self):
+        return f"multipart/form-data; boundary={self.ipfs_boundary}"
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    def _read_events(self):
+        """Alimenta o decoder com blocos do stream e produz os eventos multipart."""
+        while True:
+            try:
+                event = self.decoder.next_event()
+            except ValueError as e:
+                raise StreamingUploadError(f"Upload incompleto: {str(e)}")
+
+            if isinstance(event, NeedData):
+                chunk = self.stream.read(self.chunk_size)
+                try:
+                    self.decoder.receive_data(chunk or None)
+                except RequestEntityTooLarge:
+                    raise StreamingUploadError("Cabeçalho multipart excede o tamanho máximo.")
+            elif isinstance(event, Epilogue):
+                return
+            else:
+                yield event
+
+    def _handle_field(self, event):
+        """Acumula os campos de texto; partes de arquivo extras são descartadas."""
+        if isinstance(event, Field):
+            self._field_name = event.name
+            self._field_value = bytearray()
+        elif isinstance(event, File):
+            self._field_name = None
+        elif isinstance(event, Data) and self._field_name is not None:
+            self._field_value.extend(event.data)
+            if len(self._field_value) > MAX_FIELD_SIZE:
+                raise StreamingUploadError(f"Campo '{self._field_name}' excede o tamanho máximo.")
+            if not event.more_data:
+                self.fields[self._field_name] = self._field_value.decode("utf-8", errors="replace")
+                self._field_name = None
+
+    def read_until_file(self, field_name="file"):
+        """
+        Processa os campos que antecedem o arquivo. Retorna False se o corpo
+        terminar sem nenhuma parte de arquivo com o nome informado.
+        """
+        for event in self._events:
+            if isinstance(event, File) and event.name == field_name:
+                self.filename = secure_filename(event.filename) or "upload"
+                return True
+            self._handle_field(event)
+        return False
+
+    def file_chunks(self):
+        """
+        Gera o conteúdo do arquivo à medida que o upload é lido, calculando o
+        SHA-256. Campos posteriores ao arquivo (ex.: 'data') também são processados.
+        """
+        for event in self._events:
+            if not isinstance(event, Data):
+                raise StreamingUploadError("Parte de arquivo malformada.")
+            if event.data:
+                self.sha256.update(event.data)
+                self.size += len(event.data)
+                yield event.data
+            if not event.more_data:
+                break
+        else:
+            raise StreamingUploadError("Upload interrompido antes do fim do arquivo.")
+
+        for event in self._events:
+            self._handle_field(event)
+
+    def iter_files(self, field_names=("files", "file"), max_size=None):
+        """
+        Variante para vários arquivos no mesmo corpo (upload em lote): gera
+        (nome, conteúdo) de cada parte de arquivo, com o conteúdo em memória.
+        Acima de max_size bytes a parte é descartada e o conteúdo vem como None.
+        Os campos de texto que antecedem cada arquivo ficam em self.fields.
+        """
+        for event in self._events:
+            if not (isinstance(event, File) and event.name in field_names):
+                self._handle_field(event)
+                continue
+
+            filename = secure_filename(event.filename) or "upload"
+            content = bytearray()
+            for data in self._events:
+                if not isinstance(data, Data):
+                    raise StreamingUploadError("Parte de arquivo malformada.")
+                if content is not None:
+                    content.extend(data.data)
+                    if max_size is not None and len(content) > max_size:
+                        content = None
+                if not data.more_data:
+                    break
+            else:
+                raise StreamingUploadError("Upload interrompido antes do fim do arquivo.")
+            yield filename, bytes(content) if content is not None else None
+
+    def ipfs_body(self):
+        """Gera o corpo multipart enviado ao IPFS à medida que o upload é lido."""
+        yield (
+            f"--{self.ipfs_boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{self.filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        yield from self.file_chunks()
+        yield f"\r\n--{self.ipfs_boundary}--\r\n".encode("utf-8")
+
+    def save(self, path):
+        """Grava o arquivo em disco (fila assíncrona de upload), sem mantê-lo em memória."""
+        with open(path, "wb") as file:
+            for chunk in self.file_chunks():
+                file.write(chunk)
@@ -0,0 +1,432 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from bitcoinrpc.authproxy import JSONRPCException
+
+from fee_estimator import INPUT_VSIZE_P2WPKH, RBF_SEQUENCE, estimate_vsize, fee_for, input_vsize
+
+# Intervalo máximo entre atualizações do conjunto de UTXOs via listunspent
+UTXO_REFRESH_INTERVAL = int(os.getenv('UTXO_REFRESH_INTERVAL', 30))
+# Permite gastar trocos ainda não confirmados (encadeamento no mempool)
+UTXO_ALLOW_UNCONFIRMED = os.getenv('UTXO_ALLOW_UNCONFIRMED', 'true').lower() in ('1', 'true', 'yes')
+# Travas registradas há mais que isto (segundos) são consideradas abandonadas e desfeitas no bitcoind
+UTXO_LOCK_MAX_AGE = int(os.getenv('UTXO_LOCK_MAX_AGE', 600))
+
+# Abaixo deste valor o troco é descartado para a taxa
+DUST_THRESHOLD = Decimal('0.00001')
+# Tolerância do branch-and-bound para dispensar a saída de troco
+COST_OF_CHANGE = Decimal('0.00002')
+# O bitcoind aceita no máximo 25 ancestrais não confirmados por transação
+MAX_UNCONFIRMED_DEPTH = 24
+BNB_MAX_TRIES = 100000
+
+# Códigos de erro do RPC do bitcoind
+RPC_VERIFY_ERROR = -25  # entradas inexistentes ou já gastas
+RPC_INVALID_ADDRESS_OR_KEY = -5  # transação desconhecida da carteira
+RPC_VERIFY_ALREADY_IN_CHAIN = -27
+
+# vsize: tamanho virtual da entrada que gasta a moeda, para o cálculo da taxa
+Coin = namedtuple('Coin', 'txid vout amount depth vsize', defaults=(INPUT_VSIZE_P2WPKH,))
+
+
+class InsufficientFundsError(ValueError):
+    """A carteira não tem UTXOs livres suficientes para a transação."""
+
+
+def create_utxo_locks_table(cursor):
+    # Travas (lockunspent) feitas pelos gerenciadores de todos os processos, com o instante de cada uma
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS utxo_locks (
+            wallet TEXT NOT NULL,
+            txid TEXT NOT NULL,
+            vout INTEGER NOT NULL,
+            locked_at REAL NOT NULL,
+            PRIMARY KEY (wallet, txid, vout)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _branch_and_bound(coins, target, cost_of_change, max_tries=BNB_MAX_TRIES):
+    """
+    Busca em profundidade um conjunto cujo total fique em [target, target + cost_of_change],
+    dispensando o troco. Retorna o conjunto com menor excedente ou None.
+    """
+    coins = sorted(coins, key=lambda coin: coin.amount, reverse=True)
+    suffix = [Decimal(0)] * (len(coins) + 1)
+    for i in range(len(coins) - 1, -1, -1):
+        suffix[i] = suffix[i + 1] + coins[i].amount
+
+    best = None
+    selection = []
+    total = Decimal(0)
+    i = 0
+    for _ in range(max_tries):
+        backtrack = False
+        if total + suffix[i] < target or total > target + cost_of_change:
+            backtrack = True
+        elif total >= target:
+            waste = total - target
+            if best is None or waste < best[0]:
+                best = (waste, list(selection))
+            if waste == 0:
+                break
+            backtrack = True
+
+        if backtrack:
+            # Desfaz a última inclusão e explora o ramo que omite essa moeda
+            if not selection:
+                break
+            last = selection.pop()
+            total -= coins[last].amount
+            i = last + 1
+            continue
+
+        selection.append(i)
+        total += coins[i].amount
+        i += 1
+
+    return [coins[index] for index in best[1]] if best else None
+
+
+def select_coins(coins, target):
+    """
+    Seleção de moedas: branch-and-bound sem troco; senão a menor moeda que cobre
+    o valor com troco; senão acumula as maiores moedas até cobrir o valor.
+    """
+    coins = [coin for coin in coins if coin.depth < MAX_UNCONFIRMED_DEPTH]
+
+    selection = _branch_and_bound(coins, target, COST_OF_CHANGE)
+    if selection:
+        return selection
+
+    with_change = target + DUST_THRESHOLD
+    candidates = [coin for coin in coins if coin.amount >= with_change]
+    if candidates:
+        return [min(candidates, key=lambda coin: coin.amount)]
+
+    selection = []
+    total = Decimal(0)
+    for coin in sorted(coins, key=lambda coin: coin.amount, reverse=True):
+        selection.append(coin)
+        total += coin.amount
+        if total >= with_change:
+            return selection
+    return None
+
+
+class UTXOManager:
+    """
+    Mantém em memória o conjunto de UTXOs gastáveis de uma carteira e reserva
+    moedas atomicamente para cada transação em construção. As reservas também
+    são travadas no bitcoind (lockunspent) para que sendtoaddress não as use, assim
+    como os trocos não confirmados mantidos no conjunto para encadeamento.
+
+    Cada trava é registrada na tabela utxo_locks, compartilhada pelos processos:
+    release_stale_locks desfaz só as registradas há mais de UTXO_LOCK_MAX_AGE,
+    sem tocar nas reservas em andamento nem nas travas feitas fora da aplicação.
+    """
+
+    def __init__(self, db, wallet_name, rpc):
+        self.db = db
+        self.wallet_name = wallet_name
+        self.rpc = rpc
+        self._lock = threading.Lock()
+        self._coins = {}  # outpoint -> Coin livre
+        self._reserved = {}  # outpoint -> Coin reservada
+        self._locked = set()  # outpoints travados no bitcoind por este gerenciador
+        self._refreshed_at = None
+
+    def _refresh(self):
+        """Recarrega o conjunto via listunspent (chamado com o lock adquirido)."""
+        coins = {}
+        for utxo in self.rpc.listunspent(0):
+            if not utxo.get('spendable') or not utxo.get('safe', True):
+                continue
+            if utxo['confirmations'] < 1 and not UTXO_ALLOW_UNCONFIRMED:
+                continue
+            outpoint = (utxo['txid'], utxo['vout'])
+            if outpoint in self._reserved:
+                continue
+            depth = utxo.get('ancestorcount', 1) if utxo['confirmations'] < 1 else 0
+            coins[outpoint] = Coin(utxo['txid'], utxo['vout'], Decimal(str(utxo['amount'])), depth,
+                                   input_vsize(utxo.get('scriptPubKey')))
+        # O listunspent omite as saídas travadas: os trocos travados em commit continuam no cache
+        for outpoint, coin in self._coins.items():
+            if outpoint in self._locked:
+                coins.setdefault(outpoint, coin)
+        self._coins = coins
+        self._refreshed_at = time.monotonic()
+
+    def _record_locks(self, locked=(), unlocked=()):
+        """Atualiza utxo_locks em uma única transação: registra as novas travas e remove as desfeitas."""
+        locked_at = time.time()
+        with self.db.connection() as conn:
+            conn.executemany(
+                "DELETE FROM utxo_locks WHERE wallet = ? AND txid = ? AND vout = ?",
+                [(self.wallet_name, txid, vout) for txid, vout in unlocked]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO utxo_locks (wallet, txid, vout, locked_at) VALUES (?, ?, ?, ?)",
+                [(self.wallet_name, txid, vout, locked_at) for txid, vout in locked]
+            )
+
+    def release_stale_locks(self, max_age=UTXO_LOCK_MAX_AGE):
+        """
+        Destrava as moedas registradas em utxo_locks há mais de max_age segundos
+        (reservas de um processo que caiu, trocos que deixaram de ser usados).
+        Só as que o bitcoind ainda lista como travadas vão ao lockunspent: as
+        gastas nesse meio tempo já não estão travadas. Retorna quantas destravou.
+        """
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "SELECT txid, vout FROM utxo_locks WHERE wallet = ? AND locked_at < ?",
+                (self.wallet_name, time.time() - max_age)
+            )
+            tracked = [tuple(row) for row in cursor.fetchall()]
+        if not tracked:
+            return 0
+
+        locked = {(entry['txid'], entry['vout']) for entry in self.rpc.listlockunspent()}
+        stale = [outpoint for outpoint in tracked if outpoint in locked]
+        if stale:
+            self.rpc.lockunspent(True, [{"txid": txid, "vout": vout} for txid, vout in stale])
+        self._record_locks(unlocked=tracked)
+        with self._lock:
+            # Uma moeda ainda em cache volta a ser travada na próxima reserva
+            self._locked.difference_update(tracked)
+        return len(stale)
+
+    def run_forever(self, interval=UTXO_LOCK_MAX_AGE):
+        while True:
+            try:
+                released = self.release_stale_locks()
+                if released:
+                    print(f"{released} travas de UTXOs abandonadas desfeitas.")
+            except Exception as e:
+                print(f"Erro ao desfazer travas de UTXOs abandonadas: {e}")
+            time.sleep(interval)
+
+    def reserve(self, target, attempts=2):
+        """
+        Seleciona e reserva moedas que cobrem target. Lança InsufficientFundsError.
+        Se o bitcoind recusa a trava (moeda travada ou gasta por outro processo),
+        recarrega o conjunto e tenta de novo, até attempts vezes.
+        """
+        for attempt in range(attempts):
+            with self._lock:
+                if self._refreshed_at is None or time.monotonic() - self._refreshed_at > UTXO_REFRESH_INTERVAL:
+                    self._refresh()
+                selection = select_coins(self._coins.values(), target)
+                if selection is None:
+                    # O cache pode estar desatualizado (ex.: pagamentos recém-confirmados)
+                    self._refresh()
+                    selection = select_coins(self._coins.values(), target)
+                if selection is None:
+                    raise InsufficientFundsError("Sem fundos disponíveis para criar a transação.")
+                for coin in selection:
+                    del self._coins[(coin.txid, coin.vout)]
+                    self._reserved[(coin.txid, coin.vout)] = coin
+                # Trocos travados em commit já estão travados: o bitcoind recusa travá-los de novo
+                to_lock = [coin for coin in selection if (coin.txid, coin.vout) not in self._locked]
+
+            try:
+                if to_lock:
+                    self.rpc.lockunspent(False, [{"txid": coin.txid, "vout": coin.vout} for coin in to_lock])
+            except JSONRPCException:
+                # release marca o cache para recarga: a próxima seleção parte do listunspent
+                self.release(selection, unlock=False)
+                if attempt == attempts - 1:
+                    raise
+                continue
+            except Exception:
+                self.release(selection, unlock=False)
+                raise
+            with self._lock:
+                self._locked.update((coin.txid, coin.vout) for coin in to_lock)
+            if to_lock:
+                self._record_locks(locked=[(coin.txid, coin.vout) for coin in to_lock])
+            return selection
+
+    def release(self, coins, unlock=True):
+        """Devolve moedas reservadas cuja transação não foi transmitida."""
+        with self._lock:
+            for coin in coins:
+                if self._reserved.pop((coin.txid, coin.vout), None):
+                    self._coins[(coin.txid, coin.vout)] = coin
+            # A falha pode vir de uma moeda já gasta fora do cache: recarrega na próxima reserva
+            self._refreshed_at = None
+        if unlock:
+            with self._lock:
+                self._locked.difference_update((coin.txid, coin.vout) for coin in coins)
+            try:
+                self.rpc.lockunspent(True, [{"txid": coin.txid, "vout": coin.vout} for coin in coins])
+            except Exception as e:
+                print(f"Erro ao destravar UTXOs: {e}")
+            self._record_locks(unlocked=[(coin.txid, coin.vout) for coin in coins])
+
+    def forget(self, txid):
+        """Descarta as saídas em cache de uma transação substituída (RBF); o próximo uso recarrega o conjunto."""
+        with self._lock:
+            forgotten = [outpoint for outpoint in self._coins if outpoint[0] == txid]
+            for outpoint in forgotten:
+                del self._coins[outpoint]
+                self._locked.discard(outpoint)
+            self._refreshed_at = None
+        if forgotten:
+            self._record_locks(unlocked=forgotten)
+
+    def commit(self, coins, txid, own_outputs):
+        """
+        Marca as moedas como gastas e, se permitido, disponibiliza as saídas
+        próprias da nova transação (troco, fan-out) para encadeamento, travadas no
+        bitcoind para que sendtoaddress não as gaste enquanto estão no cache.
+        """
+        depth = max(coin.depth for coin in coins) + 1
+        with self._lock:
+            for coin in coins:
+                self._reserved.pop((coin.txid, coin.vout), None)
+                self._locked.discard((coin.txid, coin.vout))
+        # Moedas gastas deixam de estar travadas no bitcoind
+        spent = [(coin.txid, coin.vout) for coin in coins]
+        if not UTXO_ALLOW_UNCONFIRMED or not own_outputs:
+            self._record_locks(unlocked=spent)
+            return
+
+        try:
+            self.rpc.lockunspent(False, [{"txid": txid, "vout": vout} for vout, _ in own_outputs])
+        except Exception as e:
+            # Sem a trava, as saídas ficam fora do cache até o próximo listunspent
+            print(f"Erro ao travar as saídas de {txid}: {e}")
+            self._record_locks(unlocked=spent)
+            return
+        with self._lock:
+            for vout, amount in own_outputs:
+                self._coins[(txid, vout)] = Coin(txid, vout, Decimal(str(amount)), depth)
+                self._locked.add((txid, vout))
+        self._record_locks(locked=[(txid, vout) for vout, _ in own_outputs], unlocked=spent)
+
+    def _reserve_with_fee(self, outputs, amount, fee_rate):
+        """
+        Reserva moedas para amount mais a taxa a fee_rate sat/vB, calculada sobre o
+        tamanho estimado com as entradas escolhidas. Se a seleção trouxe mais
+        entradas do que a taxa previa, devolve as moedas e tenta de novo.
+        Retorna (moedas, taxa, troco); troco zero dispensa a saída de troco.
+        """
+        input_count = 1
+        for _ in range(3):
+            fee = fee_for(estimate_vsize([INPUT_VSIZE_P2WPKH] * input_count, outputs), fee_rate)
+            coins = self.reserve(amount + fee)
+            total = sum(coin.amount for coin in coins)
+            fee = fee_for(estimate_vsize([coin.vsize for coin in coins], outputs), fee_rate)
+            if total - amount - fee >= DUST_THRESHOLD:
+                return coins, fee, total - amount - fee
+            # Sem troco a transação é menor; o excedente abaixo do limite de poeira fica para a taxa
+            fee = fee_for(estimate_vsize([coin.vsize for coin in coins], outputs, change=False), fee_rate)
+            if total - amount >= fee:
+                return coins, total - amount, Decimal(0)
+            self.release(coins)
+            input_count = len(coins) + 1
+        raise InsufficientFundsError("Sem fundos disponíveis para cobrir o valor e a taxa da transação.")
+
+    def send(self, outputs, fee_rate, outputs_are_own=False, on_signed=None):
+        """
+        Cria, assina e transmite uma transação com as saídas informadas (lista de
+        {endereço ou "data": valor}), acrescentando o troco. A taxa é fee_rate
+        sat/vB sobre o tamanho virtual estimado, e as entradas sinalizam RBF para
+        que a transação possa ser acelerada depois (bumpfee). Retorna o TXID.
+        on_signed recebe a transação assinada (hex) antes do envio, para que o
+        chamador a persista e uma retomada possa reenviá-la com rebroadcast().
+        """
+        outputs = list(outputs)
+        amount = sum((Decimal(str(amount)) for output in outputs
+                      for address, amount in output.items() if address != "data"), Decimal(0))
+        coins, fee, change = self._reserve_with_fee(outputs, amount, fee_rate)
+        try:
+            if change >= DUST_THRESHOLD:
+                outputs.append({self.rpc.getrawchangeaddress(): float(change)})
+
+            raw_tx = self.rpc.createrawtransaction(
+                [{"txid": coin.txid, "vout": coin.vout, "sequence": RBF_SEQUENCE} for coin in coins], outputs
+            )
+            signed_tx = self.rpc.signrawtransactionwithwallet(raw_tx)
+            if not signed_tx['complete']:
+                raise ValueError("Falha ao assinar a transação.")
+            if on_signed:
+                on_signed(signed_tx['hex'])
+            txid = self.rpc.sendrawtransaction(signed_tx['hex'])
+        except Exception:
+            self.release(coins)
+            raise
+
+        own_outputs = []
+        for vout, output in enumerate(outputs):
+            for address, amount in output.items():
+                is_change = change >= DUST_THRESHOLD and vout == len(outputs) - 1
+                if address != "data" and (outputs_are_own or is_change):
+                    own_outputs.append((vout, amount))
+        self.commit(coins, txid, own_outputs)
+        return txid
+
+    def rebroadcast(self, raw_tx):
+        """
+        Retoma uma transação assinada cujo envio pode ter sido interrompido.
+        Retorna o TXID se ela já é conhecida da carteira ou foi aceita agora, ou
+        None se as entradas foram gastas por outra transação (é seguro recriá-la).
+        """
+        txid = self.rpc.decoderawtransaction(raw_tx)['txid']
+        try:
+            wallet_tx = self.rpc.gettransaction(txid)
+        except JSONRPCException as e:
+            if e.error.get('code') != RPC_INVALID_ADDRESS_OR_KEY:
+                raise
+            wallet_tx = None
+
+        if wallet_tx is not None:
+            # Confirmações negativas: a transação conflita com outra já confirmada
+            if wallet_tx['confirmations'] < 0:
+                return None
+            if wallet_tx['confirmations'] > 0:
+                return txid
+
+        try:
+            return self.rpc.sendrawtransaction(raw_tx)
+        except JSONRPCException as e:
+            if e.error.get('code') == RPC_VERIFY_ALREADY_IN_CHAIN:
+                return txid
+            if e.error.get('code') == RPC_VERIFY_ERROR and wallet_tx is None:
+                return None
+            raise
+
+    def fan_out(self, count, amount, fee_rate):
+        """
+        Divide fundos em count moedas de valor amount, permitindo montar count
+        transações em paralelo sem disputa pelo mesmo UTXO.
+        """
+        addresses = self.rpc.batch_([["getrawchangeaddress"] for _ in range(count)])
+        outputs = [{address: float(amount)} for address in addresses]
+        return self.send(outputs, fee_rate, outputs_are_own=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "available": len(self._coins),
+                "available_amount": float(sum((coin.amount for coin in self._coins.values()), Decimal(0))),
+                "reserved": len(self._reserved),
+                "locked": len(self._locked),
+            }
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_utxo_manager(db, wallet_name, rpc):
+    """Retorna o gerenciador de UTXOs da carteira, criando-o se necessário."""
+    with _managers_lock:
+        manager = _managers.get(wallet_name)
+        if manager is None:
+            manager = _managers[wallet_name] = UTXOManager(db, wallet_name, rpc)
+        return manager
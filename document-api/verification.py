@@ -0,0 +1,376 @@
+"""
+Verificação em lote de registros contra a cadeia: para cada par (SHA-256 do
+documento, txid do OP_RETURN), confere que a transação está em um bloco da
+cadeia principal e que o OP_RETURN contém o CID do documento ou a raiz de
+Merkle da qual a prova do documento parte.
+
+Também pode ser usada pela linha de comando, com um par por linha
+("hash,txid", "hash txid" ou um objeto JSON) e resultado em NDJSON:
+
+    python verification.py provas.csv > resultados.ndjson
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+
+from anchoring import verify_document_proof
+from opreturn_index import classify_payload, decode_op_return
+
+# Processos que decodificam os OP_RETURN e verificam as provas (0 verifica no próprio processo);
+# o processo principal segue ocupado com o banco e o RPC, então o padrão deixa um núcleo para ele
+VERIFY_WORKERS = int(os.getenv('VERIFY_WORKERS', max(0, (os.cpu_count() or 1) - 1)))
+# Pares por tarefa do pool; também é a unidade das consultas ao banco e ao RPC
+VERIFY_CHUNK_SIZE = int(os.getenv('VERIFY_CHUNK_SIZE', 2000))
+# Chamadas getrawtransaction/getblockheader por requisição JSON-RPC em lote
+VERIFY_RPC_BATCH = int(os.getenv('VERIFY_RPC_BATCH', 500))
+# Confirmações exigidas para considerar a transação incluída na cadeia
+VERIFY_MIN_CONFIRMATIONS = int(os.getenv('VERIFY_MIN_CONFIRMATIONS', 1))
+# Transações já buscadas mantidas entre as tarefas de uma verificação: os documentos de um lote de Merkle
+# compartilham o mesmo txid
+VERIFY_TX_CACHE_SIZE = int(os.getenv('VERIFY_TX_CACHE_SIZE', 10000))
+# Pares aceitos por requisição na API
+VERIFY_MAX_PROOFS = int(os.getenv('VERIFY_MAX_PROOFS', 1000000))
+
+RPC_INVALID_ADDRESS_OR_KEY = -5
+# Parâmetros por consulta IN (...) ao SQLite
+_SQL_CHUNK = 500
+_HEX = frozenset("0123456789abcdef")
+
+# Resultado de cada par; só 'verified' é válido
+RESULTS = (
+    "verified",
+    "invalid_input",      # hash ou txid fora do formato (64 caracteres hexadecimais)
+    "unknown_document",   # hash sem registro neste banco (o CID e a prova vêm do registro)
+    "tx_not_found",       # txid desconhecido do nó
+    "rpc_error",
+    "unconfirmed",        # transação fora de um bloco da cadeia principal ou com poucas confirmações
+    "no_op_return",
+    "payload_mismatch",   # o OP_RETURN traz outro CID ou um dado que não é CID nem raiz de Merkle
+    "proof_invalid",      # a prova de Merkle do documento não leva à raiz gravada na transação
+)
+
+
+class VerificationError(Exception):
+    """Entrada inválida na verificação em lote; vira uma resposta 400."""
+
+
+def _is_hex64(value):
+    return len(value) == 64 and _HEX.issuperset(value)
+
+
+def parse_pair(line):
+    """Um par por linha: 'hash,txid', 'hash txid' ou {"hash": ..., "txid": ...}. Linhas vazias retornam None."""
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            return str(entry.get("hash", "")), str(entry.get("txid", ""))
+        except (ValueError, AttributeError):
+            raise VerificationError(f"Linha inválida: {line[:100]}")
+    parts = line.replace(",", " ").split()
+    if len(parts) != 2:
+        raise VerificationError(f"Linha inválida (esperado 'hash,txid'): {line[:100]}")
+    return parts[0], parts[1]
+
+
+def read_pairs(lines):
+    """Gera os pares das linhas (str ou bytes) de um arquivo ou do corpo da requisição."""
+    for line in lines:
+        pair = parse_pair(line.decode('utf-8') if isinstance(line, bytes) else line)
+        if pair is not None:
+            yield pair
+
+
+def check_proofs(items):
+    """
+    Executada nos processos do pool: decodifica o OP_RETURN de cada item
+    (hash do documento, CID registrado, prova de Merkle, script hex) e o
+    compara com o registro. Retorna [(resultado, tipo do OP_RETURN)].
+    """
+    results = []
+    for document_hash, ipfs_hash, merkle_proof, script_hex in items:
+        data = decode_op_return(script_hex) if script_hex else None
+        classified = classify_payload(data) if data else None
+        if data is None:
+            results.append(("no_op_return", None))
+        elif classified is None:
+            results.append(("payload_mismatch", None))
+        elif classified[1] == "cid":
+            results.append(("verified" if classified[0] == ipfs_hash else "payload_mismatch", "cid"))
+        elif not merkle_proof:
+            # Raiz de Merkle na cadeia, mas o documento não foi ancorado em lote
+            results.append(("payload_mismatch", "merkle_root"))
+        else:
+            valid = verify_document_proof(document_hash, ipfs_hash, merkle_proof, classified[0])
+            results.append(("verified" if valid else "proof_invalid", "merkle_root"))
+    return results
+
+
+def _first_op_return(transaction):
+    """Script hex do primeiro OP_RETURN, como em /api/transaction/ipfs/opreturn (a decodificação fica no pool)."""
+    for output in transaction.get("vout", []):
+        script_hex = output.get("scriptPubKey", {}).get("hex", "")
+        if script_hex.startswith("6a"):
+            return script_hex
+    return None
+
+
+class ProofVerifier:
+    """
+    Verifica muitos pares (hash, txid) de uma vez, em tarefas de chunk_size
+    pares: os registros vêm do banco em consultas IN, cada txid distinto é
+    buscado uma única vez com getrawtransaction em lotes JSON-RPC e cada bloco
+    distinto com getblockheader (confirmações < 1 indicam bloco fora da cadeia
+    principal). A decodificação dos OP_RETURN e as provas de Merkle rodam em um
+    pool de processos enquanto a tarefa seguinte consulta o banco e o nó, e os
+    resultados saem na ordem da entrada, à medida que cada tarefa termina.
+    """
+
+    def __init__(self, db, rpc, workers=VERIFY_WORKERS, chunk_size=VERIFY_CHUNK_SIZE, rpc_batch=VERIFY_RPC_BATCH,
+                 min_confirmations=VERIFY_MIN_CONFIRMATIONS, tx_cache_size=VERIFY_TX_CACHE_SIZE):
+        self.db = db
+        self.rpc = rpc
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.rpc_batch = rpc_batch
+        self.min_confirmations = min_confirmations
+        self.tx_cache_size = tx_cache_size
+        self._executor = None
+        self._lock = threading.Lock()
+        self.metrics = {"proofs": 0, "verified": 0, "transactions_fetched": 0, "headers_fetched": 0,
+                        "rpc_batches": 0}
+
+    def _pool(self):
+        # 'spawn': o processo da API roda com gevent, que não sobrevive a um fork com o hub ativo
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+            return self._executor
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _batch(self, method, params_list):
+        results = []
+        for start in range(0, len(params_list), self.rpc_batch):
+            chunk = params_list[start:start + self.rpc_batch]
+            results.extend(self.rpc.batch_results([[method, *params] for params in chunk]))
+            self.metrics["rpc_batches"] += 1
+        return results
+
+    def _records(self, hashes):
+        """hash -> (CID, txid do OP_RETURN registrado, prova de Merkle) para os hashes com registro."""
+        records = {}
+        with self.db.cursor() as cursor:
+            for start in range(0, len(hashes), _SQL_CHUNK):
+                chunk = hashes[start:start + _SQL_CHUNK]
+                cursor.execute(
+                    "SELECT d.hash, t.ipfs_hash, t.op_return_txid, t.merkle_proof "
+                    "FROM documents d JOIN transactions t ON t.id = d.transaction_id "
+                    f"WHERE d.hash IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                )
+                for document_hash, ipfs_hash, op_return_txid, merkle_proof in cursor.fetchall():
+                    records[document_hash] = (ipfs_hash, op_return_txid, merkle_proof)
+        return records
+
+    def _fetch_transactions(self, txids, cache):
+        """
+        txid -> (script hex do OP_RETURN, block hash, erro), buscando só os txids
+        fora do cache da verificação em andamento.
+        """
+        missing = [txid for txid in txids if txid not in cache]
+        results = self._batch("getrawtransaction", [[txid, True] for txid in missing])
+        for txid, (transaction, error) in zip(missing, results):
+            if error is not None:
+                code = "tx_not_found" if error.get("code") == RPC_INVALID_ADDRESS_OR_KEY else "rpc_error"
+                cache[txid] = (None, None, (code, error.get("message")))
+            else:
+                cache[txid] = (_first_op_return(transaction), transaction.get("blockhash"), None)
+        self.metrics["transactions_fetched"] += len(missing)
+
+        entries = {}
+        for txid in txids:
+            entries[txid] = cache[txid]
+            cache.move_to_end(txid)
+        while len(cache) > self.tx_cache_size:
+            cache.popitem(last=False)
+        return entries
+
+    def _fetch_headers(self, block_hashes):
+        """block hash -> (altura, confirmações); sempre do nó, pois as confirmações mudam a cada bloco."""
+        headers = {}
+        for block_hash, (header, error) in zip(block_hashes, self._batch("getblockheader", [[h] for h in block_hashes])):
+            headers[block_hash] = (header["height"], header["confirmations"]) if error is None else (None, 0)
+        self.metrics["headers_fetched"] += len(block_hashes)
+        return headers
+
+    def _prepare(self, pairs, first_index, cache):
+        """
+        Monta as linhas da tarefa e os itens enviados ao pool. Os pares resolvidos
+        sem o OP_RETURN (entrada inválida, sem registro, erro de RPC) já saem com
+        o resultado; os demais recebem o resultado de check_proofs.
+        """
+        lines = []
+        for index, (document_hash, txid) in enumerate(pairs, first_index):
+            document_hash, txid = document_hash.strip().lower(), txid.strip().lower()
+            line = {"type": "proof", "index": index, "hash": document_hash, "txid": txid}
+            if not _is_hex64(document_hash) or not _is_hex64(txid):
+                line["result"] = "invalid_input"
+            lines.append(line)
+        self.metrics["proofs"] += len(lines)
+
+        records = self._records(sorted({line["hash"] for line in lines if "result" not in line}))
+        for line in lines:
+            if "result" not in line and line["hash"] not in records:
+                line["result"] = "unknown_document"
+
+        transactions = self._fetch_transactions(
+            list(dict.fromkeys(line["txid"] for line in lines if "result" not in line)), cache
+        )
+        block_hashes = {block_hash for _, block_hash, _ in transactions.values() if block_hash}
+        headers = self._fetch_headers(sorted(block_hashes)) if block_hashes else {}
+
+        items, checked = [], []
+        for line in lines:
+            if "result" in line:
+                continue
+            ipfs_hash, op_return_txid, merkle_proof = records[line["hash"]]
+            line["ipfs_hash"] = ipfs_hash
+            if op_return_txid and op_return_txid != line["txid"]:
+                line["registered_txid"] = op_return_txid
+            script_hex, block_hash, error = transactions[line["txid"]]
+            if error:
+                line["result"], line["error"] = error
+                continue
+            height, confirmations = headers.get(block_hash, (None, 0))
+            if height is not None:
+                line.update(block_hash=block_hash, height=height, confirmations=confirmations)
+            items.append((line["hash"], ipfs_hash, merkle_proof, script_hex))
+            checked.append(line)
+        return lines, checked, items
+
+    def _submit(self, items):
+        if self.workers > 0 and items:
+            return self._pool().submit(check_proofs, items)
+        future = Future()
+        future.set_result(check_proofs(items))
+        return future
+
+    def _finish(self, lines, checked, future):
+        for line, (result, kind) in zip(checked, future.result()):
+            if kind:
+                line["kind"] = kind
+            # A inclusão no bloco só é conferida depois do conteúdo: um OP_RETURN errado prevalece
+            if result == "verified" and line.get("confirmations", 0) < self.min_confirmations:
+                result = "unconfirmed"
+            line["result"] = result
+        for line in lines:
+            line["valid"] = line["result"] == "verified"
+            self.metrics["verified"] += line["valid"]
+            yield line
+
+    def verify(self, pairs, max_pending=None):
+        """
+        Gera uma linha (dict) por par, na ordem de entrada. Até max_pending tarefas
+        (padrão: 2 por processo) ficam no pool enquanto as seguintes são preparadas.
+        """
+        max_pending = max_pending or max(1, 2 * self.workers)
+        # Transações buscadas nesta verificação; não sobrevive a ela, pois confirmações e blocos mudam
+        cache = OrderedDict()
+        pending = deque()
+        chunk, index = [], 0
+        for pair in pairs:
+            chunk.append(pair)
+            if len(chunk) < self.chunk_size:
+                continue
+            lines, checked, items = self._prepare(chunk, index, cache)
+            pending.append((lines, checked, self._submit(items)))
+            chunk, index = [], index + len(chunk)
+            while pending and (len(pending) >= max_pending or pending[0][2].done()):
+                yield from self._finish(*pending.popleft())
+        if chunk:
+            lines, checked, items = self._prepare(chunk, index, cache)
+            pending.append((lines, checked, self._submit(items)))
+        while pending:
+            yield from self._finish(*pending.popleft())
+
+    def run(self, pairs, max_proofs=None):
+        """
+        Gera as linhas NDJSON (dicts) da verificação: uma 'proof' por par e um
+        'summary' com a contagem por resultado. Um erro no meio da verificação
+        (nó fora do ar, linha inválida) sai como uma linha 'error' antes do resumo.
+        """
+        started = time.perf_counter()
+        counts = dict.fromkeys(RESULTS, 0)
+        total = 0
+
+        def limited():
+            for index, pair in enumerate(pairs):
+                if max_proofs is not None and index >= max_proofs:
+                    raise VerificationError(f"Limite de {max_proofs} pares por verificação atingido.")
+                yield pair
+
+        try:
+            for line in self.verify(limited()):
+                counts[line["result"]] += 1
+                total += 1
+                yield line
+        except Exception as e:
+            yield {"type": "error", "message": f"Verificação interrompida: {str(e)}"}
+        yield {
+            "type": "summary",
+            "total": total,
+            "valid": counts["verified"],
+            "results": {result: count for result, count in counts.items() if count},
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+
+def main():
+    import argparse
+
+    from database import Database
+    from rpc_pool import get_pooled_proxy
+
+    parser = argparse.ArgumentParser(description="Verifica em lote pares (SHA-256 do documento, txid) contra a cadeia.")
+    parser.add_argument("input", nargs="?", default="-", help="arquivo com um par por linha ('-' lê da entrada padrão)")
+    parser.add_argument("--db", default=os.getenv('DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                           "data", "transactions.db")))
+    parser.add_argument("--rpc-url", default="http://{}:{}@{}:{}".format(
+        os.getenv('RPC_USER', 'myuser'), os.getenv('RPC_PASSWORD', 'mypassword'),
+        os.getenv('RPC_HOST', 'bitcoin-core'), os.getenv('RPC_PORT', 18443)))
+    parser.add_argument("--workers", type=int, default=VERIFY_WORKERS, help="processos de verificação (0: no próprio processo)")
+    parser.add_argument("--only-invalid", action="store_true", help="escreve só os pares que não foram verificados")
+    args = parser.parse_args()
+
+    verifier = ProofVerifier(Database(args.db), get_pooled_proxy(args.rpc_url), workers=args.workers)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    summary = None
+    try:
+        for line in verifier.run(read_pairs(source)):
+            if line["type"] == "summary":
+                summary = line
+            elif args.only_invalid and line.get("valid"):
+                continue
+            sys.stdout.write(json.dumps(line) + "\n")
+    finally:
+        verifier.close()
+        if source is not sys.stdin:
+            source.close()
+    print(f"{summary['valid']} de {summary['total']} pares verificados em {summary['seconds']} s.", file=sys.stderr)
+    return 0 if summary["valid"] == summary["total"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+# Ponto de entrada WSGI de produção: gunicorn -c gunicorn.conf.py wsgi:app
+# O monkey-patching precisa acontecer antes de importar o app e suas dependências.
+from gevent import monkey
+
+monkey.patch_all()
+
+from app import create_app  # noqa: E402
+
+app = create_app()
@@ -1,21 +1,21 @@
 import { useState, useEffect } from "react";
-import io from "socket.io-client";
+import { subscribeRegistration } from "../utils/socket";
 
-const socket = io("http://localhost:5000");
-
-export default function TransactionStatus({ txid }) {
+export default function TransactionStatus({ address, hash }) {
   const [status, setStatus] = useState("pending");
 
   useEffect(() => {
-    socket.on("payment_confirmed", (data) => {
-      if (data.txid === txid) {
-        setStatus("confirmed");
+    if (!address && !hash) return;
+    return subscribeRegistration(
+      { address, hash },
+      (data) => setStatus(data.status),
+      (registrations) => {
+        if (registrations.length > 0) {
+          setStatus(registrations[registrations.length - 1].status);
+        }
       }
-    });
-    return () => {
-      socket.off("payment_confirmed");
-    };
-  }, [txid]);
+    );
+  }, [address, hash]);
 
   return (
     <div className={`p-4 rounded shadow-lg text-white ${status === "confirmed" ? "bg-green-500" : "bg-yellow-500"}`}>
@@ -21,8 +21,8 @@ export default function UploadComponent({ onUploadSuccess }) {
     if (!file || !hash) return alert("Selecione um arquivo primeiro!");
 
     const formData = new FormData();
+    formData.append("data", hash); // O hash vai antes do arquivo para ser validado no início do streaming
     formData.append("file", file);
-    formData.append("data", hash);
 
     try {
       const response = await axios.post(
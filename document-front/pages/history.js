@@ -1,14 +1,12 @@
 import { useEffect, useState } from "react";
 import { useRouter } from "next/router";
 import axios from "axios";
-import io from "socket.io-client";
+import { subscribeRegistration } from "../utils/socket";
 import { BsSearch } from "react-icons/bs"; // Importando o ícone de busca
 import Header from "../components/Header";
 import Toaster from "../components/Toaster";
 
-// Inicializa o WebSocket
 const API_URL = process.env.NEXT_PUBLIC_API_URL;
-const socket = io(API_URL);
 
 export default function History() {
   const [transactions, setTransactions] = useState([]);
@@ -41,26 +39,23 @@ console.log("dados aqui: ", formattedTransactions);
     }
   };
 
-  // Atualiza as transações em tempo real via WebSocket
+  // Atualiza as transações em tempo real: só os eventos da sala deste endereço chegam aqui
   useEffect(() => {
+    if (!address) return;
     fetchTransactions();
-    socket.on("payment_confirmed", (data) => {
-      console.log("New transaction confirmed:", data);
-      // Adiciona ou atualiza a transação na lista existente
+    return subscribeRegistration({ address }, (data) => {
+      console.log("Registration status:", data);
       setTransactions((prev) => {
-        const existingTx = prev.find((tx) => tx.txid === data.txid);
-        if (existingTx) {
-          return prev.map((tx) =>
-            tx.txid === data.txid ? { ...tx, ...data } : tx
-          );
-        } else {
-          return [...prev, data];
+        const matches = (tx) =>
+          Array.isArray(tx.txids) ? tx.txids.includes(data.txid) : tx.txids === data.txid;
+        if (prev.some(matches)) {
+          return prev.map((tx) => (matches(tx) ? { ...tx, status: data.status } : tx));
         }
+        // Pagamento ainda não listado: uma única consulta em vez de polling
+        fetchTransactions();
+        return prev;
       });
     });
-    return () => {
-      socket.off("payment_confirmed");
-    };
   }, [address]);
 
   // Busca detalhes de uma transação específica
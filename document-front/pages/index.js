@@ -1,14 +1,13 @@
 import { useState, useEffect } from "react";
 import { useRouter } from "next/router";
 import axios from "axios";
-import { generateFileHash } from "../utils/hashGenerator";
+import { uploadResumable } from "../utils/resumableUpload";
 import Header from "../components/Header";
 import Toaster from "../components/Toaster";
-import io from "socket.io-client";
+import { subscribeRegistration } from "../utils/socket";
 import { BsUpload, BsCheckCircle, BsEye, BsSearch} from "react-icons/bs";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL;
-const socket = io(API_URL);
 
 export default function Home() {
   const [file, setFile] = useState(null);
@@ -18,6 +17,8 @@ export default function Home() {
   const [searchAddress, setSearchAddress] = useState("");
   const [amount, setAmount] = useState(0.0001); // Definindo o valor inicial de amount como 0.0001
   const [hash, setHash] = useState("");
+  const [uploadProgress, setUploadProgress] = useState(0);
+  const [hashProgress, setHashProgress] = useState(null);
   const [toastMessage, setToastMessage] = useState(null);
   const [toastType, setToastType] = useState("success");
   const [showPaymentModal, setShowPaymentModal] = useState(false);
@@ -31,22 +32,21 @@ export default function Home() {
   const [historySelectedTransaction, setHistorySelectedTransaction] = useState(null);
   const router = useRouter();
 
+  // Recebe as mudanças de etapa apenas do endereço de pagamento deste upload
   useEffect(() => {
-    socket.on("payment_confirmed", (data) => {
-      setFileDownloadLink(data.download_url);
-      setTxHash(data.txid);
-      setShowDownloadModal(true);
+    if (!address) return;
+    return subscribeRegistration({ address }, (data) => {
+      if (data.status === "paid") {
+        setFileDownloadLink(data.download_url);
+        setTxHash(data.txid);
+        setShowDownloadModal(true);
+      }
+      // O histórico aberto é atualizado uma vez por evento, sem consultas periódicas
+      if (showHistoryModal) {
+        fetchHistoryTransactions(address);
+      }
     });
-    return () => {
-      socket.off("payment_confirmed");
-    };
-  }, [address]);
-
-  useEffect(() => {
-    if (file && hash) {
-      handleUpload();
-    }
-  }, [file, hash]);
+  }, [address, showHistoryModal]);
 
   const showToast = (message, type = "success") => {
     setToastMessage(message);
@@ -54,44 +54,45 @@ export default function Home() {
     setTimeout(() => setToastMessage(null), 5000);
   };
 
-  const handleFileChange = async (event) => {
+  // O upload começa na seleção do arquivo; o SHA-256 é calculado antes, em fatias,
+  // sem carregar o arquivo inteiro na memória, para que duplicados não sejam reenviados
+  const handleFileChange = (event) => {
     const selectedFile = event.target.files[0];
     setFile(selectedFile);
+    // Permite escolher o mesmo arquivo de novo para retomar um envio interrompido
+    event.target.value = "";
     if (selectedFile) {
-      try {
-        const computedHash = await generateFileHash(selectedFile);
-        setHash(computedHash);
-      } catch (error) {
-        console.error("Error generating hash:", error);
-        showToast("Failed to generate hash. Try again.", "error");
-      }
+      handleUpload(selectedFile);
     }
   };
 
-  const handleUpload = async () => {
-    if (!file || !hash) {
+  const handleUpload = async (selectedFile) => {
+    if (!selectedFile) {
       showToast("Select a file before uploading!", "error");
       return;
     }
 
     setIsLoading(true);
-
-    const formData = new FormData();
-    formData.append("file", file);
-    formData.append("data", hash);
+    setUploadProgress(0);
+    setHashProgress(0);
     try {
-      const response = await axios.post(
-        `${API_URL}/api/ipfs/upload`,
-        formData
-      );
-      setUploadResponse(response.data);
-      setAddress(response.data.address);
+      const data = await uploadResumable(selectedFile, {
+        onHashProgress: setHashProgress,
+        onProgress: (fraction) => {
+          setHashProgress(null);
+          setUploadProgress(fraction);
+        },
+      });
+      setUploadResponse(data);
+      setHash(data.hash || "");
+      setAddress(data.address);
       showToast("File uploaded successfully!", "success");
       setShowPaymentModal(true);
     } catch (error) {
       console.error("Upload error:", error);
-      showToast("Failed to upload file. Try again.", "error");
+      showToast("Failed to upload file. Select it again to resume.", "error");
     } finally {
+      setHashProgress(null);
       setIsLoading(false); 
     }
   };
@@ -220,7 +221,12 @@ export default function Home() {
               <button
                 className="btn btn-primary w-100 mb-3" style={{border: 'none', color: 'white', fontSize: '1.4em'}}
                 onClick={() => document.getElementById("fileInput").click()}
-              > Click here
+                disabled={isLoading}
+              > {isLoading
+                  ? hashProgress !== null
+                    ? `Hashing ${Math.round(hashProgress * 100)}%`
+                    : `Uploading ${Math.round(uploadProgress * 100)}%`
+                  : "Click here"}
                 <BsUpload style={{color: 'white', marginLeft: '15px'}} />
               </button>
             </div>
@@ -1,18 +1,125 @@
-export async function generateFileHash(file) {
-  return new Promise((resolve, reject) => {
-    const reader = new FileReader();
-    reader.readAsArrayBuffer(file);
-    reader.onloadend = async () => {
-      try {
-        const buffer = reader.result;
-        const hashBuffer = await crypto.subtle.digest("SHA-256", buffer);
-        const hashArray = Array.from(new Uint8Array(hashBuffer));
-        const hashHex = hashArray.map((b) => b.toString(16).padStart(2, "0")).join("");
-        resolve(hashHex);
-      } catch (error) {
-        reject(error);
+// Arquivos até este tamanho são lidos inteiros e hasheados pelo WebCrypto (nativo)
+const HASH_IN_MEMORY_LIMIT = 16 * 1024 * 1024;
+// Acima dele, o arquivo é lido em fatias deste tamanho, sem ocupar a memória com o arquivo inteiro
+const HASH_SLICE_SIZE = 4 * 1024 * 1024;
+
+const K = new Int32Array([
+  0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+  0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+  0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+  0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+  0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+  0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+  0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+  0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+]);
+
+const toHex = (bytes) => Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+
+// SHA-256 incremental (FIPS 180-4): o WebCrypto só calcula o digest de um buffer completo.
+// As rotações ficam escritas em linha: chamadas a uma função rotr reduzem a vazão pela metade
+export class Sha256 {
+  constructor() {
+    this.state = new Int32Array([
+      0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+    ]);
+    this.block = new Uint8Array(64);
+    this.blockLength = 0;
+    this.length = 0;
+    this.w = new Int32Array(64);
+  }
+
+  compress(data, offset) {
+    const w = this.w;
+    const state = this.state;
+    for (let i = 0; i < 16; i++) {
+      const j = offset + i * 4;
+      w[i] = (data[j] << 24) | (data[j + 1] << 16) | (data[j + 2] << 8) | data[j + 3];
+    }
+    for (let i = 16; i < 64; i++) {
+      const x = w[i - 15];
+      const y = w[i - 2];
+      const s0 = ((x >>> 7) | (x << 25)) ^ ((x >>> 18) | (x << 14)) ^ (x >>> 3);
+      const s1 = ((y >>> 17) | (y << 15)) ^ ((y >>> 19) | (y << 13)) ^ (y >>> 10);
+      w[i] = (w[i - 16] + s0 + w[i - 7] + s1) | 0;
+    }
+    let a = state[0], b = state[1], c = state[2], d = state[3];
+    let e = state[4], f = state[5], g = state[6], h = state[7];
+    for (let i = 0; i < 64; i++) {
+      const s1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+      const t1 = (h + s1 + ((e & f) ^ (~e & g)) + K[i] + w[i]) | 0;
+      const s0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+      const t2 = (s0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+      h = g;
+      g = f;
+      f = e;
+      e = (d + t1) | 0;
+      d = c;
+      c = b;
+      b = a;
+      a = (t1 + t2) | 0;
+    }
+    state[0] += a;
+    state[1] += b;
+    state[2] += c;
+    state[3] += d;
+    state[4] += e;
+    state[5] += f;
+    state[6] += g;
+    state[7] += h;
+  }
+
+  update(bytes) {
+    this.length += bytes.length;
+    let position = 0;
+    if (this.blockLength) {
+      position = Math.min(64 - this.blockLength, bytes.length);
+      this.block.set(bytes.subarray(0, position), this.blockLength);
+      this.blockLength += position;
+      if (this.blockLength < 64) {
+        return this;
       }
-    };
-    reader.onerror = (err) => reject(err);
-  });
+      this.compress(this.block, 0);
+      this.blockLength = 0;
+    }
+    for (; position + 64 <= bytes.length; position += 64) {
+      this.compress(bytes, position);
+    }
+    if (position < bytes.length) {
+      this.block.set(bytes.subarray(position), 0);
+      this.blockLength = bytes.length - position;
+    }
+    return this;
+  }
+
+  hexDigest() {
+    const bits = this.length * 8;
+    const padding = new Uint8Array((this.blockLength < 56 ? 64 : 128) - this.blockLength);
+    padding[0] = 0x80;
+    const view = new DataView(padding.buffer);
+    view.setUint32(padding.length - 8, Math.floor(bits / 0x100000000));
+    view.setUint32(padding.length - 4, bits >>> 0);
+    this.update(padding);
+    const digest = new Uint8Array(32);
+    const digestView = new DataView(digest.buffer);
+    this.state.forEach((word, i) => digestView.setUint32(i * 4, word));
+    return toHex(digest);
+  }
+}
+
+// SHA-256 do arquivo em hexadecimal. Arquivos grandes são lidos fatia a fatia;
+// onProgress recebe a fração já lida.
+export async function generateFileHash(file, { onProgress } = {}) {
+  if (file.size <= HASH_IN_MEMORY_LIMIT) {
+    const digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+    onProgress && onProgress(1);
+    return toHex(new Uint8Array(digest));
+  }
+  const sha256 = new Sha256();
+  for (let start = 0; start < file.size; start += HASH_SLICE_SIZE) {
+    const end = Math.min(start + HASH_SLICE_SIZE, file.size);
+    sha256.update(new Uint8Array(await file.slice(start, end).arrayBuffer()));
+    onProgress && onProgress(end / file.size);
+  }
+  return sha256.hexDigest();
 }
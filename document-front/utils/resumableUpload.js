@@ -0,0 +1,115 @@
+import axios from "axios";
+import { generateFileHash } from "./hashGenerator";
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL;
+
+// Tentativas por bloco antes de desistir (falhas de rede e respostas 5xx)
+const MAX_RETRIES = 5;
+const STORAGE_PREFIX = "resumable-upload:";
+
+// Sessão guardada por arquivo: reabrir a página e escolher o mesmo arquivo retoma o envio
+const storageKey = (file) => `${STORAGE_PREFIX}${file.name}:${file.size}:${file.lastModified}`;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+function toBase64(buffer) {
+  let binary = "";
+  const bytes = new Uint8Array(buffer);
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(binary);
+}
+
+// Lê apenas o bloco (nunca o arquivo inteiro) e calcula o Upload-Checksum
+async function readChunk(file, start, end) {
+  const buffer = await file.slice(start, end).arrayBuffer();
+  const digest = await crypto.subtle.digest("SHA-256", buffer);
+  return { buffer, checksum: `sha256 ${toBase64(digest)}` };
+}
+
+async function openSession(file, onHashProgress) {
+  const key = storageKey(file);
+  const saved = window.localStorage.getItem(key);
+  if (saved) {
+    try {
+      // Sessão anterior ainda válida: só os blocos faltantes são enviados
+      const response = await axios.get(`${API_URL}/api/uploads/${saved}`);
+      return response.data;
+    } catch (error) {
+      window.localStorage.removeItem(key);
+    }
+  }
+  // Com o hash na criação, um documento já registrado não envia nenhum bloco, e o
+  // servidor confere o SHA-256 do conteúdo recebido com ele na finalização
+  const hash = await generateFileHash(file, { onProgress: onHashProgress });
+  const response = await axios.post(`${API_URL}/api/uploads`, {
+    filename: file.name,
+    size: file.size,
+    hash,
+  });
+  // Documento já registrado: o servidor responde sem abrir sessão
+  if (!response.data.upload_id) {
+    return { duplicate: { ...response.data, hash } };
+  }
+  window.localStorage.setItem(key, response.data.upload_id);
+  return { ...response.data, missing: [...Array(response.data.chunk_count).keys()] };
+}
+
+async function putChunk(session, file, index) {
+  const start = index * session.chunk_size;
+  const end = Math.min(start + session.chunk_size, session.size);
+  const { buffer, checksum } = await readChunk(file, start, end);
+  for (let attempt = 0; ; attempt++) {
+    try {
+      await axios.put(`${API_URL}/api/uploads/${session.upload_id}`, buffer, {
+        headers: {
+          "Content-Type": "application/offset+octet-stream",
+          "Upload-Offset": String(start),
+          "Upload-Checksum": checksum,
+        },
+      });
+      return end - start;
+    } catch (error) {
+      const status = error.response && error.response.status;
+      // 4xx (exceto 460, bloco corrompido no caminho) não melhora com nova tentativa
+      if (attempt >= MAX_RETRIES || (status && status < 500 && status !== 460)) {
+        throw error;
+      }
+      await sleep(Math.min(500 * 2 ** attempt, 8000));
+    }
+  }
+}
+
+// Envia o arquivo em blocos pela API de upload retomável, com 'parallel' blocos
+// simultâneos, e retorna a mesma resposta de /api/ipfs/upload (endereço de
+// pagamento, hash, CID). Antes de abrir a sessão o arquivo é hasheado em fatias;
+// onHashProgress recebe a fração hasheada e onProgress a fração enviada.
+export async function uploadResumable(file, { onProgress, onHashProgress, parallel = 4 } = {}) {
+  const session = await openSession(file, onHashProgress);
+  if (session.duplicate) {
+    return session.duplicate;
+  }
+
+  const pending = [...session.missing];
+  let sent = session.size - pending.reduce(
+    (total, index) => total + Math.min(session.chunk_size, session.size - index * session.chunk_size), 0
+  );
+  const report = () => onProgress && onProgress(session.size ? sent / session.size : 1);
+  report();
+
+  // Cada worker pega o próximo bloco em ordem: o servidor envia ao IPFS o prefixo
+  // contíguo à medida que chega, sem reler o arquivo no final
+  const worker = async () => {
+    while (pending.length) {
+      const index = pending.shift();
+      sent += await putChunk(session, file, index);
+      report();
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(parallel, pending.length) }, worker));
+
+  const response = await axios.post(`${API_URL}/api/uploads/${session.upload_id}/finalize`);
+  window.localStorage.removeItem(storageKey(file));
+  return response.data;
+}
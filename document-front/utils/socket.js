@@ -0,0 +1,48 @@
+import io from "socket.io-client";
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL;
+
+// Uma única conexão por aba, compartilhada entre páginas e componentes
+let socket = null;
+
+export function getSocket() {
+  if (!socket) {
+    socket = io(API_URL, { transports: ["websocket"] });
+  }
+  return socket;
+}
+
+// Entra na sala do endereço de pagamento ou do hash do documento e recebe as
+// mudanças de etapa (pinned, awaiting_payment, paid, anchored, confirmed).
+// onInitial recebe o estado atual na confirmação da assinatura, sem consultar a API.
+// Retorna a função que cancela a assinatura.
+export function subscribeRegistration({ address, hash }, onStatus, onInitial) {
+  const client = getSocket();
+  const target = address ? { address } : { hash };
+
+  const join = () => {
+    client.emit("subscribe", target, (ack) => {
+      if (ack && ack.status === "success" && onInitial) {
+        onInitial(ack.registrations);
+      }
+    });
+  };
+  const handleStatus = (data) => {
+    if ((address && data.address === address) || (hash && data.hash === hash)) {
+      onStatus(data);
+    }
+  };
+
+  // Após uma reconexão o servidor não lembra as salas: assina de novo
+  client.on("connect", join);
+  if (client.connected) {
+    join();
+  }
+  client.on("registration_status", handleStatus);
+
+  return () => {
+    client.off("connect", join);
+    client.off("registration_status", handleStatus);
+    client.emit("unsubscribe", target);
+  };
+}